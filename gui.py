@@ -6,6 +6,8 @@ import json
 import os
 from pathlib import Path
 from src.core import AcceleratorCore
+from src.game_detector import GameDetector
+from src.events import GameExited, GameStarted, apply_route_events
 from src.version import get_version, get_version_info
 
 class MainWindow:
@@ -18,6 +20,9 @@ class MainWindow:
         # 初始化加速器核心
         try:
             self.core = AcceleratorCore()
+            self.detector = GameDetector(self.core.config_manager)
+            # 后台监视进程，游戏启动/退出以事件通知界面
+            self.detector.start_watching()
             logging.info("加速器核心初始化成功")
         except Exception as e:
             logging.error(f"加速器核心初始化失败: {str(e)}")
@@ -28,9 +33,14 @@ class MainWindow:
         # 状态变量
         self.is_accelerating = False
         self.status_timer = None
+        # 订阅核心的状态事件，route_view为据此维护的各服务器状态
+        self.subscription = self.core.events.subscribe()
+        self.route_view = {}
         self.acceleration_thread = None
+        self.game_events = self.detector.events.subscribe([GameStarted, GameExited])
         
         self._init_ui()
+        self._poll_game_events()
         logging.info("GUI初始化完成")
         
     def _init_ui(self):
@@ -41,6 +51,7 @@ class MainWindow:
         
         self.game_var = tk.StringVar(value="DotA2")
         games = [("DotA2", "DotA2"), ("CS2", "CS2")]
+        self.game_options = {value for _, value in games}
         for game, value in games:
             ttk.Radiobutton(game_frame, text=game, value=value, 
                           variable=self.game_var).pack(side=tk.LEFT, padx=20)
@@ -80,6 +91,21 @@ class MainWindow:
         # 绑定窗口关闭事件
         self.root.protocol("WM_DELETE_WINDOW", self._on_closing)
         
+    def _poll_game_events(self):
+        """处理游戏启动/退出事件：未在加速时自动选中刚启动的游戏"""
+        try:
+            for event in self.game_events.poll():
+                if self.is_accelerating or event.game not in self.game_options:
+                    continue
+                if isinstance(event, GameStarted):
+                    self.game_var.set(event.game)
+                    self.status_bar.configure(text=f"检测到 {event.game} 已启动")
+                else:
+                    self.status_bar.configure(text=f"{event.game} 已退出")
+        except Exception as e:
+            logging.error(f"处理游戏事件失败: {str(e)}")
+        self.root.after(1000, self._poll_game_events)
+
     def _toggle_acceleration(self):
         """切换加速状态"""
         logging.info(f"切换加速状态: 当前状态={self.is_accelerating}")
@@ -111,7 +137,9 @@ class MainWindow:
             
             def start():
                 try:
-                    if self.core.start_acceleration(game, region):
+                    # 选择的游戏正在运行时只加速它实际连接的服务器
+                    pid = self.detector.current_pid if self.detector.detect_game() == game else None
+                    if self.core.start_acceleration(game, region, pid):
                         logging.info("加速启动成功")
                         self.root.after(0, self._acceleration_started)
                     else:
@@ -190,15 +218,27 @@ class MainWindow:
         try:
             if not self.is_accelerating:
                 return
+            if not self.core.active:
+                # 核心已自行结束加速（例如按连接加速时游戏进程退出）
+                self._stop_acceleration()
+                return
                 
-            status = self.core.get_status()
+            events = self.subscription.poll()
+            if self.subscription.take_dropped():
+                # 订阅缓冲区溢出，从状态快照重新同步
+                self.route_view = {server: dict(route) for server, route
+                                   in self.core.get_status()["routes"].items()}
+            elif not apply_route_events(self.route_view, events):
+                # 没有新事件，不必重绘
+                self.status_timer = self.root.after(1000, self._update_status)
+                return
             self.status_text.delete(1.0, tk.END)
             
-            if status["routes"]:
+            if self.route_view:
                 total_improvement = 0
                 route_count = 0
                 
-                for server, route in status["routes"].items():
+                for server, route in self.route_view.items():
                     if "original_latency" in route and "current_latency" in route:
                         original = route["original_latency"]
                         current = route["current_latency"]
@@ -247,6 +287,7 @@ class MainWindow:
     def run(self):
         """运行主窗口"""
         self.root.mainloop()
+        self.detector.stop_watching()
         
         # 确保程序退出时停止加速
         if self.is_accelerating:
@@ -1,49 +1,9 @@
-import socket
-import time
-import statistics
+from src.core import TcpBackend
 
 def test_tcp_latency(host, port=80, count=2, timeout=2):
     """测试TCP连接延迟"""
-    latencies = []
-    
-    try:
-        # 解析域名
-        try:
-            ip = socket.gethostbyname(host)
-        except socket.gaierror:
-            print(f"无法解析主机名: {host}")
-            return 999.0
-            
-        # 测试连接延迟
-        for _ in range(count):
-            try:
-                start_time = time.time()
-                sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                sock.settimeout(timeout)
-                
-                result = sock.connect_ex((ip, port))
-                end_time = time.time()
-                
-                if result == 0:
-                    latency = (end_time - start_time) * 1000
-                    latencies.append(latency)
-                
-                sock.close()
-                
-            except (socket.timeout, socket.error) as e:
-                print(f"连接 {host} 失败: {str(e)}")
-                continue
-                
-            time.sleep(0.2)
-            
-        if latencies:
-            return statistics.mean(latencies)
-            
-        return 999.0
-        
-    except Exception as e:
-        print(f"测试失败: {str(e)}")
-        return 999.0
+    result = TcpBackend(port).probe([host], count=count, timeout=timeout * 1000)[host]
+    return result.avg
 
 def format_latency(latency):
     return f"{latency:.1f}ms" if latency < 999.0 else "超时"
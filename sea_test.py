@@ -1,49 +1,22 @@
-import socket
-import time
-import statistics
+from src.core import TcpBackend, A2sBackend
+
+GAME_PORT = 27015
 
 def test_tcp_latency(host, port=80, count=2, timeout=2):
     """测试TCP连接延迟"""
-    latencies = []
-    
-    try:
-        # 解析域名
-        try:
-            ip = socket.gethostbyname(host)
-        except socket.gaierror:
-            print(f"无法解析主机名: {host}")
-            return 999.0
-            
-        # 测试连接延迟
-        for _ in range(count):
-            try:
-                start_time = time.time()
-                sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                sock.settimeout(timeout)
-                
-                result = sock.connect_ex((ip, port))
-                end_time = time.time()
-                
-                if result == 0:
-                    latency = (end_time - start_time) * 1000
-                    latencies.append(latency)
-                
-                sock.close()
-                
-            except (socket.timeout, socket.error) as e:
-                print(f"连接 {host} 失败: {str(e)}")
-                continue
-                
-            time.sleep(0.2)
-            
-        if latencies:
-            return statistics.mean(latencies)
-            
-        return 999.0
-        
-    except Exception as e:
-        print(f"测试失败: {str(e)}")
-        return 999.0
+    result = TcpBackend(port).probe([host], count=count, timeout=timeout * 1000)[host]
+    return result.avg
+
+def measure_a2s_latency(host, port=GAME_PORT, count=2, timeout=2):
+    """测试游戏服务器A2S查询延迟"""
+    result = A2sBackend(port).probe([host], count=count, timeout=timeout * 1000)[host]
+    return result.avg
+
+def measure_server_latency(host, port):
+    """游戏端口使用A2S查询，其余端口使用TCP连接"""
+    if port == GAME_PORT:
+        return measure_a2s_latency(host, port)
+    return test_tcp_latency(host, port)
 
 def format_latency(latency):
     return f"{latency:.1f}ms" if latency < 999.0 else "超时"
@@ -69,7 +42,7 @@ def main():
     print("-" * 30)
     server_latencies = {}
     for name, (host, port) in servers.items():
-        latency = test_tcp_latency(host, port)
+        latency = measure_server_latency(host, port)
         server_latencies[name] = latency
         print(f"{name}: {format_latency(latency)}")
     
@@ -85,7 +58,7 @@ def main():
             for name, (host, port) in servers.items():
                 server_latency = server_latencies[name]
                 if server_latency < 999.0:
-                    total_latency = latency + test_tcp_latency(host, port)
+                    total_latency = latency + measure_server_latency(host, port)
                     if total_latency < server_latency:
                         improvement = ((server_latency - total_latency) / server_latency) * 100
                         print(f"{name}:")
@@ -0,0 +1,64 @@
+"""
+CIDR前缀聚合
+
+把相邻的服务器地址合并为尽量少的覆盖前缀，每个前缀多覆盖的非服务器地址数不超过给定上限。
+同一前缀内的服务器共用一条路由和一个代表地址的测量结果。
+"""
+import bisect
+import ipaddress
+from typing import Iterable, List, Tuple
+
+# (网络地址, 前缀长度, 成员地址)，成员第一个为代表地址
+Prefix = Tuple[str, int, List[str]]
+
+
+def _cover(low: int, high: int) -> Tuple[int, int]:
+    """覆盖 [low, high] 的最小前缀"""
+    prefixlen = 32 - (low ^ high).bit_length()
+    mask = (0xFFFFFFFF << (32 - prefixlen)) & 0xFFFFFFFF
+    return low & mask, prefixlen
+
+
+def _contains_any(sorted_values: List[int], low: int, high: int) -> bool:
+    index = bisect.bisect_left(sorted_values, low)
+    return index < len(sorted_values) and sorted_values[index] <= high
+
+
+def aggregate_prefixes(ips: Iterable[str], max_extra: int = 0,
+                       forbidden: Iterable[str] = ()) -> List[Prefix]:
+    """把地址聚合为互不重叠的覆盖前缀
+
+    Args:
+        ips: 需要覆盖的地址
+        max_extra: 每个前缀最多额外覆盖的地址数
+        forbidden: 任何前缀都不能覆盖的地址（例如需要直连的服务器）
+
+    Returns:
+        按地址排序的前缀列表
+    """
+    by_value = {int(ipaddress.IPv4Address(ip)): ip for ip in ips}
+    values = sorted(by_value)
+    blocked = sorted(int(ipaddress.IPv4Address(ip)) for ip in forbidden)
+
+    prefixes = []
+    floor = -1  # 上一个前缀覆盖的最后一个地址
+    i = 0
+    while i < len(values):
+        network, prefixlen, last = values[i], 32, i
+        j = i + 1
+        while j < len(values):
+            candidate, candidate_len = _cover(values[i], values[j])
+            end = candidate + (1 << (32 - candidate_len)) - 1
+            candidate_last = bisect.bisect_right(values, end) - 1
+            extra = (1 << (32 - candidate_len)) - (candidate_last - i + 1)
+            if (candidate <= floor or extra > max_extra
+                    or _contains_any(blocked, candidate, end)):
+                break
+            network, prefixlen, last = candidate, candidate_len, candidate_last
+            j = candidate_last + 1
+
+        members = [by_value[value] for value in values[i:last + 1]]
+        prefixes.append((str(ipaddress.IPv4Address(network)), prefixlen, members))
+        floor = network + (1 << (32 - prefixlen)) - 1
+        i = last + 1
+    return prefixes
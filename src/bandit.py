@@ -0,0 +1,127 @@
+"""
+在线选路（多臂老虎机）
+
+为每个 (服务器, 节点) 维护延迟估计，用UCB以很小的探测预算持续试探其他节点，
+当另一节点在统计上明显更好时再切换路由。节点为DIRECT表示直连。
+"""
+import math
+import threading
+from typing import Dict, List, Optional, Tuple
+
+DIRECT = "direct"
+
+
+class _ArmStats:
+    """单个 (服务器, 节点) 的延迟统计（Welford算法）"""
+
+    __slots__ = ("count", "mean", "m2")
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def add(self, value: float):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+    @property
+    def std(self) -> float:
+        if self.count < 2:
+            return 0.0
+        return math.sqrt(self.m2 / (self.count - 1))
+
+
+class RouteBandit:
+    """基于UCB的逐服务器选路
+
+    Args:
+        exploration: UCB探索系数(ms)，越大越倾向于试探样本少的节点
+        min_samples: 切换路由前双方至少需要的样本数
+        z: 判断"统计上更好"时使用的置信区间宽度
+        min_spread: 标准差下限(ms)
+        min_gain: 切换要求的最小延迟改善(ms)
+    """
+
+    def __init__(self, exploration: float = 20.0, min_samples: int = 3, z: float = 2.0,
+                 min_spread: float = 3.0, min_gain: float = 5.0):
+        self.exploration = exploration
+        self.min_samples = min_samples
+        self.z = z
+        self.min_spread = min_spread
+        self.min_gain = min_gain
+        self._arms: Dict[str, Dict[str, _ArmStats]] = {}
+        self._lock = threading.Lock()
+
+    def reset(self, server: str, nodes: List[str]):
+        """设置服务器的候选节点（含直连）"""
+        with self._lock:
+            self._arms[server] = {node: _ArmStats() for node in nodes}
+
+    def remove(self, server: str):
+        with self._lock:
+            self._arms.pop(server, None)
+
+    def clear(self):
+        with self._lock:
+            self._arms.clear()
+
+    def record(self, server: str, node: str, latency: float):
+        """记录一次经节点（或直连）访问服务器的延迟"""
+        with self._lock:
+            arms = self._arms.get(server)
+            if arms is not None and node in arms:
+                arms[node].add(latency)
+
+    def _interval(self, stats: _ArmStats) -> Tuple[float, float]:
+        half = self.z * max(stats.std, self.min_spread) / math.sqrt(stats.count)
+        return stats.mean - half, stats.mean + half
+
+    def choose_exploration(self, server: str, current: str) -> Optional[str]:
+        """按UCB选出值得试探的节点，当前路由即为最优选择时返回None"""
+        with self._lock:
+            arms = self._arms.get(server)
+            if not arms:
+                return None
+            total = sum(stats.count for stats in arms.values()) + 1
+            best, best_bound = None, math.inf
+            for node, stats in arms.items():
+                if stats.count == 0:
+                    bound = -math.inf
+                else:
+                    # 延迟越低越好，因此使用置信下界
+                    bound = stats.mean - self.exploration * math.sqrt(math.log(total) / stats.count)
+                if bound < best_bound:
+                    best, best_bound = node, bound
+            if best == current:
+                return None
+            return best
+
+    def better_arm(self, server: str, current: str) -> Optional[Tuple[str, float]]:
+        """若有节点在统计上明显优于当前路由，返回 (节点, 估计延迟)"""
+        with self._lock:
+            arms = self._arms.get(server)
+            if not arms or current not in arms:
+                return None
+            current_stats = arms[current]
+            if current_stats.count < self.min_samples:
+                return None
+            current_lower, _ = self._interval(current_stats)
+
+            best = None
+            for node, stats in arms.items():
+                if node == current or stats.count < self.min_samples:
+                    continue
+                _, upper = self._interval(stats)
+                if upper < current_lower and current_stats.mean - stats.mean >= self.min_gain:
+                    if best is None or stats.mean < best[1]:
+                        best = (node, stats.mean)
+            return best
+
+    def estimates(self, server: str) -> Dict[str, Dict[str, float]]:
+        """服务器各候选节点的当前估计"""
+        with self._lock:
+            return {node: {"samples": stats.count, "mean": stats.mean, "std": stats.std}
+                    for node, stats in self._arms.get(server, {}).items()}
@@ -0,0 +1,314 @@
+"""
+配置模型
+
+config.json 只解析和校验一次，并编译为只读索引：按区服分组的节点、
+节点和服务器的反查表、每个目标的探测方式、节点与服务器组的坐标及每个区服节点的地理位置索引。
+ConfigManager 监视配置文件，文件变化时编译新版本并整体替换，
+正在进行的加速继续使用启动时取得的数据，新的查询立即看到新版本。
+"""
+import ipaddress
+import json
+import logging
+import os
+import sys
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .geo import Coordinate, GeoIndex, parse_coordinate
+
+DEFAULT_CONFIG_PATH = os.path.join(os.path.dirname(__file__), '..', 'config.json')
+
+# 路由日志、测量历史等持久数据的目录：打包为单文件程序时__file__位于退出即删除的临时目录，
+# 改用程序所在目录
+if getattr(sys, 'frozen', False):
+    DATA_DIR = os.path.dirname(os.path.abspath(sys.executable))
+else:
+    DATA_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# 服务器 -> (游戏, 区服, 服务器组)
+ServerInfo = Tuple[str, str, str]
+
+
+def data_path(name: str) -> str:
+    """持久数据文件的路径，绝对路径原样返回"""
+    return os.path.join(DATA_DIR, name)
+
+
+class ConfigError(ValueError):
+    """配置文件格式错误"""
+
+
+def _parse_ip(value, where: str) -> int:
+    try:
+        return int(ipaddress.IPv4Address(value))
+    except (ipaddress.AddressValueError, ValueError, TypeError):
+        raise ConfigError(f"{where}: 无效的IP地址 {value!r}")
+
+
+def _check_probe_spec(spec, where: str) -> Dict:
+    """校验探测方式 {"method": ..., "port": ..., "fallback": ...}"""
+    if not isinstance(spec, dict):
+        raise ConfigError(f"{where} 必须是对象")
+    for key in ("method", "fallback"):
+        if key in spec and not isinstance(spec[key], str):
+            raise ConfigError(f"{where}.{key} 必须是字符串")
+    port = spec.get("port")
+    if port is not None and (not isinstance(port, int) or isinstance(port, bool)
+                             or not 0 < port < 65536):
+        raise ConfigError(f"{where}.port: 无效的端口 {port!r}")
+    return spec
+
+
+class CompiledConfig:
+    """校验并编译后的配置（只读）
+
+    Args:
+        raw: 解析后的config.json
+        version: 配置版本号，每次重新加载递增
+    """
+
+    def __init__(self, raw: Dict, version: int = 0):
+        if not isinstance(raw, dict):
+            raise ConfigError("配置文件顶层必须是对象")
+        self.raw = raw
+        self.version = version
+        self.settings: Dict = raw.get("settings", {})
+        if not isinstance(self.settings, dict):
+            raise ConfigError("settings 必须是对象")
+
+        self.nodes_by_region: Dict[str, List[Dict]] = {}
+        self.node_index: Dict[str, Tuple[str, Optional[str]]] = {}  # 节点IP -> (区服, 运营商)
+        self.server_index: Dict[str, ServerInfo] = {}
+        self.locations: Dict[str, Coordinate] = {}
+        self.node_coords: Dict[str, Coordinate] = {}
+        self.group_coords: Dict[str, Coordinate] = {}
+        self.geo_by_region: Dict[str, GeoIndex] = {}
+        self.probe_specs: Dict[str, Dict] = {}  # 目标 -> 探测方式，未列出的目标使用default_probe_spec
+        self.default_probe_spec: Dict = {"method": "icmp"}
+        self._compile_locations(raw.get("locations", {}))
+        self._compile_nodes(raw.get("nodes", {}))
+        self._compile_servers(raw.get("game_servers", {}))
+        self._compile_geo(raw.get("server_locations", {}))
+        self._compile_probe(raw.get("probe", {}))
+
+    def _compile_locations(self, locations: Dict):
+        if not isinstance(locations, dict):
+            raise ConfigError("locations 必须是对象")
+        for name, value in locations.items():
+            coordinate = parse_coordinate(value)
+            if coordinate is None:
+                raise ConfigError(f"locations.{name}: 无效的坐标 {value!r}")
+            self.locations[name] = coordinate
+
+    def locate(self, value) -> Optional[Coordinate]:
+        """地名或 [纬度, 经度] 对应的坐标"""
+        if isinstance(value, str):
+            return self.locations.get(value)
+        return parse_coordinate(value)
+
+    def _compile_nodes(self, nodes: Dict):
+        if not isinstance(nodes, dict):
+            raise ConfigError("nodes 必须是对象")
+        for region, region_nodes in nodes.items():
+            # 国服按运营商分组，其他区服是节点列表
+            if isinstance(region_nodes, dict):
+                groups = list(region_nodes.items())
+            elif isinstance(region_nodes, list):
+                groups = [(None, region_nodes)]
+            else:
+                raise ConfigError(f"nodes.{region} 必须是对象或列表")
+
+            flat = []
+            for isp, group in groups:
+                where = f"nodes.{region}" + (f".{isp}" if isp else "")
+                if not isinstance(group, list):
+                    raise ConfigError(f"{where} 必须是列表")
+                for i, node in enumerate(group):
+                    if not isinstance(node, dict) or "ip" not in node:
+                        raise ConfigError(f"{where}[{i}] 缺少 ip")
+                    _parse_ip(node["ip"], f"{where}[{i}]")
+                    self.node_index[node["ip"]] = (region, isp or node.get("isp"))
+                    # 节点可用 coordinates 指定坐标，否则按 location 查地名
+                    coordinate = self.locate(node.get("coordinates", node.get("location")))
+                    if coordinate is not None:
+                        self.node_coords[node["ip"]] = coordinate
+                    flat.append(node)
+            self.nodes_by_region[region] = flat
+
+    def _compile_servers(self, game_servers: Dict):
+        if not isinstance(game_servers, dict):
+            raise ConfigError("game_servers 必须是对象")
+        for game, regions in game_servers.items():
+            if not isinstance(regions, dict):
+                raise ConfigError(f"game_servers.{game} 必须是对象")
+            for region, groups in regions.items():
+                if not isinstance(groups, dict):
+                    raise ConfigError(f"game_servers.{game}.{region} 必须是对象")
+                for group, servers in groups.items():
+                    where = f"game_servers.{game}.{region}.{group}"
+                    if not isinstance(servers, list):
+                        raise ConfigError(f"{where} 必须是列表")
+                    for server in servers:
+                        _parse_ip(server, where)
+                        self.server_index.setdefault(server, (game, region, group))
+
+    def _compile_geo(self, server_locations: Dict):
+        if not isinstance(server_locations, dict):
+            raise ConfigError("server_locations 必须是对象")
+        for group, value in server_locations.items():
+            coordinate = self.locate(value)
+            if coordinate is None:
+                raise ConfigError(f"server_locations.{group}: 未知的位置 {value!r}")
+            self.group_coords[group] = coordinate
+        for region, nodes in self.nodes_by_region.items():
+            self.geo_by_region[region] = GeoIndex({node["ip"]: self.node_coords[node["ip"]]
+                                                   for node in nodes
+                                                   if node["ip"] in self.node_coords})
+
+    def _compile_probe(self, probe: Dict):
+        """生成每个目标的探测方式
+
+        节点可在自身配置中指定"probe"，服务器组可在"probe.groups"中按组名指定，
+        未单独指定的游戏服务器使用"probe.servers"，其余目标使用"probe.default"。
+        """
+        if not isinstance(probe, dict):
+            raise ConfigError("probe 必须是对象")
+        groups = probe.get("groups", {})
+        if not isinstance(groups, dict):
+            raise ConfigError("probe.groups 必须是对象")
+        for group, spec in groups.items():
+            _check_probe_spec(spec, f"probe.groups.{group}")
+        server_spec = probe.get("servers")
+        if server_spec is not None:
+            _check_probe_spec(server_spec, "probe.servers")
+        if "default" in probe:
+            self.default_probe_spec = _check_probe_spec(probe["default"], "probe.default")
+
+        for region, nodes in self.nodes_by_region.items():
+            for node in nodes:
+                if "probe" in node:
+                    self.probe_specs[node["ip"]] = _check_probe_spec(
+                        node["probe"], f"nodes.{region}.{node['ip']}.probe")
+        for server, (_, _, group) in self.server_index.items():
+            spec = groups.get(group, server_spec)
+            if spec:
+                self.probe_specs[server] = spec
+
+    def region_nodes(self, region: str) -> List[Dict]:
+        """区服的全部节点（国服为所有运营商的节点）"""
+        return self.nodes_by_region.get(region, [])
+
+    def node_isp(self, ip: str) -> Optional[str]:
+        """节点所属的运营商（国服的分组名或节点配置的 isp），未知时为None"""
+        return self.node_index.get(ip, (None, None))[1]
+
+    def game_servers(self, game: str, region: Optional[str] = None) -> Dict:
+        """游戏（指定区服时为该区服）的服务器配置"""
+        regions = self.raw.get("game_servers", {}).get(game, {})
+        if region is None:
+            return regions
+        return regions.get(region, {})
+
+    def geo_index(self, region: str) -> Optional[GeoIndex]:
+        """区服节点的地理位置索引，没有任何节点坐标时为None"""
+        index = self.geo_by_region.get(region)
+        return index if index else None
+
+    def lookup_server(self, ip: str) -> Optional[ServerInfo]:
+        """服务器IP所属的 (游戏, 区服, 服务器组)"""
+        return self.server_index.get(ip)
+
+
+class ConfigManager:
+    """配置文件的加载、监视与热替换
+
+    Args:
+        path: 配置文件路径
+        poll_interval: 检查文件修改时间的间隔(秒)
+    """
+
+    def __init__(self, path: str = DEFAULT_CONFIG_PATH, poll_interval: float = 2.0):
+        self.path = path
+        self.poll_interval = poll_interval
+        self._current = CompiledConfig({})
+        self._mtime: Optional[float] = None
+        self._listeners: List[Callable[[CompiledConfig], None]] = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.reload()
+
+    @property
+    def current(self) -> CompiledConfig:
+        """当前版本（引用替换是原子的，读取无需加锁）"""
+        return self._current
+
+    def reload(self) -> bool:
+        """重新加载配置，校验失败时保留当前版本"""
+        with self._lock:
+            try:
+                # 先记录修改时间，格式错误的文件不会被反复重试
+                self._mtime = os.path.getmtime(self.path)
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    compiled = CompiledConfig(json.load(f), self._current.version + 1)
+            except Exception as e:
+                # 任何校验或编译错误都拒绝本次加载，继续使用当前版本
+                logging.error(f"加载配置失败: {str(e)}")
+                return False
+            self._current = compiled
+            listeners = list(self._listeners)
+        logging.info(f"配置加载成功 (版本 {compiled.version})")
+        for listener in listeners:
+            try:
+                listener(compiled)
+            except Exception as e:
+                logging.error(f"应用新配置失败: {str(e)}")
+        return True
+
+    def subscribe(self, listener: Callable[[CompiledConfig], None]):
+        """注册配置更新回调（在监视线程中调用）"""
+        with self._lock:
+            self._listeners.append(listener)
+
+    def unsubscribe(self, listener: Callable[[CompiledConfig], None]):
+        with self._lock:
+            if listener in self._listeners:
+                self._listeners.remove(listener)
+
+    def start_watching(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._watch, name="config-watcher", daemon=True)
+            self._thread.start()
+
+    def stop_watching(self):
+        with self._lock:
+            thread, self._thread = self._thread, None
+        self._stop.set()
+        if thread is not None:
+            thread.join()
+
+    def _watch(self):
+        while not self._stop.wait(self.poll_interval):
+            try:
+                mtime = os.path.getmtime(self.path)
+            except OSError:
+                continue
+            if mtime != self._mtime:
+                self.reload()
+
+
+_managers: Dict[str, ConfigManager] = {}
+_managers_lock = threading.Lock()
+
+
+def get_config_manager(path: str = DEFAULT_CONFIG_PATH) -> ConfigManager:
+    """同一配置文件共享一个ConfigManager（核心与游戏检测使用同一份配置）"""
+    key = os.path.abspath(path)
+    with _managers_lock:
+        manager = _managers.get(key)
+        if manager is None:
+            manager = _managers[key] = ConfigManager(key)
+        return manager
@@ -0,0 +1,135 @@
+"""
+游戏连接发现
+
+按游戏进程的PID周期性读取其TCP/UDP套接字的远端地址，得到游戏实际正在通信的服务器。
+新出现的地址立即报告，超过idle_timeout秒未再出现的地址才报告为已断开，
+避免游戏换图、重连时短暂关闭套接字造成路由反复安装和撤销。
+
+注意：未调用connect的UDP套接字没有远端地址，这类流量无法通过套接字表发现。
+"""
+import ipaddress
+import logging
+import socket
+import threading
+import time
+from typing import Callable, Dict, Optional, Set, Tuple
+
+import psutil
+
+# 连接变化回调：(新出现的远端地址, 已断开的远端地址)
+ConnectionCallback = Callable[[Set[str], Set[str]], None]
+
+
+def is_public_ipv4(address: str) -> bool:
+    try:
+        ip = ipaddress.IPv4Address(address)
+    except ValueError:
+        return False
+    return ip.is_global and not ip.is_multicast
+
+
+def process_endpoints(pid: int) -> Set[Tuple[str, int, str]]:
+    """进程当前的远端地址 (IP, 端口, "tcp"/"udp")，只包括公网IPv4地址
+
+    进程已退出时抛出psutil.NoSuchProcess。
+    """
+    process = psutil.Process(pid)
+    # psutil 6.0起改名为net_connections
+    net_connections = getattr(process, "net_connections", None) or process.connections
+    connections = net_connections(kind="inet4")
+    endpoints = set()
+    for conn in connections:
+        if not conn.raddr or not is_public_ipv4(conn.raddr.ip):
+            continue
+        protocol = "udp" if conn.type == socket.SOCK_DGRAM else "tcp"
+        endpoints.add((conn.raddr.ip, conn.raddr.port, protocol))
+    return endpoints
+
+
+class ConnectionTracker:
+    """游戏进程的远端地址跟踪
+
+    Args:
+        pid: 游戏进程PID
+        on_change: 远端地址变化回调（在跟踪线程中调用）
+        interval: 读取套接字表的间隔(秒)
+        idle_timeout: 地址超过该时间(秒)未出现视为已断开
+        on_exit: 游戏进程退出时的回调（在报告全部地址断开之后调用），之后不再读取套接字表
+        endpoints: 读取远端地址的函数，默认使用psutil
+    """
+
+    def __init__(self, pid: int, on_change: ConnectionCallback, interval: float = 2.0,
+                 idle_timeout: float = 60.0, on_exit: Optional[Callable[[], None]] = None,
+                 endpoints: Callable[[int], Set[Tuple[str, int, str]]] = process_endpoints):
+        self.pid = pid
+        self.on_change = on_change
+        self.interval = interval
+        self.idle_timeout = idle_timeout
+        self.on_exit = on_exit
+        self.endpoints = endpoints
+        self.last_seen: Dict[str, float] = {}
+        self.exited = False
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def active(self) -> Set[str]:
+        with self._lock:
+            return set(self.last_seen)
+
+    def poll(self) -> Tuple[Set[str], Set[str]]:
+        """读取一次套接字表，返回 (新出现的地址, 已断开的地址) 并回调"""
+        current: Set[str] = set()
+        exited = False
+        if not self.exited:
+            try:
+                current = {ip for ip, _, _ in self.endpoints(self.pid)}
+            except psutil.NoSuchProcess:
+                logging.info(f"游戏进程 {self.pid} 已退出")
+                self.exited = exited = True
+            except Exception as e:
+                logging.error(f"读取游戏连接失败: {str(e)}")
+                return set(), set()
+
+        now = time.monotonic()
+        with self._lock:
+            added = current - self.last_seen.keys()
+            for ip in current:
+                self.last_seen[ip] = now
+            # 进程退出后不再等待超时
+            removed = {ip for ip, seen in self.last_seen.items()
+                       if self.exited or now - seen > self.idle_timeout}
+            for ip in removed:
+                del self.last_seen[ip]
+        if added or removed:
+            try:
+                self.on_change(added, removed)
+            except Exception as e:
+                logging.error(f"处理游戏连接变化失败: {str(e)}")
+        if exited and self.on_exit is not None:
+            try:
+                self.on_exit()
+            except Exception as e:
+                logging.error(f"处理游戏进程退出失败: {str(e)}")
+        return added, removed
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="connection-tracker",
+                                            daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        with self._lock:
+            thread, self._thread = self._thread, None
+        self._stop.set()
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+
+    def _run(self):
+        self.poll()
+        while not self.exited and not self._stop.wait(self.interval):
+            self.poll()
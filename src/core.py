@@ -1,149 +1,901 @@
 import subprocess
+import bisect
+import ipaddress
 import threading
 import logging
-import json
-import os
-from concurrent.futures import ThreadPoolExecutor, Future, as_completed
-from queue import Queue
-from typing import Dict, Optional, List
+import errno
+import select
+import socket
+import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, Iterable, Optional, List, Set, Tuple
 import time
+from contextlib import contextmanager
+from types import MappingProxyType
+import numpy as np
+import psutil
+from .prober import IcmpProber, ProbeResult
+from .probe_cache import ProbeCache
+from .matrix import LatencyMatrix, DEFAULT_SCORE_LIMITS
+from .selection import adaptive_select
+from .bandit import RouteBandit, DIRECT
+from .routing import RouteBackend, RouteChange, default_route_backend
+from .journal import RouteJournal
+from .aggregate import aggregate_prefixes
+from .scheduler import ProbeScheduler
+from .reoptimize import ReoptimizeController
+from .timeseries import SeriesStore
+from .history import MeasurementStore, network_fingerprint, NODE, PATH
+from .config import CompiledConfig, ConfigManager, data_path, get_config_manager
+from .ipdb import IpIndex, IpInfo, load_ipdb
+from .geo import Coordinate
+from .hops import HopTracer, IcmpTracer, PathAnalyzer, Segment
+from .connections import ConnectionTracker
+from .events import EventBus, LatencySample, RouteChanged, OptimizationProgress
 
-class AcceleratorCore:
-    def __init__(self):
-        self.active = False
-        self.routes = {}
-        self.lock = threading.Lock()
-        self.status_queue = Queue()
-        self.executor = ThreadPoolExecutor(max_workers=5)  # 增加并发数
-        self.monitor_future: Optional[Future] = None
-        self._load_config()
-        
-    def _load_config(self):
-        """加载配置"""
+
+class ProbeBackend:
+    """探测后端基类
+
+    每个后端对一批目标执行count轮探测，返回目标到ProbeResult的映射。
+    """
+    name = ""
+
+    def __init__(self, port: Optional[int] = None):
+        self.port = port
+
+    def probe(self, hosts: List[str], count: int = 4, timeout: int = 1000,
+              port: Optional[int] = None) -> Dict[str, ProbeResult]:
+        raise NotImplementedError
+
+
+class IcmpBackend(ProbeBackend):
+    """ICMP回显探测，无法创建套接字时回退到系统ping命令"""
+    name = "icmp"
+
+    def __init__(self, prober: Optional[IcmpProber] = None):
+        super().__init__()
+        self.prober = prober or IcmpProber()
+
+    def probe(self, hosts: List[str], count: int = 4, timeout: int = 1000,
+              port: Optional[int] = None) -> Dict[str, ProbeResult]:
         try:
-            config_path = os.path.join(os.path.dirname(__file__), '..', 'config.json')
-            with open(config_path, 'r', encoding='utf-8') as f:
-                self.config = json.load(f)
-            logging.info("配置加载成功")
+            if self.prober.available:
+                return self.prober.probe(hosts, count=count, timeout=timeout)
         except Exception as e:
-            logging.error(f"加载配置失败: {str(e)}")
-            self.config = {}
+            logging.error(f"ICMP探测失败: {str(e)}")
 
-    def test_latency(self, host: str, count: int = 4, timeout: int = 1000) -> float:
-        """测试延迟"""
+        # 无法创建ICMP套接字时回退到系统ping命令
+        return {host: self._ping_subprocess(host, count, timeout) for host in hosts}
+
+    def _ping_subprocess(self, host: str, count: int, timeout: int) -> ProbeResult:
+        """使用系统ping命令测试延迟"""
+        result = ProbeResult(host, sent=count)
         try:
-            # 使用更快的ping参数
-            cmd = f'ping -n {count} -w {timeout} {host}'
-            result = subprocess.run(cmd, capture_output=True, text=True, shell=True)
+            if sys.platform == 'win32':
+                cmd = ['ping', '-n', str(count), '-w', str(timeout), host]
+            else:
+                # POSIX下-W的单位为秒
+                cmd = ['ping', '-c', str(count), '-W', str(max(1, -(-timeout // 1000))), host]
+            output = subprocess.run(cmd, capture_output=True, text=True)
             
-            if result.returncode == 0:
+            if output.returncode == 0:
                 # 提取平均延迟
-                for line in result.stdout.split('\n'):
-                    if '平均 = ' in line:
-                        avg = line.split('=')[-1].strip('ms').strip()
-                        return float(avg)
-                    elif 'Average = ' in line:
-                        avg = line.split('=')[-1].strip('ms').strip()
-                        return float(avg)
+                received = count
+                for line in output.stdout.split('\n'):
+                    if '平均 = ' in line or 'Average = ' in line:
+                        avg = float(line.split('=')[-1].strip('ms').strip())
+                        result.rtts = [avg] * count
+                        return result
+                    if 'received' in line:
+                        # 4 packets transmitted, 3 received, 25% packet loss
+                        for part in line.split(','):
+                            if 'received' in part:
+                                received = int(part.split()[0])
+                    if line.startswith(('rtt ', 'round-trip ')):
+                        # rtt min/avg/max/mdev = 0.1/0.2/0.3/0.1 ms
+                        avg = float(line.split('=')[-1].split('/')[1])
+                        result.rtts = [avg] * min(received, count)
+                        return result
                         
-            logging.warning(f"Ping {host} 失败: {result.stderr}")
-            return 999.0
+            logging.warning(f"Ping {host} 失败: {output.stderr}")
+            return result
             
         except Exception as e:
             logging.error(f"测试延迟失败: {str(e)}")
-            return 999.0
+            return result
 
-    def _test_node_quality(self, node: Dict) -> Dict:
-        """测试节点质量"""
+
+def _resolve_hosts(hosts: List[str], results: Dict[str, ProbeResult],
+                   count: int) -> Dict[str, str]:
+    """解析主机名，无法解析的目标直接记为全部丢包"""
+    addrs = {}
+    for host in hosts:
         try:
-            node_ip = node["ip"]
-            logging.info(f"测试节点: {node_ip}")
-            
-            # 快速测试节点延迟
-            node_latency = self.test_latency(node_ip, count=2, timeout=500)
-            if node_latency >= 100:  # 跳过高延迟节点
-                logging.warning(f"节点 {node_ip} 延迟过高: {node_latency}ms")
-                return {"ip": node_ip, "score": 0, "latency": node_latency}
-                
-            # 测试节点到目标服务器的连通性
-            success_count = 0
-            total_latency = 0
-            test_count = 0
-            
-            # 只测试当前游戏和区服的服务器
-            game_servers = self.current_game_servers
-            if game_servers:
-                for server_group in game_servers.values():
-                    for server in server_group:
-                        test_count += 1
-                        server_latency = self.test_latency(server, count=2, timeout=500)
-                        if server_latency < 999.0:
-                            success_count += 1
-                            total_latency += server_latency
-                            
-            connectivity = success_count / test_count if test_count > 0 else 0
-            avg_latency = total_latency / success_count if success_count > 0 else 999.0
-            
-            # 计算节点得分 (0-100)
-            score = (
-                (1 - node_latency/200) * 40 +  # 节点延迟占40%
-                connectivity * 30 +            # 连通性占30%
-                (1 - avg_latency/500) * 30     # 平均延迟占30%
-            ) if node_latency < 200 else 0
-            
-            result = {
-                "ip": node_ip,
-                "score": max(0, min(100, score)),
-                "latency": node_latency,
-                "connectivity": connectivity,
-                "avg_latency": avg_latency
-            }
-            
-            logging.info(f"节点 {node_ip} 测试结果: 得分={result['score']:.1f}, "
-                        f"延迟={node_latency:.0f}ms, 连通性={connectivity:.1%}")
-            return result
-            
+            addrs[host] = socket.gethostbyname(host)
+        except OSError:
+            logging.warning(f"无法解析主机名: {host}")
+            results[host].sent = count
+    return addrs
+
+
+class TcpBackend(ProbeBackend):
+    """TCP握手探测
+
+    每轮同时向所有目标发起非阻塞连接，以握手完成（或收到RST）的时间作为往返延迟。
+    """
+    name = "tcp"
+
+    def __init__(self, port: int = 80):
+        super().__init__(port)
+
+    def probe(self, hosts: List[str], count: int = 4, timeout: int = 1000,
+              port: Optional[int] = None) -> Dict[str, ProbeResult]:
+        port = port or self.port
+        results = {host: ProbeResult(host) for host in hosts}
+        addrs = _resolve_hosts(hosts, results, count)
+
+        for _ in range(count):
+            pending: Dict[socket.socket, Tuple[str, float]] = {}
+            for host, addr in addrs.items():
+                results[host].sent += 1
+                sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+                sock.setblocking(False)
+                started = time.perf_counter()
+                code = sock.connect_ex((addr, port))
+                if code in (0, errno.ECONNREFUSED):
+                    results[host].rtts.append((time.perf_counter() - started) * 1000)
+                    sock.close()
+                elif code in (errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EALREADY,
+                              getattr(errno, 'WSAEWOULDBLOCK', -1)):
+                    pending[sock] = (host, started)
+                else:
+                    sock.close()
+
+            deadline = time.perf_counter() + timeout / 1000
+            try:
+                while pending:
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        break
+                    _, writable, failed = select.select([], list(pending), list(pending), remaining)
+                    now = time.perf_counter()
+                    for sock in set(writable) | set(failed):
+                        host, started = pending.pop(sock)
+                        error = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+                        # 连接被拒绝同样完成了一次往返
+                        if error in (0, errno.ECONNREFUSED, getattr(errno, 'WSAECONNREFUSED', -1)):
+                            results[host].rtts.append((now - started) * 1000)
+                        sock.close()
+            finally:
+                for sock in pending:
+                    sock.close()
+
+        return results
+
+
+class UdpBackend(ProbeBackend):
+    """UDP回显探测
+
+    向目标端口发送负载，以收到任意应答或ICMP端口不可达的时间作为往返延迟。
+    """
+    name = "udp"
+
+    def __init__(self, port: int = 7, payload: bytes = b'steam-accelerator'):
+        super().__init__(port)
+        self.payload = payload
+
+    def probe(self, hosts: List[str], count: int = 4, timeout: int = 1000,
+              port: Optional[int] = None) -> Dict[str, ProbeResult]:
+        port = port or self.port
+        results = {host: ProbeResult(host) for host in hosts}
+        addrs = _resolve_hosts(hosts, results, count)
+
+        for _ in range(count):
+            pending: Dict[socket.socket, Tuple[str, float]] = {}
+            try:
+                for host, addr in addrs.items():
+                    results[host].sent += 1
+                    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+                    try:
+                        sock.setblocking(False)
+                        sock.connect((addr, port))
+                        started = time.perf_counter()
+                        sock.send(self.payload)
+                    except OSError as e:
+                        logging.debug(f"发送UDP探测到 {host} 失败: {str(e)}")
+                        sock.close()
+                        continue
+                    pending[sock] = (host, started)
+
+                deadline = time.perf_counter() + timeout / 1000
+                while pending:
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        break
+                    readable, _, _ = select.select(list(pending), [], [], remaining)
+                    now = time.perf_counter()
+                    for sock in readable:
+                        host, started = pending.pop(sock)
+                        try:
+                            sock.recv(2048)
+                            results[host].rtts.append((now - started) * 1000)
+                        except ConnectionRefusedError:
+                            # 端口不可达说明链路可达，同样计为一次往返
+                            results[host].rtts.append((now - started) * 1000)
+                        except OSError:
+                            pass
+                        sock.close()
+            finally:
+                for sock in pending:
+                    sock.close()
+
+        return results
+
+
+A2S_HEADER = b'\xFF\xFF\xFF\xFF'
+A2S_INFO_REQUEST = A2S_HEADER + b'TSource Engine Query\x00'
+A2S_CHALLENGE_RESPONSE = 0x41  # 'A'
+A2S_INFO_RESPONSE = 0x49       # 'I'
+A2S_SPLIT_HEADER = b'\xFE\xFF\xFF\xFF'
+
+
+class A2sBackend(ProbeBackend):
+    """Steam A2S_INFO探测
+
+    通过单个UDP套接字同时向多个游戏服务器发送A2S_INFO查询，按来源地址匹配应答，
+    测得的是游戏流量实际经过的UDP路径延迟。服务器返回的挑战值会被缓存，
+    后续查询自动附带。从未应答过的服务器在第一次超时后即停止查询，
+    整次探测都没有应答的服务器在silent_ttl秒内不再查询，直接返回未发送的结果交给备用探测方式，
+    不响应A2S的目标每silent_ttl秒最多只花费一个timeout。
+
+    Args:
+        port: 默认查询端口
+        silent_ttl: 不响应A2S的服务器跳过查询的时间(秒)
+    """
+    name = "a2s"
+
+    def __init__(self, port: int = 27015, silent_ttl: float = 300.0):
+        super().__init__(port)
+        self.silent_ttl = silent_ttl
+        self._challenges: Dict[Tuple[str, int], bytes] = {}
+        self._silent: Dict[Tuple[str, int], float] = {}  # 地址 -> 恢复查询的时间
+        self._lock = threading.Lock()
+
+    def _skip_silent(self, addresses: List[Tuple[str, int]]) -> Set[Tuple[str, int]]:
+        """仍在跳过期内的不响应A2S的地址"""
+        now = time.monotonic()
+        with self._lock:
+            for address in [a for a, until in self._silent.items() if until <= now]:
+                del self._silent[address]
+            return {address for address in addresses if address in self._silent}
+
+    def _build_query(self, address: Tuple[str, int]) -> bytes:
+        with self._lock:
+            return A2S_INFO_REQUEST + self._challenges.get(address, b'')
+
+    def _handle_reply(self, address: Tuple[str, int], packet: bytes) -> bool:
+        """处理应答，返回是否为有效的A2S应答"""
+        if packet.startswith(A2S_SPLIT_HEADER):
+            return True
+        if not packet.startswith(A2S_HEADER) or len(packet) < 5:
+            return False
+        kind = packet[4]
+        if kind == A2S_CHALLENGE_RESPONSE and len(packet) >= 9:
+            with self._lock:
+                self._challenges[address] = packet[5:9]
+            return True
+        return kind == A2S_INFO_RESPONSE
+
+    def probe(self, hosts: List[str], count: int = 4, timeout: int = 1000,
+              port: Optional[int] = None) -> Dict[str, ProbeResult]:
+        port = port or self.port
+        results = {host: ProbeResult(host) for host in hosts}
+        addrs = _resolve_hosts(hosts, results, count)
+        by_address = {(addr, port): host for host, addr in addrs.items()}
+        for address in self._skip_silent(list(by_address)):
+            del by_address[address]
+        if not by_address:
+            return results
+
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            sock.setblocking(False)
+            # Windows下关闭ICMP端口不可达导致的recvfrom异常
+            if hasattr(socket, 'SIO_UDP_CONNRESET'):
+                sock.ioctl(socket.SIO_UDP_CONNRESET, False)
+
+            pending = dict(by_address)
+            for _ in range(count):
+                if not pending:
+                    break
+                sent_at: Dict[Tuple[str, int], float] = {}
+                for address, host in pending.items():
+                    results[host].sent += 1
+                    try:
+                        sock.sendto(self._build_query(address), address)
+                        sent_at[address] = time.perf_counter()
+                    except OSError as e:
+                        logging.debug(f"发送A2S查询到 {host} 失败: {str(e)}")
+
+                deadline = time.perf_counter() + timeout / 1000
+                while sent_at:
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        break
+                    readable, _, _ = select.select([sock], [], [], remaining)
+                    if not readable:
+                        break
+                    try:
+                        packet, address = sock.recvfrom(4096)
+                    except (BlockingIOError, ConnectionResetError):
+                        continue
+                    now = time.perf_counter()
+                    started = sent_at.get(address)
+                    if started is None or not self._handle_reply(address, packet):
+                        continue
+                    del sent_at[address]
+                    results[by_address[address]].rtts.append((now - started) * 1000)
+                # 首次查询即超时的服务器视为不响应A2S，不再等待剩余轮次，尽快交给备用探测方式
+                for address in sent_at:
+                    if not results[by_address[address]].received:
+                        del pending[address]
+        finally:
+            sock.close()
+
+        until = time.monotonic() + self.silent_ttl
+        with self._lock:
+            for address, host in by_address.items():
+                if results[host].received:
+                    self._silent.pop(address, None)
+                elif results[host].sent:
+                    self._silent[address] = until
+        return results
+
+
+class FakeBackend(ProbeBackend):
+    """确定性的内存探测后端，用于离线环境下测试节点选择
+
+    Args:
+        latencies: 目标到固定延迟(ms)的映射，未列出的目标视为不可达
+        loss: 目标到丢包率的映射
+    """
+    name = "fake"
+
+    def __init__(self, latencies: Optional[Dict[str, float]] = None,
+                 loss: Optional[Dict[str, float]] = None):
+        super().__init__()
+        self.latencies = dict(latencies or {})
+        self.loss = dict(loss or {})
+        self.calls = 0
+
+    def probe(self, hosts: List[str], count: int = 4, timeout: int = 1000,
+              port: Optional[int] = None) -> Dict[str, ProbeResult]:
+        self.calls += 1
+        results = {}
+        for host in hosts:
+            result = ProbeResult(host, sent=count)
+            latency = self.latencies.get(host)
+            if latency is not None and latency <= timeout:
+                received = count - int(round(self.loss.get(host, 0.0) * count))
+                result.rtts = [float(latency)] * max(0, received)
+            results[host] = result
+        return results
+
+
+PROBE_BACKENDS = {
+    "icmp": IcmpBackend,
+    "tcp": TcpBackend,
+    "udp": UdpBackend,
+    "a2s": A2sBackend,
+}
+
+
+class AcceleratorCore:
+    def __init__(self, probe_backend: Optional[ProbeBackend] = None,
+                 route_backend: Optional[RouteBackend] = None,
+                 config_manager: Optional[ConfigManager] = None,
+                 hop_tracer: Optional[HopTracer] = None):
+        self.active = False
+        self.routes = {}
+        self.lock = threading.Lock()
+        # 已发布的只读状态快照，读取无需加锁（构造完成时发布第一个版本）
+        self._status_version = 0
+        self._status_snapshot: MappingProxyType = MappingProxyType({})
+        self._latency_stats: Dict[str, MappingProxyType] = {}  # 代表地址 -> 最近发布的延迟统计
+        self.events = EventBus()
+        self.executor = ThreadPoolExecutor(max_workers=5)  # 增加并发数
+        self.current_game_servers: Dict[str, List[str]] = {}
+        self.current_game: Optional[str] = None
+        self.current_region: Optional[str] = None
+        self.network_id: Optional[str] = None  # 本次会话的本地网络指纹
+        self.local_isp: Optional[str] = None  # 本次会话检测到的本地运营商
+        self.local_location: Optional[Coordinate] = None  # 本机的大致坐标
+        self.session_matrix: Optional[LatencyMatrix] = None
+        self.session_nodes: List[Dict] = []
+        # 聚合后的路由前缀：服务器 -> (网络地址, 前缀长度)，前缀 -> 成员（第一个为代表地址）
+        self.route_prefixes: Dict[str, Tuple[str, int]] = {}
+        self.prefix_members: Dict[Tuple[str, int], List[str]] = {}
+        # 按起始地址排序的前缀区间 (起始, 结束, 前缀)，用于远端地址的查找
+        self._prefix_ranges: List[Tuple[int, int, Tuple[str, int]]] = []
+        self._prefix_starts: List[int] = []
+        # 按游戏连接加速时正在使用的前缀，None表示加速全部前缀
+        self.in_use: Optional[Set[Tuple[str, int]]] = None
+        self.connection_tracker: Optional[ConnectionTracker] = None
+        self._discovery_lock = threading.Lock()
+        self._discovery_timer: Optional[threading.Timer] = None
+        self.bandit = RouteBandit()
+        self.startup_timings: Dict[str, float] = {}
+        self._bandit_cursor = 0
+        self._bandit_lock = threading.Lock()
+        self._bandit_last = 0.0
+        self._exploring = set()  # 正在临时切换线路试探的服务器，其监控结果不计入
+        self._reported_segments: Dict[Tuple[str, str], Set[Tuple[int, str, str]]] = {}  # 已告警的问题路段
+        self._prefix_locks: Dict[Tuple[str, int], threading.Lock] = {}  # 同一前缀的测量串行进行
+        # 指定probe_backend时所有探测都交给该后端（例如FakeBackend）
+        self.probe_backend = probe_backend
+        self.backends: Dict[str, ProbeBackend] = {name: cls() for name, cls in PROBE_BACKENDS.items()}
+        self.probe_specs: Dict[str, Dict] = {}
+        self.route_backend = route_backend or default_route_backend()
+        # 与游戏检测共用同一份配置，配置文件变化时自动热替换
+        self.config_manager = config_manager or get_config_manager()
+        self._build_probe_specs()
+        self.config_manager.subscribe(self._on_config_reload)
+        self.config_manager.start_watching()
+        settings = self.config.get("settings", {})
+        self.probe_cache = ProbeCache(ttl=settings.get("probe_cache_ttl", 5.0),
+                                      max_size=settings.get("probe_cache_size", 1024))
+        # 每个路由前缀（以代表地址为键）的监控延迟历史
+        self.series = SeriesStore(settings.get("series_capacity", 600))
+        self.journal = RouteJournal(data_path(settings.get("route_journal", "routes.journal")))
+        self.history = MeasurementStore(
+            data_path(settings.get("measurement_db", "measurements.db")),
+            retention_days=settings.get("history_retention_days", 60))
+        self.history.compact()
+        # 离线IP归属库，用于识别本地运营商；文件不存在时不按运营商筛选节点
+        self.ip_index: Optional[IpIndex] = load_ipdb(
+            data_path(settings.get("ip_database", "ip_isp.ipdb")))
+        self.scheduler = ProbeScheduler(
+            lambda hosts: self.probe_latency(hosts, count=2, use_cache=False),
+            self._on_monitor_results,
+            min_interval=settings.get("monitor_min_interval", 1.0),
+            max_interval=settings.get("monitor_max_interval", 10.0),
+            max_backoff=settings.get("monitor_max_backoff", 60.0),
+            rate=settings.get("monitor_probe_rate", 50.0))
+        # 逐跳路径分析，键为 (节点或DIRECT, 代表服务器)
+        self.path_analyzer = PathAnalyzer(
+            hop_tracer or IcmpTracer(),
+            loss_threshold=settings.get("path_loss_threshold", 0.2),
+            latency_jump=settings.get("path_latency_jump", 30.0),
+            max_hops=settings.get("path_max_hops", 30),
+            count=settings.get("path_probe_count", 3))
+        # 已安装路由的周期性逐跳分析，与延迟监控分开调度，逐跳探测耗时长且不需要频繁
+        path_interval = settings.get("path_analysis_interval", 30.0)
+        self.path_scheduler = ProbeScheduler(
+            self._trace_routes, lambda results: None,
+            min_interval=path_interval, max_interval=path_interval * 4,
+            max_backoff=path_interval * 10, rate=1.0, max_batch=1, workers=1)
+        self.reoptimizer = ReoptimizeController(
+            self.executor, lambda server, superseded: self._optimize_route(server, True, superseded),
+            trigger_ratio=settings.get("reoptimize_trigger_ratio", 1.5),
+            clear_ratio=settings.get("reoptimize_clear_ratio", 1.2),
+            cooldown=settings.get("reoptimize_cooldown", 10.0),
+            max_cooldown=settings.get("reoptimize_max_cooldown", 300.0))
+        with self.lock:
+            self._publish_status()
+        
+    @property
+    def compiled(self) -> CompiledConfig:
+        """当前版本的编译后配置"""
+        return self.config_manager.current
+
+    @property
+    def config(self) -> Dict:
+        return self.config_manager.current.raw
+
+    def _on_config_reload(self, compiled: CompiledConfig):
+        """配置热替换：重建探测方式，正在进行的加速继续使用启动时的服务器和节点"""
+        self._build_probe_specs()
+        logging.info(f"已应用配置版本 {compiled.version}")
+
+    def _build_probe_specs(self):
+        """取用编译配置中每个目标的探测方式"""
+        self.probe_specs = self.compiled.probe_specs
+        self.default_probe_spec = self.compiled.default_probe_spec
+
+    @property
+    def prober(self) -> IcmpProber:
+        return self.backends["icmp"].prober
+
+    def test_latency(self, host: str, count: int = 4, timeout: int = 1000,
+                     use_cache: bool = True) -> float:
+        """测试延迟"""
+        return self.probe_latency([host], count, timeout, use_cache)[host].avg
+
+    def _probe_spec(self, host: str) -> Dict:
+        return self.probe_specs.get(host, self.default_probe_spec)
+
+    def probe_latency(self, hosts: List[str], count: int = 4, timeout: int = 1000,
+                      use_cache: bool = True) -> Dict[str, ProbeResult]:
+        """批量测试延迟
+
+        结果经过缓存：TTL内的相同请求直接复用，其他线程正在测量的目标等待其结果。
+        use_cache为False时强制重新测量，并用新结果刷新缓存。
+        """
+        keys = {}
+        for host in hosts:
+            spec = self._probe_spec(host)
+            keys[host] = (host, spec.get("method", "icmp"), spec.get("port"),
+                          spec.get("fallback"), count, timeout)
+
+        hits, waiting, claimed = self.probe_cache.claim(list(keys.values()), use_cache)
+        measured = {}
+        try:
+            to_measure = [host for host, key in keys.items() if key in claimed]
+            if to_measure:
+                measured = self._measure_latency(to_measure, count, timeout)
+                for host in to_measure:
+                    self.probe_cache.fulfill(keys[host], measured[host], claimed[keys[host]])
+        except BaseException as e:
+            for key in claimed:
+                self.probe_cache.fail(key, e)
+            raise
+
+        results = {}
+        for host, key in keys.items():
+            if host in measured:
+                results[host] = measured[host]
+            elif key in hits:
+                results[host] = hits[key]
+            else:
+                try:
+                    results[host] = waiting[key].result()
+                except Exception:
+                    results[host] = ProbeResult(host, sent=count)
+        return results
+
+    def _measure_latency(self, hosts: List[str], count: int,
+                         timeout: int) -> Dict[str, ProbeResult]:
+        """按目标配置的探测方式分组后实际探测"""
+        if self.probe_backend is not None:
+            return self.probe_backend.probe(hosts, count=count, timeout=timeout)
+
+        batches: Dict[Tuple[str, Optional[int], Optional[str]], List[str]] = {}
+        for host in hosts:
+            spec = self._probe_spec(host)
+            key = (spec.get("method", "icmp"), spec.get("port"), spec.get("fallback"))
+            batches.setdefault(key, []).append(host)
+
+        results = {}
+        for (method, port, fallback), batch in batches.items():
+            results.update(self._probe_with(method, batch, count, timeout, port))
+            # 应用层探测无应答时（例如服务器不响应A2S查询）改用备用方式
+            if fallback:
+                silent = [host for host in batch if not results[host].received]
+                if silent:
+                    results.update(self._probe_with(fallback, silent, count, timeout, None))
+        return results
+
+    def _probe_with(self, method: str, hosts: List[str], count: int, timeout: int,
+                    port: Optional[int]) -> Dict[str, ProbeResult]:
+        """使用指定后端探测一批目标"""
+        backend = self.backends.get(method)
+        if backend is None:
+            logging.error(f"未知的探测方式: {method}")
+            return {host: ProbeResult(host, sent=count) for host in hosts}
+        try:
+            return backend.probe(hosts, count=count, timeout=timeout, port=port)
         except Exception as e:
-            logging.error(f"测试节点质量失败: {str(e)}")
-            return {"ip": node["ip"], "score": 0, "latency": 999.0}
+            logging.error(f"{method} 探测失败: {str(e)}")
+            return {host: ProbeResult(host, sent=count) for host in hosts}
+
+    def _region_nodes(self, region: str) -> List[Dict]:
+        """获取区服的全部节点（国服为所有运营商的节点，已在编译配置时展开）"""
+        return self.compiled.region_nodes(region)
+
+    def _current_servers(self) -> List[str]:
+        """当前游戏和区服的全部服务器"""
+        return [server for server_group in self.current_game_servers.values()
+                for server in server_group]
+
+    def _build_route_prefixes(self):
+        """把相邻的服务器聚合为覆盖前缀，每个前缀只测量和安装一次
+
+        前缀多覆盖的地址不是游戏服务器，但同样会经中转节点转发。
+        route_aggregation_max_extra 为1时 .1-.3 即可合并为一个/30，只多带一个网络地址；
+        更大的值能进一步减少路由条数，代价是更多无关地址绕行节点。
+        """
+        max_extra = self.config.get("settings", {}).get("route_aggregation_max_extra", 0)
+        self.route_prefixes = {}
+        self.prefix_members = {}
+        for network, prefixlen, members in aggregate_prefixes(self._current_servers(), max_extra):
+            self.prefix_members[(network, prefixlen)] = members
+            for server in members:
+                self.route_prefixes[server] = (network, prefixlen)
+        ranges = []
+        for network, prefixlen in self.prefix_members:
+            start = int(ipaddress.IPv4Address(network))
+            ranges.append((start, start + (1 << (32 - prefixlen)) - 1, (network, prefixlen)))
+        self._prefix_ranges = sorted(ranges)
+        self._prefix_starts = [start for start, _, _ in self._prefix_ranges]
+        logging.info(f"{len(self.route_prefixes)} 个服务器聚合为 {len(self.prefix_members)} 条路由")
+
+    def _representatives(self) -> List[str]:
+        """每个路由前缀的代表服务器（按游戏连接加速时只包括正在使用的前缀）"""
+        if self.in_use is not None:
+            return [members[0] for prefix, members in self.prefix_members.items()
+                    if prefix in self.in_use]
+        if self.prefix_members:
+            return [members[0] for members in self.prefix_members.values()]
+        return self._current_servers()
+
+    def _route_prefix(self, server: str) -> Tuple[str, int]:
+        return self.route_prefixes.get(server, (server, 32))
+
+    def _members(self, server: str) -> List[str]:
+        """与服务器共用同一路由的全部服务器"""
+        return self.prefix_members.get(self._route_prefix(server), [server])
+
+    def _update_members(self, server: str, **fields):
+        """更新与服务器共用同一路由的所有服务器的状态"""
+        events = []
+        with self.lock:
+            for member in self._members(server):
+                route = self.routes.get(member)
+                if route is None:
+                    continue
+                route.update(fields)
+                if "node" in fields:
+                    events.append(RouteChanged(member, route["node"], route.get("prefix")))
+                if "current_latency" in fields:
+                    events.append(LatencySample(member, route["current_latency"],
+                                                route["original_latency"]))
+            self._publish_status()
+        self.events.publish_all(events)
+
+    def _publish_status(self, touched: Iterable[str] = ()):
+        """把当前状态复制为新的只读快照并发布（调用方持有self.lock）
+
+        各组件的计数在发布时一并生成，延迟统计只重新计算touched中延迟历史有变化的代表地址，
+        其余沿用上次发布的统计。快照一经发布不再修改，get_status直接返回最新快照的引用。
+        """
+        routes = MappingProxyType({server: MappingProxyType(dict(route))
+                                   for server, route in self.routes.items()})
+        for representative in touched:
+            summary = self.series.summary(representative)
+            if summary is None:
+                self._latency_stats.pop(representative, None)
+            else:
+                self._latency_stats[representative] = MappingProxyType(summary)
+        # 同一前缀的服务器共用代表地址的延迟历史
+        latency_stats = {}
+        for server in routes:
+            stats = self._latency_stats.get(self._members(server)[0])
+            if stats is not None:
+                latency_stats[server] = stats
+        status = {
+            "active": self.active,
+            "routes": routes,
+            "probe_cache": MappingProxyType(self.probe_cache.stats()),
+            "monitor": MappingProxyType(self.scheduler.stats()),
+            "reoptimize": MappingProxyType(self.reoptimizer.stats()),
+            "latency_stats": MappingProxyType(latency_stats),
+            "startup_timings": MappingProxyType(dict(self.startup_timings))
+        }
+        tracker = self.connection_tracker
+        if tracker is not None:
+            status["connections"] = tuple(sorted(tracker.active()))
+        self._status_version += 1
+        status["version"] = self._status_version
+        self._status_snapshot = MappingProxyType(status)
+
+    def _set_startup_timings(self, timings: Dict[str, float]):
+        with self.lock:
+            self.startup_timings = dict(timings)
+            self._publish_status()
+
+    def _local_addresses(self) -> Tuple[Optional[str], Optional[str]]:
+        """本机出口地址和默认网关"""
+        local_ip = None
+        try:
+            # UDP connect只选择出口地址，不会发送数据
+            with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+                sock.connect(("8.8.8.8", 53))
+                local_ip = sock.getsockname()[0]
+        except OSError:
+            pass
+        try:
+            gateway = self.route_backend.snapshot().get(("0.0.0.0", 0))
+        except Exception:
+            gateway = None
+        return local_ip, gateway
+
+    def _local_ip_info(self, local_ip: Optional[str], gateway: Optional[str]) -> List[Tuple[str, IpInfo]]:
+        """在IP归属库中依次查询出口地址、各网卡地址（拨号上网时为公网地址）和默认网关"""
+        if self.ip_index is None:
+            return []
+        addresses = [local_ip]
+        try:
+            for addrs in psutil.net_if_addrs().values():
+                addresses.extend(addr.address for addr in addrs if addr.family == socket.AF_INET)
+        except Exception as e:
+            logging.error(f"获取网卡地址失败: {str(e)}")
+        addresses.append(gateway)
+
+        found = []
+        for address in dict.fromkeys(a for a in addresses if a):
+            info = self.ip_index.lookup(address)
+            if info is not None:
+                found.append((address, info))
+        return found
+
+    def _detect_local_isp(self, found: List[Tuple[str, IpInfo]]) -> Optional[str]:
+        """识别本地运营商，返回国服节点的运营商分组名
+
+        配置了 local_isp 时直接使用，否则取归属库查询结果中第一个能对应到节点分组的运营商。
+        """
+        settings = self.config.get("settings", {})
+        if settings.get("local_isp"):
+            return settings["local_isp"]
+        groups = {isp for _, isp in self.compiled.node_index.values() if isp}
+        for address, info in found:
+            # 归属库中的运营商名称（如"中国电信"）包含节点分组名（如"电信"）
+            for isp in groups:
+                if isp in info.isp:
+                    logging.info(f"本地地址 {address} 属于 {info.province}{info.isp} (AS{info.asn})")
+                    return isp
+        return None
+
+    def _detect_local_location(self, found: List[Tuple[str, IpInfo]]) -> Optional[Coordinate]:
+        """本机的大致坐标：优先使用配置的 client_location，否则取归属库中的省份"""
+        setting = self.config.get("settings", {}).get("client_location")
+        if setting:
+            return self.compiled.locate(setting)
+        for _, info in found:
+            coordinate = self.compiled.locate(info.province)
+            if coordinate is not None:
+                return coordinate
+        return None
+
+    def _geo_candidates(self, region: str, nodes: List[Dict]) -> List[Dict]:
+        """探测前按地理位置预筛选节点
+
+        对当前游戏的每个服务器组，从区服的地理索引中取客户端经节点到服务器组绕路最少的
+        geo_candidates 个节点，取并集；没有坐标的节点无法判断，全部保留。
+        客户端位置未知时只能按到服务器的距离排序，会排除离用户近的节点，因此不做预筛选。
+        """
+        k = self.config.get("settings", {}).get("geo_candidates", 0)
+        index = self.compiled.geo_index(region)
+        if k <= 0 or index is None or len(index) <= k:
+            return nodes
+        if self.local_location is None:
+            logging.info("本机位置未知，跳过按地理位置预筛选节点")
+            return nodes
+        targets = [self.compiled.group_coords[group] for group in self.current_game_servers
+                   if group in self.compiled.group_coords]
+        if not targets:
+            return nodes
+        plausible = set()
+        for target in targets:
+            plausible.update(index.relays(self.local_location, target, k))
+        kept = [node for node in nodes
+                if node["ip"] in plausible or node["ip"] not in index.coordinates]
+        if len(kept) < len(nodes):
+            logging.info(f"按地理位置预筛选，{len(nodes)} 个节点中保留 {len(kept)} 个")
+        return kept
+
+    def _local_isp_nodes(self, nodes: List[Dict]) -> Tuple[List[Dict], Set[str]]:
+        """按本地运营商筛选节点
+
+        isp_node_mode 为 "restrict" 时只保留同运营商的节点，
+        为 "prioritize"（默认）时保留全部节点，同运营商的节点在评分时获得 isp_score_bonus 加分。
+
+        Returns:
+            (节点, 同运营商节点的IP)
+        """
+        if not self.local_isp:
+            return nodes, set()
+        same = {node["ip"] for node in nodes if self.compiled.node_isp(node["ip"]) == self.local_isp}
+        if not same:
+            return nodes, same
+        mode = self.config.get("settings", {}).get("isp_node_mode", "prioritize")
+        if mode == "restrict":
+            logging.info(f"本地运营商为{self.local_isp}，只测试 {len(same)} 个同运营商节点")
+            return [node for node in nodes if node["ip"] in same], same
+        logging.info(f"本地运营商为{self.local_isp}，{len(same)} 个同运营商节点评分优先")
+        return nodes, same
+
+    def _server_group(self) -> str:
+        return f"{self.current_game}/{self.current_region}"
+
+    def _history_priors(self, nodes: List[Dict]) -> Tuple[List[Dict], Dict[str, Tuple[float, float]]]:
+        """读取节点的历史测量，跳过长期不可用的节点
+
+        Returns:
+            (剩余节点, 节点IP -> 本机到节点的历史 (平均延迟, 丢包率))，
+            历史统计在自适应筛选和评分中与本次测量合并
+        """
+        settings = self.config.get("settings", {})
+        ips = [node["ip"] for node in nodes]
+        group, network = self._server_group(), self.network_id or ""
+        node_priors = self.history.priors(group, network, NODE, ips)
+        priors = self.history.priors(group, network, PATH, ips)
+        for ip, prior in node_priors.items():
+            priors.setdefault(ip, prior)
+        if not priors:
+            return nodes, {}
+
+        min_samples = settings.get("history_min_samples", 5)
+        skip_loss = settings.get("history_skip_loss", 0.8)
+        chronic = {ip for ip, prior in priors.items()
+                   if prior.samples >= min_samples and prior.loss >= skip_loss}
+        if len(nodes) - len(chronic) < 5:
+            chronic = set()
+        if chronic:
+            logging.info(f"根据历史测量跳过 {len(chronic)} 个长期不可用的节点: "
+                         f"{', '.join(sorted(chronic))}")
+        return ([node for node in nodes if node["ip"] not in chronic],
+                {ip: (prior.mean, prior.loss) for ip, prior in node_priors.items()
+                 if ip not in chronic})
 
     def _find_best_nodes(self, region: str) -> List[Dict]:
-        """查找最佳节点"""
+        """查找最佳节点
+
+        建立本次会话的节点×服务器延迟矩阵，节点与服务器各在一个批次中探测，
+        评分和排序在矩阵上一次完成。
+        """
         try:
-            nodes = []
-            if region == "国服":
-                # 对于国服，测试所有运营商的节点
-                for isp_nodes in self.config["nodes"][region].values():
-                    nodes.extend(isp_nodes)
-            else:
-                # 对于其他区域，直接获取节点列表
-                nodes = self.config["nodes"][region]
-                
+            nodes = self._region_nodes(region)
             if not nodes:
                 logging.error(f"区服 {region} 未找到可用节点")
                 return []
+            nodes = self._geo_candidates(region, nodes)
+            nodes, priors = self._history_priors(nodes)
+            nodes, same_isp = self._local_isp_nodes(nodes)
                 
             logging.info(f"开始测试 {region} 的 {len(nodes)} 个节点")
             start_time = time.time()
-                
-            # 并行测试所有节点
-            futures = []
-            for node in nodes:
-                future = self.executor.submit(self._test_node_quality, node)
-                futures.append(future)
-                
-            # 收集测试结果
-            results = []
-            for future in as_completed(futures):
-                try:
-                    result = future.result()
-                    if result["score"] > 0:  # 只保留有效节点
-                        results.append(result)
-                except Exception as e:
-                    logging.error(f"节点测试失败: {str(e)}")
-                    
-            # 按得分排序，返回前5个最佳节点
-            best_nodes = sorted(results, key=lambda x: x["score"], reverse=True)[:5]
+
+            # 只测试当前游戏和区服的服务器
+            matrix = LatencyMatrix(nodes, self._representatives())
+            settings = self.config.get("settings", {})
+            prior_weight = settings.get("history_prior_weight", 2)
+            if settings.get("selection_mode") == "adaptive":
+                # 逐轮淘汰明显较差的节点，只对有竞争力的节点继续采样
+                node_results = adaptive_select(
+                    lambda ips: self.probe_latency(ips, count=1, timeout=500, use_cache=False),
+                    matrix.node_ips, k=5, budget=settings.get("probe_budget", 0),
+                    priors=priors, prior_weight=prior_weight)
+            else:
+                node_results = self.probe_latency(matrix.node_ips, count=2, timeout=500)
+            matrix.set_node_results(node_results, priors, prior_weight)
+            self.history.record(self._server_group(), self.network_id or "", NODE, node_results)
+            matrix.set_direct_results(self.probe_latency(matrix.servers, count=2, timeout=500))
+
+            isp_bonus = settings.get("isp_score_bonus", 10)
+            bonus = np.array([isp_bonus if ip in same_isp else 0.0 for ip in matrix.node_ips])
+            metrics = matrix.score_nodes(settings.get("score_weights"), settings.get("score_limits"),
+                                         bonus)
+            top = matrix.top_nodes(metrics["score"], k=5)
+
+            best_nodes = []
+            for i in top:
+                result = {
+                    "ip": matrix.node_ips[i],
+                    "score": float(metrics["score"][i]),
+                    "latency": float(metrics["latency"][i]),
+                    "connectivity": float(metrics["connectivity"][i]),
+                    "avg_latency": float(metrics["avg_latency"][i]),
+                    "loss": float(metrics["loss"][i]),
+                    "jitter": float(metrics["jitter"][i])
+                }
+                logging.info(f"节点 {result['ip']} 测试结果: 得分={result['score']:.1f}, "
+                            f"延迟={result['latency']:.0f}ms, 连通性={result['connectivity']:.1%}, "
+                            f"丢包={result['loss']:.1%}, 抖动={result['jitter']:.1f}ms")
+                best_nodes.append(result)
+
+            self.session_matrix = matrix
+            self.session_nodes = best_nodes
             
             elapsed = time.time() - start_time
             logging.info(f"节点测试完成，耗时 {elapsed:.1f} 秒，"
@@ -154,90 +906,370 @@ class AcceleratorCore:
             logging.error(f"查找最佳节点失败: {str(e)}")
             return []
 
-    def _add_route(self, target: str, gateway: str) -> bool:
-        """添加路由"""
-        try:
-            # 先删除已存在的路由
-            self._delete_route(target)
-            
-            # 添加新路由（使用永久路由）
-            cmd = f'route add {target} mask 255.255.255.255 {gateway} -p'
-            result = subprocess.run(cmd, capture_output=True, text=True, shell=True)
-            
-            if result.returncode != 0:
-                logging.error(f"添加路由失败: {result.stderr}")
-                return False
-                
-            # 验证路由是否添加成功
-            verify_cmd = f'route print {target}'
-            verify = subprocess.run(verify_cmd, capture_output=True, text=True, shell=True)
-            success = gateway in verify.stdout
-            
-            if success:
-                logging.info(f"成功添加路由: {target} -> {gateway}")
-            else:
-                logging.error(f"路由添加验证失败: {target} -> {gateway}")
-            
-            return success
+    def _extend_session_matrix(self, servers: List[str]):
+        """把服务器追加到会话矩阵，保留已有的测量，只测量新服务器的直连延迟"""
+        direct = self.probe_latency(servers, count=2, timeout=500)
+        with self.lock:
+            self.session_matrix.add_servers(servers, direct)
+
+    def _loss_penalty(self) -> float:
+        limits = self.config.get("settings", {}).get("score_limits", {})
+        return limits.get("loss_penalty", DEFAULT_SCORE_LIMITS["loss_penalty"])
+
+    def _measure_paths(self, server: str, candidates: List[str]):
+        """逐个经候选节点访问服务器，结果写入会话矩阵"""
+        destination, prefixlen = self._route_prefix(server)
+        for node_ip in candidates:
+            logging.info(f"测试节点 {node_ip} 到服务器 {server} 的路由")
             
+            # 测试通过节点访问服务器
+            if self._add_route(destination, node_ip, prefixlen):
+                result = self.probe_latency([server])[server]
+                self._delete_route(destination, prefixlen)
+                with self.lock:
+                    self.session_matrix.set_path_result(node_ip, server, result)
+                self.history.record(self._server_group(), self.network_id or "", PATH,
+                                    {node_ip: result})
+                logging.info(f"节点 {node_ip} 延迟: {result.avg:.0f}ms")
+
+    def _apply_routes(self, changes: List[RouteChange]) -> bool:
+        """以事务方式批量应用路由变更，变更先写入路由日志"""
+        self.journal.record(changes)
+        try:
+            success = self.route_backend.apply(changes)
         except Exception as e:
-            logging.error(f"添加路由失败: {str(e)}")
-            return False
+            logging.error(f"应用路由变更失败: {str(e)}")
+            success = False
+        finally:
+            # 路由变更后之前的测量结果不再有效
+            for change in changes:
+                for member in self.prefix_members.get(change.key, [change.destination]):
+                    self.probe_cache.invalidate(member)
+        if not success:
+            self._sync_journal()
+        return success
 
-    def _delete_route(self, target: str) -> bool:
+    def _sync_journal(self):
+        """让路由日志与实际路由表一致（变更失败回滚后调用）"""
+        try:
+            live = self.route_backend.snapshot()
+            self.journal.forget([key for key, gateway in self.journal.owned.items()
+                                 if live.get(key) != gateway])
+        except Exception as e:
+            logging.error(f"同步路由日志失败: {str(e)}")
+
+    def _recover_routes(self, intended: Optional[Dict[Tuple[str, int], str]] = None):
+        """清理上次进程异常退出时遗留的路由
+
+        只处理路由日志中记录、且仍以相同网关存在于路由表中的路由：
+        与本次将要安装的路由(intended)一致的保留，其余在一个批次中删除。
+        """
+        intended = intended or {}
+        try:
+            owned = self.journal.owned
+            if not owned:
+                return
+            live = self.route_backend.snapshot()
+            present = {key for key, gateway in owned.items() if live.get(key) == gateway}
+            self.journal.forget([key for key in owned if key not in present])
+            stale = [key for key in present if intended.get(key) != owned[key]]
+            if stale:
+                logging.warning(f"发现 {len(stale)} 条上次遗留的加速路由，正在清理")
+                self._apply_routes([RouteChange.delete(dst, prefixlen) for dst, prefixlen in stale])
+            self.journal.compact()
+        except Exception as e:
+            logging.error(f"清理遗留路由失败: {str(e)}")
+
+    def _add_route(self, target: str, gateway: str, prefixlen: int = 32) -> bool:
+        """添加路由"""
+        success = self._apply_routes([RouteChange.add(target, gateway, prefixlen)])
+        if success:
+            logging.info(f"成功添加路由: {target}/{prefixlen} -> {gateway}")
+        else:
+            logging.error(f"路由添加验证失败: {target}/{prefixlen} -> {gateway}")
+        return success
+
+    def _delete_route(self, target: str, prefixlen: int = 32) -> bool:
         """删除路由"""
+        success = self._apply_routes([RouteChange.delete(target, prefixlen)])
+        if success:
+            logging.info(f"成功删除路由: {target}/{prefixlen}")
+        else:
+            logging.warning(f"删除路由失败: {target}/{prefixlen}")
+        return success
+
+    def _on_monitor_results(self, results: Dict[str, ProbeResult]):
+        """处理调度器返回的一批监控结果（同一前缀的服务器只测量代表地址）"""
+        if not self.active:
+            return
+        settings = self.config.get("settings", {})
+        bandit_mode = settings.get("route_selection") == "bandit"
+        loss_threshold = settings.get("monitor_loss_threshold", 0.2)
+        loss_penalty = self._loss_penalty()
+        events = []
+        recorded = []
+        with self.lock:
+            for server, result in results.items():
+                route = self.routes.get(server)
+                if route is None or server in self._exploring:
+                    continue
+                current_latency = result.avg
+                self.series.record(server, result)
+                recorded.append(server)
+                for member in self._members(server):
+                    if member in self.routes:
+                        self.routes[member]["current_latency"] = current_latency
+
+                if bandit_mode:
+                    # 当前路由的测量同时作为该节点的奖励样本
+                    self.bandit.record(server, route["node"] or DIRECT, current_latency)
+                else:
+                    loss = self.series.loss(server)
+                    if result.received == 0 or loss > loss_threshold:
+                        # EWMA只在有应答时更新，中转节点完全不通时仍停留在最后一次正常的值，
+                        # 此时直接使用本次测量（无应答为999）并按窗口丢包率加罚
+                        sustained = current_latency + loss * loss_penalty
+                    else:
+                        # 取本次测量与EWMA中较低者，单次尖峰不会触发重新优化
+                        sustained = min(current_latency, self.series.ewma(server) or current_latency)
+                    self.reoptimizer.observe(server, sustained, route["original_latency"])
+
+                # 发布延迟采样事件
+                for member in self._members(server):
+                    if member in self.routes:
+                        events.append(LatencySample(member, current_latency,
+                                                    self.routes[member]["original_latency"]))
+            self._publish_status(recorded)
+        self.events.publish_all(events)
+
+        if bandit_mode:
+            self._maybe_bandit_step()
+
+    def _maybe_bandit_step(self):
+        """每秒最多执行一次试探；已有批次在试探时直接跳过"""
+        if not self._bandit_lock.acquire(blocking=False):
+            return
         try:
-            cmd = f'route delete {target}'
-            result = subprocess.run(cmd, capture_output=True, shell=True)
-            success = result.returncode == 0
-            
-            if success:
-                logging.info(f"成功删除路由: {target}")
-            else:
-                logging.warning(f"删除路由失败: {target}")
-                
-            return success
+            if time.monotonic() - self._bandit_last >= 1.0:
+                self._bandit_last = time.monotonic()
+                self._bandit_step()
+        finally:
+            self._bandit_lock.release()
+
+    def _init_bandit(self):
+        """用会话矩阵中的测量初始化每个服务器的候选节点估计"""
+        self.bandit.clear()
+        for server in self._representatives():
+            self._init_bandit_server(server)
+
+    def _init_bandit_server(self, server: str):
+        if server not in self.routes:
+            return
+        matrix = self.session_matrix
+        candidates = [node["ip"] for node in self.session_nodes]
+        self.bandit.reset(server, [DIRECT] + candidates)
+        if matrix is None or server not in matrix.server_index:
+            return
+        s = matrix.server_index[server]
+        if not np.isnan(matrix.direct_rtt[s]):
+            self.bandit.record(server, DIRECT, float(matrix.direct_rtt[s]))
+        for node_ip in candidates:
+            latency = matrix.rtt[matrix.node_index[node_ip], s]
+            if not np.isnan(latency):
+                self.bandit.record(server, node_ip, float(latency))
+
+    def _set_route(self, server: str, node: str) -> bool:
+        """把服务器（所在前缀）的路由设为经节点或直连"""
+        destination, prefixlen = self._route_prefix(server)
+        if node == DIRECT:
+            return self._delete_route(destination, prefixlen)
+        return self._add_route(destination, node, prefixlen)
+
+    def _resync_route(self, server: str):
+        """恢复路由失败后按实际路由表更新服务器（所在前缀）的状态"""
+        key = self._route_prefix(server)
+        try:
+            gateway = self.route_backend.snapshot().get(key)
         except Exception as e:
-            logging.error(f"删除路由失败: {str(e)}")
-            return False
+            logging.error(f"读取路由表失败: {str(e)}")
+            return
+        logging.warning(f"恢复服务器 {server} 的路由失败，按路由表更新为: {gateway or '直连'}")
+        if gateway is not None:
+            # 回滚保留的是试探时安装的路由，仍由加速器负责撤销
+            self.journal.record([RouteChange.add(key[0], gateway, key[1])])
+        self.reoptimizer.cancel(server)
+        self._update_members(server, node=gateway)
 
-    def _monitor_routes(self):
-        """监控路由质量"""
-        while self.active:
-            try:
+    def _bandit_step(self):
+        """按探测预算试探候选节点，发现统计上更优的节点时切换路由"""
+        budget = self.config.get("settings", {}).get("bandit_probe_budget", 1)
+        with self.lock:
+            servers = [server for server in self._representatives() if server in self.routes]
+        if not servers:
+            return
+
+        for _ in range(len(servers)):
+            if budget <= 0 or not self.active:
+                break
+            server = servers[self._bandit_cursor % len(servers)]
+            self._bandit_cursor += 1
+            # 前缀正被快速启动验证或重新优化测量时跳过
+            with self._swapping_route(server, blocking=False) as acquired:
+                if acquired:
+                    budget -= self._bandit_explore(server)
+
+    def _bandit_explore(self, server: str) -> int:
+        """试探一个服务器（调用方已取得该前缀），返回消耗的探测次数"""
+        with self.lock:
+            route = self.routes.get(server)
+            current = (route["node"] if route else None) or DIRECT
+
+        spent = 0
+        arm = self.bandit.choose_exploration(server, current)
+        if arm is not None:
+            spent = 1
+            # 临时切换到候选节点测量一次，然后恢复当前路由
+            if self._set_route(server, arm):
+                latency = self.test_latency(server, count=2, use_cache=False)
+                self.bandit.record(server, arm, latency)
+            if not self._set_route(server, current):
+                self._resync_route(server)
+                return spent
+
+        better = self.bandit.better_arm(server, current)
+        if better is not None:
+            node, estimate = better
+            if self._set_route(server, node):
+                self.reoptimizer.cancel(server)
+                logging.info(f"服务器 {server} 切换线路: {current} -> {node} "
+                             f"(估计延迟 {estimate:.0f}ms)")
+                self._update_members(server, node=None if node == DIRECT else node,
+                                     current_latency=estimate)
+        return spent
+
+    def _analyze_path(self, server: str, node: Optional[str]) -> List[Segment]:
+        """对服务器当前安装的路由（经node，None为直连）做一轮逐跳分析，返回定位到的问题路段"""
+        if not self.config.get("settings", {}).get("path_analysis", True):
+            return []
+        representative = self._members(server)[0]
+        key = (node or DIRECT, representative)
+        segments = self.path_analyzer.analyze(key, representative)
+        if not segments:
+            self._reported_segments.pop(key, None)
+            return segments
+        # 问题路段在节点之前时所有节点都会受影响，更换节点无济于事
+        node_ttl = next((hop["ttl"] for hop in self.path_analyzer.hops(key)
+                         if node and hop["address"] == node), None)
+        # 周期性分析中持续存在的路段只告警一次
+        current = {(segment.ttl, segment.start, segment.end) for segment in segments}
+        reported = self._reported_segments.get(key, set())
+        self._reported_segments[key] = current
+        for segment in segments:
+            if (segment.ttl, segment.start, segment.end) in reported:
+                continue
+            where = ""
+            if node_ttl is not None:
+                where = "（节点之前）" if segment.ttl <= node_ttl else "（节点之后）"
+            logging.warning(f"服务器 {server} 经 {node or '直连'} 的路径第 {segment.ttl} 跳 "
+                            f"{segment.start} -> {segment.end} 出现问题{where}: "
+                            f"丢包+{segment.added_loss:.0%}, 延迟+{segment.added_latency:.0f}ms")
+        return segments
+
+    def _avoid_bad_segments(self, server: str, candidates: List[str],
+                            segments: List[Segment]) -> List[str]:
+        """排除已知经过问题路段的候选节点，没有逐跳记录的节点保留"""
+        if not segments:
+            return candidates
+        representative = self._members(server)[0]
+        kept = [ip for ip in candidates
+                if not self.path_analyzer.shares_segment((ip, representative), segments)]
+        if not kept:
+            return candidates
+        if len(kept) < len(candidates):
+            logging.info(f"跳过 {len(candidates) - len(kept)} 个经过问题路段的节点")
+        return kept
+
+    def get_path_analysis(self, server: Optional[str] = None) -> Dict[str, Dict]:
+        """各路由的逐跳统计和问题路段
+
+        Args:
+            server: 只返回该服务器（所在路由前缀）的路由，None为全部
+
+        Returns:
+            "节点->代表服务器" 到 {"hops": [...], "bad_segments": [...]} 的映射
+        """
+        representative = self._members(server)[0] if server else None
+        return {f"{node}->{target}": analysis
+                for (node, target), analysis in self.path_analyzer.summaries().items()
+                if representative is None or target == representative}
+
+    def _prefix_lock(self, server: str) -> threading.Lock:
+        with self.lock:
+            return self._prefix_locks.setdefault(self._route_prefix(server), threading.Lock())
+
+    def _trace_routes(self, servers: List[str]) -> Dict[str, ProbeResult]:
+        """路径分析调度的探测函数：对各前缀当前安装的路由做一轮逐跳分析
+
+        等待该前缀正在进行的测量完成，避免把临时替换的路由记到当前节点名下。
+        结果为目标一跳最近一轮的应答，未到达目标时按失败退避。
+        """
+        results = {}
+        for server in servers:
+            with self._prefix_lock(server):
                 with self.lock:
-                    if not self.active:
-                        break
-                        
-                    for server, route in self.routes.items():
-                        # 测试当前延迟
-                        current_latency = self.test_latency(server, count=2)
-                        route["current_latency"] = current_latency
-                        
-                        # 如果延迟显著增加，提交优化任务
-                        if current_latency > route["original_latency"] * 1.5:
-                            logging.info(f"服务器 {server} 延迟显著增加，"
-                                       f"从 {route['original_latency']:.0f}ms "
-                                       f"到 {current_latency:.0f}ms，准备重新优化")
-                            self.executor.submit(self._optimize_route, server)
-                            
-                        # 更新状态队列
-                        self.status_queue.put({
-                            "server": server,
-                            "latency": current_latency,
-                            "improvement": ((route["original_latency"] - current_latency) 
-                                         / route["original_latency"] * 100)
-                        })
-                        
-                # 每秒检查一次
-                time.sleep(1.0)
-                
-            except Exception as e:
-                logging.error(f"路由监控失败: {str(e)}")
-                time.sleep(5.0)
+                    route = self.routes.get(server)
+                if route is None or not self.active:
+                    continue
+                node = route["node"]
+                self._analyze_path(server, node)
+            hops = self.path_analyzer.hops((node or DIRECT, server))
+            if hops and hops[-1]["address"] == server and hops[-1]["last"] is not None:
+                results[server] = ProbeResult(server, 1, [hops[-1]["last"]])
+        return results
+
+    def _watch_paths(self, servers: List[str]):
+        """把前缀的代表地址加入周期性路径分析"""
+        if not self.config.get("settings", {}).get("path_analysis", True):
+            return
+        for server in servers:
+            self.path_scheduler.add(server, self.path_scheduler.min_interval)
+        self.path_scheduler.start()
+
+    @contextmanager
+    def _swapping_route(self, server: str, blocking: bool = True):
+        """临时替换服务器（所在前缀）的路由进行测量
+
+        同一前缀的快速启动验证、重新优化和试探串行进行，期间该前缀的监控结果不计入。
+        产出是否取得了该前缀，blocking为False且前缀正被其他任务测量时为False。
+        """
+        representative = self._members(server)[0]
+        lock = self._prefix_lock(server)
+        if not lock.acquire(blocking):
+            yield False
+            return
+        with self.lock:
+            self._exploring.add(representative)
+        try:
+            yield True
+        finally:
+            with self.lock:
+                self._exploring.discard(representative)
+            lock.release()
+
+    def _optimize_route(self, server: str, remeasure: bool = False,
+                        superseded: Optional[Callable[[], bool]] = None) -> bool:
+        """优化单个服务器的路由
+
+        Args:
+            server: 服务器地址
+            remeasure: 是否重新测量经各候选节点的延迟（监控发现延迟恶化时使用）
+            superseded: 返回True表示任务已被取代，此时放弃且不再修改路由
+        """
+        with self._swapping_route(server):
+            return self._optimize_route_locked(server, remeasure, superseded)
 
-    def _optimize_route(self, server: str) -> bool:
-        """优化单个服务器的路由"""
+    def _optimize_route_locked(self, server: str, remeasure: bool,
+                               superseded: Optional[Callable[[], bool]]) -> bool:
         try:
             logging.info(f"开始优化服务器 {server} 的路由")
             start_time = time.time()
@@ -248,41 +1280,64 @@ class AcceleratorCore:
                 logging.error(f"未找到服务器 {server} 所属的区域")
                 return False
                 
-            # 获取最佳节点
-            best_nodes = self._find_best_nodes(region)
-            if not best_nodes:
+            # 使用本次会话已建立的矩阵，缺失时查找最佳节点，新出现的服务器追加到已有矩阵
+            matrix = self.session_matrix
+            if matrix is None:
+                self._find_best_nodes(region)
+                matrix = self.session_matrix
+            elif server not in matrix.server_index:
+                self._extend_session_matrix([server])
+            best_nodes = self.session_nodes
+            if matrix is None or not best_nodes:
                 logging.error("未找到可用节点")
                 return False
                 
             # 测试当前延迟作为基准
             current_latency = self.test_latency(server)
-            best_latency = current_latency
-            best_node = None
+            with self.lock:
+                previous = self.routes.get(server, {}).get("node")
             
-            # 测试每个候选节点
-            for node in best_nodes:
-                node_ip = node["ip"]
-                logging.info(f"测试节点 {node_ip} 到服务器 {server} 的路由")
-                
-                # 测试通过节点访问服务器
-                if self._add_route(server, node_ip):
-                    route_latency = self.test_latency(server)
-                    self._delete_route(server)
-                    
-                    logging.info(f"节点 {node_ip} 延迟: {route_latency:.0f}ms "
-                               f"(当前最佳: {best_latency:.0f}ms)")
-                    
-                    if route_latency < best_latency:
-                        best_latency = route_latency
-                        best_node = node_ip
+            # 每个会话中每个服务器只测量一次，除非要求重新测量
+            candidates = [node["ip"] for node in best_nodes]
+            if remeasure:
+                # 先定位当前路由的问题路段，避开同样经过该路段的节点
+                candidates = self._avoid_bad_segments(
+                    server, candidates, self._analyze_path(server, previous))
+            s = matrix.server_index[server]
+            if remeasure or all(np.isnan(matrix.loss[matrix.node_index[ip], s]) for ip in candidates):
+                if superseded is not None and superseded():
+                    logging.info(f"服务器 {server} 的优化任务已被取代")
+                    return False
+                self._measure_paths(server, candidates)
+
+            destination, prefixlen = self._route_prefix(server)
+            direct = None
+            if remeasure:
+                # 候选节点测量完后该前缀没有路由，同时重新测量直连，
+                # 直连可能已经好于所有节点（包括刚被判定恶化的原节点）
+                if previous and not candidates:
+                    self._delete_route(destination, prefixlen)
+                direct = self.probe_latency([server], use_cache=False)[server]
+                with self.lock:
+                    matrix.set_direct_result(server, direct)
+
+            best_node, best_latency = matrix.best_nodes_for_servers(
+                candidates, self._loss_penalty())[server]
+            if superseded is not None and superseded():
+                logging.info(f"服务器 {server} 的优化任务已被取代")
+                return False
+
+            if (direct is not None and direct.received and direct.avg < current_latency
+                    and (not best_node or direct.avg <= best_latency)):
+                logging.info(f"服务器 {server} 的直连延迟 {direct.avg:.0f}ms 优于所有节点，改为直连")
+                self._update_members(server, node=None, current_latency=direct.avg,
+                                     original_latency=direct.avg)
+                return True
                         
             # 如果找到更好的节点，应用新路由
-            if best_node and self._add_route(server, best_node):
-                with self.lock:
-                    self.routes[server].update({
-                        "node": best_node,
-                        "current_latency": best_latency
-                    })
+            if (best_node and best_latency < current_latency
+                    and self._add_route(destination, best_node, prefixlen)):
+                self._update_members(server, node=best_node, current_latency=best_latency)
                     
                 elapsed = time.time() - start_time
                 improvement = ((current_latency - best_latency) / current_latency * 100 
@@ -292,8 +1347,14 @@ class AcceleratorCore:
                            f"原始延迟: {current_latency:.0f}ms\n"
                            f"优化后: {best_latency:.0f}ms\n"
                            f"改善: {improvement:+.1f}%")
+                if remeasure:
+                    # 记录新路由的逐跳基线，之后恶化时可以对比定位
+                    self._analyze_path(server, best_node)
                 return True
                 
+            if remeasure and previous and not (superseded is not None and superseded()):
+                # 测量候选节点时删除了原路由，没有更好的节点时恢复
+                self._add_route(destination, previous, prefixlen)
             logging.warning(f"服务器 {server} 未找到更好的路由")
             return False
             
@@ -301,16 +1362,333 @@ class AcceleratorCore:
             logging.error(f"优化路由失败: {str(e)}")
             return False
 
-    def start_acceleration(self, game: str, region: str) -> bool:
-        """启动加速"""
+    def _init_prefix_routes(self, network: str, prefixlen: int, members: List[str],
+                            original_latency: float, node: Optional[str] = None,
+                            current_latency: Optional[float] = None):
+        """初始化前缀内所有服务器的路由状态"""
+        if current_latency is None:
+            current_latency = original_latency
+        prefix = f"{network}/{prefixlen}"
+        with self.lock:
+            for member in members:
+                self.routes[member] = {
+                    "original_latency": original_latency,
+                    "current_latency": current_latency,
+                    "node": node,
+                    "prefix": prefix
+                }
+            self._publish_status()
+        self.events.publish_all(
+            [RouteChanged(member, node, prefix) for member in members]
+            + [LatencySample(member, current_latency, original_latency) for member in members])
+
+    def _start_monitor(self):
+        """启动监控调度，每个前缀的代表地址一个监控目标"""
+        self.scheduler.clear()
+        for server in self._representatives():
+            if server in self.routes:
+                self.scheduler.add(server, self.scheduler.min_interval)
+        self.scheduler.start()
+        self.path_scheduler.clear()
+        self._watch_paths(self.scheduler.targets())
+
+    def _save_known_routes(self):
+        """保存当前经节点加速的路由，供下次快速启动直接恢复"""
+        with self.lock:
+            known = {server: (route["node"], route["current_latency"], route["original_latency"])
+                     for server, route in self.routes.items() if route["node"]}
+            direct = [server for server, route in self.routes.items() if not route["node"]]
+        if known or direct:
+            self.history.save_routes(self._server_group(), self.network_id or "", known, direct)
+
+    def _known_prefix_routes(self) -> Dict[Tuple[str, int], Tuple[str, float, float]]:
+        """同一游戏、区服和网络下上次验证可用的路由，前缀 -> (节点, 延迟, 原始延迟)"""
+        settings = self.config.get("settings", {})
+        known = self.history.load_routes(self._server_group(), self.network_id or "",
+                                         settings.get("known_route_max_age_days", 7))
+        warm = {}
+        for prefix, members in self.prefix_members.items():
+            entry = next((known[member] for member in members if member in known), None)
+            if entry is not None:
+                warm[prefix] = entry
+        return warm
+
+    def _warm_start(self, start_time: float, timings: Dict[str, float],
+                    warm: Dict[Tuple[str, int], Tuple[str, float, float]]) -> bool:
+        """在一个批次中恢复上次验证可用的路由
+
+        成功时立即进入加速状态，节点发现和逐条验证交给后台任务；没有可用的记录时返回False。
+        """
+        if not warm:
+            return False
+
+        if not self._apply_routes([RouteChange.add(network, node, prefixlen)
+                                   for (network, prefixlen), (node, _, _) in warm.items()]):
+            logging.warning("恢复已知路由失败，改为完整测量")
+            return False
+        for (network, prefixlen), (node, latency, direct_latency) in warm.items():
+            self._init_prefix_routes(network, prefixlen, self.prefix_members[(network, prefixlen)],
+                                     direct_latency, node, latency)
+
+        with self.lock:
+            self.active = True
+            self._publish_status()
+        self._start_monitor()
+        timings["warm_start"] = time.time() - start_time
+        self._set_startup_timings(timings)
+        logging.info(f"快速启动完成，耗时 {timings['warm_start']:.2f} 秒，"
+                     f"恢复 {len(warm)}/{len(self.prefix_members)} 条已知路由，后台继续验证")
+        self.executor.submit(self._verify_warm_routes, set(warm), start_time, timings)
+        return True
+
+    def _verify_warm_routes(self, warm: set, start_time: float, timings: Dict[str, float]):
+        """后台完成节点发现，逐条确认或替换恢复的路由，并优化没有记录的前缀"""
+        try:
+            total_prefixes = len(self.prefix_members)
+            phase_start = time.time()
+            self.events.publish(OptimizationProgress("discovery", 0, total_prefixes))
+            if not self._find_best_nodes(self.current_region):
+                logging.warning("未找到可用节点，保留快速启动恢复的路由")
+                return
+            timings["discovery"] = time.time() - phase_start
+
+            phase_start = time.time()
+            parallel = max(1, self.config.get("settings", {}).get("parallel_tests", 5))
+            done = 0
+            self.events.publish(OptimizationProgress("verification", 0, total_prefixes))
+            with ThreadPoolExecutor(max_workers=parallel) as pool:
+                futures = [pool.submit(self._verify_warm_route if prefix in warm
+                                       else self._optimize_new_prefix, members[0])
+                           for prefix, members in self.prefix_members.items()]
+                for future in as_completed(futures):
+                    future.result()
+                    done += 1
+                    self.events.publish(OptimizationProgress("verification", done, total_prefixes))
+            timings["verification"] = time.time() - phase_start
+            if not self.active:
+                return
+
+            self._init_bandit()
+            timings["total"] = time.time() - start_time
+            self._set_startup_timings(timings)
+            self._save_known_routes()
+            self.events.publish(OptimizationProgress("ready", total_prefixes, total_prefixes))
+            logging.info(f"后台验证完成，耗时 {timings['verification']:.1f} 秒")
+        except Exception as e:
+            logging.error(f"验证已知路由失败: {str(e)}")
+
+    def _verify_warm_route(self, server: str) -> bool:
+        """确认恢复的路由仍是最佳选择，发现更好的节点时替换，不如直连时单独撤销
+
+        测量各候选节点期间该前缀的路由会被临时替换。
+        """
+        with self._swapping_route(server):
+            return self._verify_warm_route_locked(server)
+
+    def _verify_warm_route_locked(self, server: str) -> bool:
+        with self.lock:
+            route = self.routes.get(server)
+            cached = route["node"] if route else None
+        matrix = self.session_matrix
+        if not self.active or cached is None or matrix is None:
+            return False
+
+        destination, prefixlen = self._route_prefix(server)
+        cached_result = self.probe_latency([server], use_cache=False)[server]
+        if cached in matrix.node_index:
+            with self.lock:
+                matrix.set_path_result(cached, server, cached_result)
+        candidates = [node["ip"] for node in self.session_nodes if node["ip"] != cached]
+        self._measure_paths(server, candidates)
+
+        # 撤销前缀路由后测量直连延迟
+        self._delete_route(destination, prefixlen)
+        direct = self.probe_latency([server], use_cache=False)[server]
+        with self.lock:
+            matrix.set_direct_result(server, direct)
+
+        known = [ip for ip in [cached] + candidates if ip in matrix.node_index]
+        best_node, best_latency = matrix.best_nodes_for_servers(known, self._loss_penalty())[server]
+        if not self.active:
+            return False
+        if best_node and best_latency < direct.avg and self._add_route(destination, best_node, prefixlen):
+            if best_node != cached:
+                logging.info(f"服务器 {server} 的已知线路 {cached} 已被更好的节点 {best_node} 替换")
+            self._update_members(server, node=best_node, current_latency=best_latency,
+                                 original_latency=direct.avg)
+            return True
+
+        logging.info(f"服务器 {server} 的已知线路 {cached} 不如直连，已撤销")
+        self._update_members(server, node=None, current_latency=direct.avg,
+                             original_latency=direct.avg)
+        return False
+
+    def _optimize_new_prefix(self, server: str) -> bool:
+        """快速启动时没有记录的前缀：测量原始延迟后按常规流程优化并加入监控"""
+        network, prefixlen = self._route_prefix(server)
+        original_latency = self.probe_latency([server], use_cache=False)[server].avg
+        self._init_prefix_routes(network, prefixlen, self._members(server), original_latency)
+        success = self._optimize_route(server)
+        if self.active:
+            self.scheduler.add(server, self.scheduler.min_interval)
+            self._watch_paths([server])
+        return success
+
+    def _start_connection_tracking(self, pid: int, start_time: float,
+                                   timings: Dict[str, float]) -> bool:
+        """只加速游戏进程实际连接的服务器：立即进入加速状态，按连接变化逐个前缀优化或撤销"""
+        settings = self.config.get("settings", {})
+        self.in_use = set()
+        with self.lock:
+            self.active = True
+            self._publish_status()
+        self.scheduler.clear()
+        self.scheduler.start()
+        self.path_scheduler.clear()
+        tracker = self.connection_tracker = ConnectionTracker(
+            pid, lambda added, removed: self.executor.submit(self._apply_connections, added, removed),
+            interval=settings.get("connection_poll_interval", 2.0),
+            idle_timeout=settings.get("connection_idle_timeout", 60.0),
+            on_exit=lambda: self.executor.submit(self._on_game_exit, tracker))
+        tracker.start()
+        # 宽限期内没有发现游戏连接到任何已配置的服务器时（例如流量全部走未connect的UDP套接字），
+        # 改为按完整服务器列表加速
+        self._discovery_timer = threading.Timer(
+            settings.get("connection_grace_period", 20.0),
+            lambda: self.executor.submit(self._discovery_fallback, tracker))
+        self._discovery_timer.daemon = True
+        self._discovery_timer.start()
+        timings["total"] = time.time() - start_time
+        self._set_startup_timings(timings)
+        self.events.publish(OptimizationProgress("ready", 0, 0))
+        logging.info(f"加速已启动，按游戏进程 {pid} 的连接加速 "
+                     f"(已配置 {len(self.prefix_members)} 条路由)")
+        return True
+
+    def _discovery_fallback(self, tracker: ConnectionTracker):
+        """宽限期结束仍未发现游戏连接的前缀：停止连接跟踪，优化全部前缀"""
+        with self._discovery_lock:
+            if (self.connection_tracker is not tracker or not self.active
+                    or self.in_use is None or self.in_use):
+                return
+            logging.warning("未发现游戏连接到已配置的服务器，改为加速全部服务器")
+            tracker.stop()
+            self.connection_tracker = None
+            self.in_use = None
+            with self.lock:
+                self._publish_status()
+            try:
+                success = self._start_all_prefixes(time.time(), {})
+            except Exception as e:
+                logging.error(f"加速全部服务器失败: {str(e)}")
+                success = False
+        if not success and self.active:
+            self.stop_acceleration()
+
+    def _on_game_exit(self, tracker: ConnectionTracker):
+        """游戏进程退出：已连接的前缀已在断开通知中撤销，结束本次加速"""
+        with self._discovery_lock:
+            if self.connection_tracker is not tracker or not self.active:
+                return
+        logging.info("游戏进程已退出，停止加速")
+        self.stop_acceleration()
+
+    def _endpoint_prefix(self, ip: str) -> Optional[Tuple[str, int]]:
+        """远端地址所属的路由前缀，未配置的地址返回None"""
+        prefix = self.route_prefixes.get(ip)
+        if prefix is not None:
+            return prefix
+        # 聚合后的前缀可能覆盖配置中没有列出的相邻地址（前缀互不重叠）
+        value = int(ipaddress.IPv4Address(ip))
+        i = bisect.bisect_right(self._prefix_starts, value) - 1
+        if i >= 0 and value <= self._prefix_ranges[i][1]:
+            return self._prefix_ranges[i][2]
+        return None
+
+    def _apply_connections(self, added: Set[str], removed: Set[str]):
+        """游戏连接变化：为新连接的前缀优化路由并加入监控，撤销不再使用的前缀"""
+        with self._discovery_lock:
+            tracker = self.connection_tracker
+            if not self.active or self.in_use is None or tracker is None:
+                return
+            try:
+                active = tracker.active()
+                with self.lock:
+                    self._publish_status()
+                still_used = {self._endpoint_prefix(ip) for ip in active}
+                for prefix in {self._endpoint_prefix(ip) for ip in removed}:
+                    if prefix in self.in_use and prefix not in still_used:
+                        self._release_prefix(prefix)
+
+                new = []
+                # 任务可能晚于之后的断开通知执行，已断开的地址不再处理
+                for ip in sorted(added & active):
+                    prefix = self._endpoint_prefix(ip)
+                    if prefix is None:
+                        info = self.compiled.lookup_server(ip)
+                        if info is not None and info[:2] != (self.current_game, self.current_region):
+                            logging.warning(f"游戏连接的 {ip} 属于 {info[0]}/{info[1]}的{info[2]}，"
+                                            f"当前加速的是 {self._server_group()}")
+                        else:
+                            logging.debug(f"游戏连接的 {ip} 不在 {self._server_group()} 的服务器配置中")
+                    elif prefix not in self.in_use and prefix not in new:
+                        new.append(prefix)
+                if not new:
+                    return
+                # 先加入使用集合，首次建立会话矩阵时一并测量所有新前缀
+                self.in_use.update(new)
+                for network, prefixlen in new:
+                    server = self.prefix_members[(network, prefixlen)][0]
+                    logging.info(f"游戏连接到 {network}/{prefixlen}，开始优化 {server} 的路由")
+                    self._optimize_new_prefix(server)
+                    self._init_bandit_server(server)
+                self._save_known_routes()
+            except Exception as e:
+                logging.error(f"更新游戏连接的路由失败: {str(e)}")
+
+    def _release_prefix(self, prefix: Tuple[str, int]):
+        """游戏不再连接的前缀：停止监控并撤销路由"""
+        network, prefixlen = prefix
+        members = self.prefix_members[prefix]
+        server = members[0]
+        self.in_use.discard(prefix)
+        self.scheduler.remove(server)
+        self.path_scheduler.remove(server)
+        self.reoptimizer.cancel(server)
+        self.bandit.remove(server)
+        self.series.remove(server)
+        with self.lock:
+            routed = any(self.routes.get(member, {}).get("node") for member in members)
+            for member in members:
+                self.routes.pop(member, None)
+            self._publish_status([server])
+        if routed:
+            self._delete_route(network, prefixlen)
+        self.events.publish_all([RouteChanged(member, None, removed=True) for member in members])
+        logging.info(f"游戏已不再连接 {network}/{prefixlen}，停止加速")
+
+    def start_acceleration(self, game: str, region: str, pid: Optional[int] = None) -> bool:
+        """启动加速
+
+        Args:
+            game: 游戏
+            region: 区服
+            pid: 游戏进程PID，开启 connection_discovery 时只加速该进程实际连接的服务器
+        """
         try:
             if self.active:
                 logging.warning("加速已在运行中")
                 return False
                 
             # 获取服务器列表
-            self.current_game_servers = self.config.get("game_servers", {}).get(game, {}).get(region, {})
+            self.current_game_servers = self.compiled.game_servers(game, region)
+            self.current_game = game
             self.current_region = region
+            local_ip, gateway = self._local_addresses()
+            self.network_id = network_fingerprint(local_ip, gateway)
+            ip_info = self._local_ip_info(local_ip, gateway)
+            self.local_isp = self._detect_local_isp(ip_info)
+            self.local_location = self._detect_local_location(ip_info)
             
             if not self.current_game_servers:
                 logging.error(f"未找到游戏 {game} 区服 {region} 的服务器配置")
@@ -318,105 +1696,160 @@ class AcceleratorCore:
                 
             logging.info(f"开始加速 {game} - {region}")
             start_time = time.time()
+            timings = {}
                 
-            # 清空状态队列
-            while not self.status_queue.empty():
-                self.status_queue.get_nowait()
-                
-            # 获取最佳节点
-            best_nodes = self._find_best_nodes(region)
-            if not best_nodes:
-                logging.error("未找到可用节点")
-                return False
-                
-            # 优化每个服务器的路由
-            success = True
-            total_servers = sum(len(servers) for servers in self.current_game_servers.values())
-            processed_servers = 0
-            
-            for server_group, server_list in self.current_game_servers.items():
-                logging.info(f"正在处理服务器组: {server_group}")
-                
-                for server in server_list:
-                    processed_servers += 1
-                    logging.info(f"正在优化服务器 ({processed_servers}/{total_servers}): {server}")
-                    
-                    # 测试原始延迟
-                    original_latency = self.test_latency(server)
-                    
-                    # 初始化路由信息
-                    with self.lock:
-                        self.routes[server] = {
-                            "original_latency": original_latency,
-                            "current_latency": original_latency,
-                            "node": None
-                        }
-                        
-                    # 优化路由
-                    if not self._optimize_route(server):
-                        success = False
-                        
-            if success and self.routes:
-                self.active = True
-                # 启动监控线程
-                self.monitor_future = self.executor.submit(self._monitor_routes)
-                
-                elapsed = time.time() - start_time
-                logging.info(f"加速启动完成，耗时 {elapsed:.1f} 秒，"
-                           f"共处理 {len(self.routes)} 个服务器")
+            # 相邻服务器聚合为前缀，之后按前缀测量和安装路由
+            self._build_route_prefixes()
+
+            connection_mode = (pid is not None and
+                               self.config.get("settings", {}).get("connection_discovery", False))
+            fast_start = self.config.get("settings", {}).get("fast_start") and not connection_mode
+            warm = self._known_prefix_routes() if fast_start else {}
+            # 清理上次异常退出遗留的路由，快速启动将要恢复的相同路由保留在路由表中
+            self._recover_routes({(network, prefixlen): node
+                                  for (network, prefixlen), (node, _, _) in warm.items()})
+
+            if connection_mode:
+                return self._start_connection_tracking(pid, start_time, timings)
+
+            # 快速启动：先恢复上次验证可用的路由，完整测量在后台进行
+            if fast_start and self._warm_start(start_time, timings, warm):
                 return True
                 
-            logging.error("加速启动失败，正在清理...")
-            self.stop_acceleration()
-            return False
+            return self._start_all_prefixes(start_time, timings)
             
         except Exception as e:
             logging.error(f"启动加速失败: {str(e)}")
             self.stop_acceleration()
+            self.events.publish(OptimizationProgress("failed"))
             return False
 
+    def _start_all_prefixes(self, start_time: float, timings: Dict[str, float]) -> bool:
+        """对全部前缀完成节点发现、原始延迟测量和选路，成功后进入加速状态并启动监控"""
+        # 阶段一：节点发现（整个会话只进行一次）
+        phase_start = time.time()
+        total_prefixes = len(self.prefix_members)
+        self.events.publish(OptimizationProgress("discovery", 0, total_prefixes))
+        best_nodes = self._find_best_nodes(self.current_region)
+        timings["discovery"] = time.time() - phase_start
+        if not best_nodes:
+            logging.error("未找到可用节点")
+            self.events.publish(OptimizationProgress("failed", 0, total_prefixes))
+            return False
+            
+        # 阶段二：所有前缀的原始延迟在一个批次中并发测量
+        phase_start = time.time()
+        self.events.publish(OptimizationProgress("baseline", 0, total_prefixes))
+        baselines = self.probe_latency(self._representatives())
+        for (network, prefixlen), members in self.prefix_members.items():
+            # 初始化路由信息
+            self._init_prefix_routes(network, prefixlen, members, baselines[members[0]].avg)
+        timings["baseline"] = time.time() - phase_start
+                
+        # 阶段三：各前缀的候选节点评估，并发数由 parallel_tests 限制
+        phase_start = time.time()
+        parallel = max(1, self.config.get("settings", {}).get("parallel_tests", 5))
+        success = True
+        done = 0
+        self.events.publish(OptimizationProgress("optimization", 0, total_prefixes))
+        logging.info(f"正在优化 {total_prefixes} 条路由，并发数 {parallel}")
+        with ThreadPoolExecutor(max_workers=parallel) as pool:
+            futures = {pool.submit(self._optimize_route, members[0]): (network, prefixlen)
+                       for (network, prefixlen), members in self.prefix_members.items()}
+            for future in as_completed(futures):
+                network, prefixlen = futures[future]
+                if not future.result():
+                    logging.warning(f"路由 {network}/{prefixlen} 优化失败")
+                    success = False
+                done += 1
+                self.events.publish(OptimizationProgress("optimization", done, total_prefixes))
+        timings["optimization"] = time.time() - phase_start
+                    
+        if success and self.routes:
+            self._init_bandit()
+            with self.lock:
+                self.active = True
+                self._publish_status()
+            self._start_monitor()
+            self._save_known_routes()
+            self.events.publish(OptimizationProgress("ready", total_prefixes, total_prefixes))
+            
+            elapsed = time.time() - start_time
+            timings["total"] = elapsed
+            self._set_startup_timings(timings)
+            logging.info(f"加速启动完成，耗时 {elapsed:.1f} 秒，"
+                       f"共处理 {len(self.routes)} 个服务器 "
+                       f"(节点发现 {timings['discovery']:.1f}s, "
+                       f"原始延迟 {timings['baseline']:.1f}s, "
+                       f"路由优化 {timings['optimization']:.1f}s)")
+            return True
+            
+        logging.error("加速启动失败，正在清理...")
+        self.stop_acceleration()
+        self.events.publish(OptimizationProgress("failed", 0, total_prefixes))
+        return False
+
     def stop_acceleration(self):
         """停止加速"""
         try:
             logging.info("正在停止加速...")
             self.active = False
+            if self._discovery_timer is not None:
+                self._discovery_timer.cancel()
+                self._discovery_timer = None
+            if self.connection_tracker is not None:
+                self.connection_tracker.stop()
+                self.connection_tracker = None
             
-            # 等待监控线程结束
-            if self.monitor_future:
-                self.monitor_future.cancel()
-                self.monitor_future = None
+            # 停止监控调度，取消尚未完成的重新优化
+            self.scheduler.stop()
+            self.scheduler.clear()
+            self.path_scheduler.stop()
+            self.path_scheduler.clear()
+            self.reoptimizer.clear()
+            if self.current_game:
+                self._save_known_routes()
                 
-            # 清理路由
+            # 清理路由（一次批量删除）
             with self.lock:
-                for server in list(self.routes.keys()):
-                    self._delete_route(server)
+                prefixes = {self._route_prefix(server) for server in self.routes}
+                removed = list(self.routes)
                 self.routes.clear()
-                
-            # 清空状态队列
-            while not self.status_queue.empty():
-                self.status_queue.get_nowait()
-                
+                self._publish_status()
+            self.events.publish_all([RouteChanged(server, None, removed=True)
+                                     for server in removed])
+            self.events.publish(OptimizationProgress("stopped"))
+            self._apply_routes([RouteChange.delete(destination, prefixlen)
+                                for destination, prefixlen in prefixes])
+            self.route_prefixes = {}
+            self.prefix_members = {}
+            self.in_use = None
+            # 删除失败或上次遗留的路由此时一并清理
+            self._recover_routes()
+            self.session_matrix = None
+            self.session_nodes = []
+            self.bandit.clear()
+            self.series.clear()
+            with self.lock:
+                self._latency_stats.clear()
+            self.path_analyzer.clear()
+            self._reported_segments.clear()
+                    
             logging.info("加速已停止，所有路由已清理")
                 
         except Exception as e:
             logging.error(f"停止加速失败: {str(e)}")
 
-    def get_status(self) -> Dict:
-        """获取状态"""
-        with self.lock:
-            status = {
-                "active": self.active,
-                "routes": self.routes.copy()
-            }
-            
-        # 添加实时状态更新
-        while not self.status_queue.empty():
-            try:
-                update = self.status_queue.get_nowait()
-                server = update["server"]
-                if server in status["routes"]:
-                    status["routes"][server]["current_latency"] = update["latency"]
-            except:
-                break
-                
-        return status
+    def get_status(self, since_version: Optional[int] = None) -> Dict:
+        """获取状态
+
+        直接返回最新发布的只读快照，不会等待正在进行的探测。
+
+        "latency_stats" 为各服务器最近的延迟统计（均值、EWMA、抖动、丢包率、p50/p95/p99）。
+        按游戏连接加速时另有 "connections"，为游戏进程当前连接的远端地址。
+
+        Args:
+            since_version: 调用方上次拿到的版本号，"changed"表示此后状态是否有变化
+        """
+        status = self._status_snapshot
+        return dict(status, changed=since_version != status["version"])
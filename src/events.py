@@ -0,0 +1,224 @@
+"""
+状态事件总线
+
+核心向总线发布延迟采样、路由变更和优化进度事件，游戏检测发布游戏启动/退出事件，
+每个订阅者有独立的有界缓冲区。
+缓冲区按事件键合并：同一服务器的同类事件只保留最新一条，缓冲区满时丢弃最旧的事件并计数，
+订阅者发现丢失后可通过 get_status() 的快照重新同步。
+"""
+import threading
+from collections import OrderedDict
+from typing import Dict, Hashable, Iterable, List, Optional, Tuple, Type
+
+
+class Event:
+    """事件基类，key相同的事件在订阅者缓冲区中合并"""
+
+    __slots__ = ()
+
+    @property
+    def key(self) -> Hashable:
+        raise NotImplementedError
+
+
+class LatencySample(Event):
+    """服务器的一次延迟测量"""
+
+    __slots__ = ("server", "latency", "original_latency")
+
+    def __init__(self, server: str, latency: float, original_latency: float):
+        self.server = server
+        self.latency = latency
+        self.original_latency = original_latency
+
+    @property
+    def key(self) -> Hashable:
+        return "latency", self.server
+
+    @property
+    def improvement(self) -> float:
+        if self.original_latency <= 0:
+            return 0.0
+        return (self.original_latency - self.latency) / self.original_latency * 100
+
+    def __repr__(self):
+        return f"LatencySample({self.server} {self.latency:.0f}ms)"
+
+
+class RouteChanged(Event):
+    """服务器的路由变更，node为None表示直连，removed表示已不再加速"""
+
+    __slots__ = ("server", "node", "prefix", "removed")
+
+    def __init__(self, server: str, node: Optional[str], prefix: Optional[str] = None,
+                 removed: bool = False):
+        self.server = server
+        self.node = node
+        self.prefix = prefix
+        self.removed = removed
+
+    @property
+    def key(self) -> Hashable:
+        return "route", self.server
+
+    def __repr__(self):
+        if self.removed:
+            return f"RouteChanged({self.server} removed)"
+        return f"RouteChanged({self.server} via {self.node or 'direct'})"
+
+
+class OptimizationProgress(Event):
+    """加速启动的阶段进度"""
+
+    __slots__ = ("phase", "done", "total")
+
+    def __init__(self, phase: str, done: int = 0, total: int = 0):
+        self.phase = phase
+        self.done = done
+        self.total = total
+
+    @property
+    def key(self) -> Hashable:
+        return ("progress",)
+
+    def __repr__(self):
+        return f"OptimizationProgress({self.phase} {self.done}/{self.total})"
+
+
+class GameStarted(Event):
+    """检测到游戏进程启动"""
+
+    __slots__ = ("game", "pid")
+
+    def __init__(self, game: str, pid: int):
+        self.game = game
+        self.pid = pid
+
+    @property
+    def key(self) -> Hashable:
+        # 同一进程的启动和退出合并为最新状态
+        return "game", self.pid
+
+    def __repr__(self):
+        return f"GameStarted({self.game} pid={self.pid})"
+
+
+class GameExited(Event):
+    """游戏进程退出"""
+
+    __slots__ = ("game", "pid")
+
+    def __init__(self, game: str, pid: int):
+        self.game = game
+        self.pid = pid
+
+    @property
+    def key(self) -> Hashable:
+        return "game", self.pid
+
+    def __repr__(self):
+        return f"GameExited({self.game} pid={self.pid})"
+
+
+class Subscription:
+    """单个订阅者的有界合并缓冲区
+
+    Args:
+        types: 只接收这些类型的事件，None表示全部
+        maxlen: 缓冲区最多保留的事件数（按键合并后）
+    """
+
+    def __init__(self, bus: "EventBus", types: Optional[Tuple[Type[Event], ...]],
+                 maxlen: int):
+        self._bus = bus
+        self.types = types
+        self.maxlen = maxlen
+        self._buffer: "OrderedDict[Hashable, Event]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._dropped = 0
+
+    def _put(self, event: Event):
+        if self.types is not None and not isinstance(event, self.types):
+            return
+        with self._lock:
+            key = event.key
+            if key in self._buffer:
+                # 合并：旧值被替换，事件移到队尾
+                del self._buffer[key]
+            elif len(self._buffer) >= self.maxlen:
+                self._buffer.popitem(last=False)
+                self._dropped += 1
+            self._buffer[key] = event
+            self._ready.set()
+
+    def poll(self) -> List[Event]:
+        """取出缓冲区中的所有事件（按最后更新的先后顺序）"""
+        with self._lock:
+            events = list(self._buffer.values())
+            self._buffer.clear()
+            self._ready.clear()
+            return events
+
+    def wait(self, timeout: Optional[float] = None) -> List[Event]:
+        """等待到有事件或超时，然后取出所有事件"""
+        self._ready.wait(timeout)
+        return self.poll()
+
+    def take_dropped(self) -> int:
+        """返回并清零因缓冲区满而丢弃的事件数"""
+        with self._lock:
+            dropped, self._dropped = self._dropped, 0
+            return dropped
+
+    def close(self):
+        self._bus.unsubscribe(self)
+
+
+class EventBus:
+    """发布/订阅事件总线，发布者不会因订阅者处理缓慢而阻塞或占用无限内存"""
+
+    def __init__(self):
+        self._subscribers: List[Subscription] = []
+        self._lock = threading.Lock()
+
+    def subscribe(self, types: Iterable[Type[Event]] = None, maxlen: int = 1024) -> Subscription:
+        subscription = Subscription(self, tuple(types) if types is not None else None, maxlen)
+        with self._lock:
+            self._subscribers = self._subscribers + [subscription]
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            self._subscribers = [s for s in self._subscribers if s is not subscription]
+
+    def publish(self, event: Event):
+        for subscription in self._subscribers:
+            subscription._put(event)
+
+    def publish_all(self, events: Iterable[Event]):
+        subscribers = self._subscribers
+        for event in events:
+            for subscription in subscribers:
+                subscription._put(event)
+
+
+def apply_route_events(routes: Dict[str, Dict], events: Iterable[Event]) -> bool:
+    """把事件应用到以服务器为键的路由状态字典，返回状态是否有变化"""
+    changed = False
+    for event in events:
+        if isinstance(event, LatencySample):
+            route = routes.setdefault(event.server, {"node": None})
+            route["original_latency"] = event.original_latency
+            route["current_latency"] = event.latency
+            changed = True
+        elif isinstance(event, RouteChanged):
+            if event.removed:
+                changed = routes.pop(event.server, None) is not None or changed
+            else:
+                route = routes.setdefault(event.server, {})
+                route["node"] = event.node
+                route["prefix"] = event.prefix
+                changed = True
+    return changed
+
@@ -1,66 +1,151 @@
-import psutil
-import win32process
-import win32gui
-import win32con
 import logging
+import threading
 from typing import Dict, Optional, List
-import json
 import os
+from .config import ConfigManager, get_config_manager
+from .events import EventBus, GameStarted, GameExited
+from .process_watcher import ProcessWatcher
+
+# 窗口相关功能只在Windows下可用，其他平台上模块仍可正常加载
+try:
+    import win32process
+    import win32gui
+except ImportError:
+    win32process = None
+    win32gui = None
+
+
+class WindowBackend:
+    """按进程查找窗口的后端基类（无窗口系统时所有查询返回None）"""
+
+    def find_window(self, pid: int) -> Optional[int]:
+        return None
+
+    def foreground_window(self) -> Optional[int]:
+        return None
+
+
+class Win32WindowBackend(WindowBackend):
+    def find_window(self, pid: int) -> Optional[int]:
+        def callback(hwnd, hwnds):
+            if win32gui.IsWindowVisible(hwnd) and win32gui.IsWindowEnabled(hwnd):
+                _, found_pid = win32process.GetWindowThreadProcessId(hwnd)
+                if found_pid == pid:
+                    hwnds.append(hwnd)
+            return True
+
+        hwnds = []
+        win32gui.EnumWindows(callback, hwnds)
+        return hwnds[0] if hwnds else None
+
+    def foreground_window(self) -> Optional[int]:
+        return win32gui.GetForegroundWindow()
+
+
+def default_window_backend() -> WindowBackend:
+    if win32gui is not None:
+        return Win32WindowBackend()
+    return WindowBackend()
 
 class GameDetector:
-    def __init__(self):
+    def __init__(self, config_manager: Optional[ConfigManager] = None,
+                 watcher: Optional[ProcessWatcher] = None,
+                 window_backend: Optional[WindowBackend] = None,
+                 events: Optional[EventBus] = None):
         self.game_processes = {
             "dota2.exe": "DotA2",
             "cs2.exe": "CS2",
             "steam.exe": "Steam"
         }
         self.current_game = None
-        self.game_window = None
-        self._load_game_configs()
+        self.current_pid: Optional[int] = None
+        # 与加速器核心共用同一份配置（按模块位置定位config.json，不依赖当前目录）
+        self.config_manager = config_manager or get_config_manager()
+        # 增量进程表：只为新出现的进程读取名称，游戏启动/退出以事件发布
+        self.watcher = watcher or ProcessWatcher()
+        self.watcher.subscribe(self._on_process_change)
+        self.window_backend = window_backend or default_window_backend()
+        self.events = events or EventBus()
+        self.games: Dict[int, str] = {}  # 正在运行的游戏进程 pid -> 游戏
+        self._games_lock = threading.Lock()
+        self._windows: Dict[int, Optional[int]] = {}  # pid -> 窗口句柄(没有窗口为None)，首次需要时才查找
         
-    def _load_game_configs(self):
-        """加载游戏配置"""
-        try:
-            with open('config.json', 'r', encoding='utf-8') as f:
-                self.config = json.load(f)
-        except Exception as e:
-            logging.error(f"加载游戏配置失败: {str(e)}")
-            self.config = {}
+    @property
+    def config(self) -> Dict:
+        return self.config_manager.current.raw
+
+    def _game_for(self, process_name: str) -> Optional[str]:
+        name = process_name.lower()
+        # Linux原生客户端的进程名没有.exe后缀
+        return self.game_processes.get(name) or self.game_processes.get(f"{name}.exe")
+
+    def _on_process_change(self, started: Dict[int, str], exited: Dict[int, str]):
+        events = []
+        with self._games_lock:
+            for pid in exited:
+                game = self.games.pop(pid, None)
+                self._windows.pop(pid, None)
+                if game is not None:
+                    logging.info(f"游戏 {game} 已退出 (PID {pid})")
+                    events.append(GameExited(game, pid))
+            for pid, name in started.items():
+                game = self._game_for(name)
+                if game is not None:
+                    self.games[pid] = game
+                    logging.info(f"检测到游戏 {game} 启动 (PID {pid})")
+                    events.append(GameStarted(game, pid))
+        self.events.publish_all(events)
+
+    def start_watching(self):
+        """在后台持续监视进程，游戏启动/退出时发布事件"""
+        self.watcher.start()
+
+    def stop_watching(self):
+        self.watcher.stop()
             
     def get_game_servers(self, game: str) -> Dict[str, List[str]]:
         """获取游戏服务器列表"""
         try:
-            return self.config.get("game_servers", {}).get(game, {})
+            return self.config_manager.current.game_servers(game)
         except Exception as e:
             logging.error(f"获取服务器列表失败: {str(e)}")
             return {}
+
+    @property
+    def game_window(self) -> Optional[int]:
+        """当前游戏的窗口句柄，按进程查找一次后缓存
+
+        没有窗口的结果同样缓存到进程退出，不再每次重新枚举窗口。
+        """
+        pid = self.current_pid
+        if pid is None:
+            return None
+        if pid not in self._windows:
+            try:
+                self._windows[pid] = self.window_backend.find_window(pid)
+            except Exception as e:
+                logging.error(f"查找游戏窗口失败: {str(e)}")
+                return None
+        return self._windows[pid]
             
     def detect_game(self) -> Optional[str]:
-        """检测正在运行的游戏"""
+        """检测正在运行的游戏
+
+        后台监视未启动时先增量更新一次进程表；同时运行多个时优先返回游戏而不是Steam客户端。
+        游戏进程存在即视为正在运行，不要求已有可见窗口（没有窗口系统的平台上也能检测，
+        游戏刚启动、窗口尚未创建时即可按其连接加速）。
+        """
         try:
-            for proc in psutil.process_iter(['name', 'pid']):
-                if proc.info['name'] in self.game_processes:
-                    game_name = self.game_processes[proc.info['name']]
-                    pid = proc.info['pid']
-                    
-                    # 获取窗口句柄
-                    def callback(hwnd, hwnds):
-                        if win32gui.IsWindowVisible(hwnd) and win32gui.IsWindowEnabled(hwnd):
-                            _, found_pid = win32process.GetWindowThreadProcessId(hwnd)
-                            if found_pid == pid:
-                                hwnds.append(hwnd)
-                        return True
-                        
-                    hwnds = []
-                    win32gui.EnumWindows(callback, hwnds)
-                    
-                    if hwnds:
-                        self.game_window = hwnds[0]
-                        self.current_game = game_name
-                        return game_name
+            if not self.watcher.running:
+                self.watcher.poll()
+            with self._games_lock:
+                running = sorted(self.games.items(), key=lambda item: (item[1] == "Steam", item[0]))
+            if running:
+                self.current_pid, self.current_game = running[0]
+                return self.current_game
                         
             self.current_game = None
-            self.game_window = None
+            self.current_pid = None
             return None
             
         except Exception as e:
@@ -70,9 +155,10 @@ class GameDetector:
     def is_game_window_active(self) -> bool:
         """检查游戏窗口是否激活"""
         try:
-            if not self.game_window:
+            window = self.game_window
+            if not window:
                 return False
-            return win32gui.GetForegroundWindow() == self.game_window
+            return self.window_backend.foreground_window() == window
         except Exception as e:
             logging.error(f"检查窗口状态失败: {str(e)}")
             return False
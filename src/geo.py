@@ -0,0 +1,154 @@
+"""
+地理位置索引
+
+节点坐标换算为单位球面上的三维点，建立静态k-d树。
+为 (客户端, 服务器) 选中转节点时按绕路程度（客户端→节点→服务器的弦长之和）做分支定界搜索，
+只返回地理上合理的k个节点，探测数量随k增长而与节点总数无关。
+"""
+import heapq
+import math
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0
+LEAF_SIZE = 16
+
+Coordinate = Tuple[float, float]  # (纬度, 经度)
+
+
+def parse_coordinate(value) -> Optional[Coordinate]:
+    """把 [纬度, 经度] 转换为坐标，格式无效时返回None"""
+    try:
+        lat, lon = float(value[0]), float(value[1])
+    except (TypeError, ValueError, IndexError, KeyError):
+        return None
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        return None
+    return lat, lon
+
+
+def to_xyz(coords: Sequence[Coordinate]) -> np.ndarray:
+    """(纬度, 经度) 转换为单位球面上的三维坐标"""
+    coords = np.radians(np.asarray(coords, dtype=float).reshape(-1, 2))
+    lat, lon = coords[:, 0], coords[:, 1]
+    return np.column_stack((np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)))
+
+
+def distance_km(a: Coordinate, b: Coordinate) -> float:
+    """两点间的大圆距离(km)"""
+    chord = float(np.linalg.norm(to_xyz([a])[0] - to_xyz([b])[0]))
+    return 2 * EARTH_RADIUS_KM * math.asin(min(chord / 2, 1.0))
+
+
+class KDTree:
+    """三维点的静态k-d树（数组存储）
+
+    每个树节点记录点的范围 [lo, hi)（点已按树的顺序重排）、包围盒和左右子节点，
+    叶节点的子节点为-1。
+    """
+
+    def __init__(self, points: np.ndarray, leaf_size: int = LEAF_SIZE):
+        self.points = np.asarray(points, dtype=float).reshape(-1, 3)
+        self.order = np.arange(len(self.points))
+        self.leaf_size = max(1, leaf_size)
+        self.lo: List[int] = []
+        self.hi: List[int] = []
+        self.left: List[int] = []
+        self.right: List[int] = []
+        self.box_min: List[np.ndarray] = []
+        self.box_max: List[np.ndarray] = []
+        if len(self.points):
+            self._build(0, len(self.points))
+            self.box_min = np.array(self.box_min)
+            self.box_max = np.array(self.box_max)
+        self.sorted_points = self.points[self.order]
+
+    def __len__(self) -> int:
+        return len(self.points)
+
+    def _build(self, lo: int, hi: int) -> int:
+        node = len(self.lo)
+        pts = self.points[self.order[lo:hi]]
+        self.lo.append(lo)
+        self.hi.append(hi)
+        self.left.append(-1)
+        self.right.append(-1)
+        self.box_min.append(pts.min(axis=0))
+        self.box_max.append(pts.max(axis=0))
+        if hi - lo > self.leaf_size:
+            # 沿跨度最大的维度按中位数划分
+            dim = int(np.argmax(self.box_max[node] - self.box_min[node]))
+            mid = (hi - lo) // 2
+            part = np.argpartition(pts[:, dim], mid)
+            self.order[lo:hi] = self.order[lo:hi][part]
+            self.left[node] = self._build(lo, lo + mid)
+            self.right[node] = self._build(lo + mid, hi)
+        return node
+
+    def _box_distance(self, node: int, anchor: np.ndarray) -> float:
+        delta = np.maximum(self.box_min[node] - anchor, 0) + np.maximum(anchor - self.box_max[node], 0)
+        return float(np.sqrt(delta @ delta))
+
+    def query(self, anchors: Sequence[np.ndarray], k: int) -> List[Tuple[float, int]]:
+        """到各锚点距离之和最小的k个点
+
+        锚点为一个时即普通的最近邻查询；锚点为客户端和服务器两个时，距离和最小即绕路最少。
+
+        Returns:
+            按距离和升序的 (距离和, 点下标) 列表
+        """
+        if k <= 0 or len(self.points) == 0:
+            return []
+        anchors = [np.asarray(anchor, dtype=float) for anchor in anchors]
+        best: List[Tuple[float, int]] = []  # 最大堆（取负）
+        frontier = [(0.0, 0)]
+        while frontier:
+            bound, node = heapq.heappop(frontier)
+            if len(best) == k and bound >= -best[0][0]:
+                break
+            lo, hi = self.lo[node], self.hi[node]
+            if self.left[node] < 0:
+                pts = self.sorted_points[lo:hi]
+                cost = sum(np.linalg.norm(pts - anchor, axis=1) for anchor in anchors)
+                for offset, value in enumerate(cost):
+                    item = (-float(value), int(self.order[lo + offset]))
+                    if len(best) < k:
+                        heapq.heappush(best, item)
+                    elif item > best[0]:
+                        heapq.heapreplace(best, item)
+                continue
+            for child in (self.left[node], self.right[node]):
+                # 包围盒到各锚点的距离之和是盒内任一点代价的下界
+                child_bound = sum(self._box_distance(child, anchor) for anchor in anchors)
+                if len(best) < k or child_bound < -best[0][0]:
+                    heapq.heappush(frontier, (child_bound, child))
+        return sorted((-cost, index) for cost, index in best)
+
+
+class GeoIndex:
+    """节点的地理位置索引
+
+    Args:
+        coordinates: 节点IP到坐标的映射，没有坐标的节点不进入索引
+    """
+
+    def __init__(self, coordinates: Dict[str, Coordinate]):
+        self.ips = list(coordinates)
+        self.coordinates = dict(coordinates)
+        self.tree = KDTree(to_xyz([coordinates[ip] for ip in self.ips]) if self.ips
+                           else np.empty((0, 3)))
+
+    def __len__(self) -> int:
+        return len(self.ips)
+
+    def nearest(self, point: Coordinate, k: int) -> List[str]:
+        """距离某地最近的k个节点"""
+        return [self.ips[i] for _, i in self.tree.query(to_xyz([point]), k)]
+
+    def relays(self, client: Optional[Coordinate], server: Coordinate, k: int) -> List[str]:
+        """客户端经节点访问服务器时绕路最少的k个节点，未知客户端位置时取离服务器最近的节点"""
+        anchors = [to_xyz([server])[0]]
+        if client is not None:
+            anchors.insert(0, to_xyz([client])[0])
+        return [self.ips[i] for _, i in self.tree.query(anchors, k)]
@@ -4,12 +4,16 @@ import threading
 import logging
 from typing import Dict, Optional
 from .core import AcceleratorCore
+from .events import apply_route_events
 
 class AcceleratorGUI:
     def __init__(self, root: tk.Tk):
         self.root = root
         self.core = AcceleratorCore()
         self.status_update_id = None
+        # 订阅核心的状态事件，route_view为据此维护的各服务器状态
+        self.subscription = self.core.events.subscribe()
+        self.route_view = {}
         
         # 设置窗口
         self.root.geometry("600x400")
@@ -81,10 +85,19 @@ class AcceleratorGUI:
             return
             
         try:
-            status = self.core.get_status()
-            if status["active"]:
+            events = self.subscription.poll()
+            if self.subscription.take_dropped():
+                # 订阅缓冲区溢出，从状态快照重新同步
+                self.route_view = {server: dict(route) for server, route
+                                   in self.core.get_status()["routes"].items()}
+                changed = True
+            else:
+                changed = apply_route_events(self.route_view, events)
+            if changed:
                 text = ""
-                for server, route in status["routes"].items():
+                for server, route in self.route_view.items():
+                    if "current_latency" not in route:
+                        continue
                     current = route["current_latency"]
                     original = route["original_latency"]
                     improvement = ((original - current) / original * 100 
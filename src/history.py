@@ -0,0 +1,270 @@
+"""
+历史测量库
+
+把节点测量结果按 (节点, 服务器组, 本地网络指纹, 一周中的小时, 测量类型) 聚合写入本地SQLite，
+每个键只保存样本数、丢包数和延迟的和/平方和，因此库的大小只与键的数量有关。
+下次启动时据此为节点排序：历史上表现好的节点先测，长期不可用的节点直接跳过。
+另外保存每个服务器上次验证可用的路由，供快速启动直接恢复。
+"""
+import hashlib
+import ipaddress
+import logging
+import math
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, Optional, Tuple
+
+from .prober import ProbeResult
+
+NODE = "node"  # 本机到节点
+PATH = "path"  # 经节点到服务器
+
+HOURS_PER_WEEK = 7 * 24
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS measurements (
+    node TEXT NOT NULL,
+    server_group TEXT NOT NULL,
+    network TEXT NOT NULL,
+    hour_of_week INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    samples INTEGER NOT NULL,
+    lost INTEGER NOT NULL,
+    rtt_sum REAL NOT NULL,
+    rtt_sq_sum REAL NOT NULL,
+    updated REAL NOT NULL,
+    PRIMARY KEY (node, server_group, network, hour_of_week, kind)
+);
+CREATE INDEX IF NOT EXISTS measurements_updated ON measurements (updated);
+CREATE TABLE IF NOT EXISTS known_routes (
+    server_group TEXT NOT NULL,
+    network TEXT NOT NULL,
+    server TEXT NOT NULL,
+    node TEXT NOT NULL,
+    latency REAL NOT NULL,
+    direct_latency REAL NOT NULL,
+    updated REAL NOT NULL,
+    PRIMARY KEY (server_group, network, server)
+);
+"""
+
+
+def hour_of_week(timestamp: Optional[float] = None) -> int:
+    """本地时间的一周中的小时（周一0点为0）"""
+    t = time.localtime(timestamp)
+    return t.tm_wday * 24 + t.tm_hour
+
+
+def network_fingerprint(local_ip: Optional[str], gateway: Optional[str]) -> str:
+    """由本机地址所在/24网段和默认网关得到网络指纹，换了网络环境指纹即不同"""
+    subnet = ""
+    if local_ip:
+        try:
+            subnet = str(ipaddress.IPv4Network(f"{local_ip}/24", strict=False))
+        except ValueError:
+            subnet = local_ip
+    raw = f"{subnet}|{gateway or ''}"
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()[:12]
+
+
+class NodePrior:
+    """节点的历史统计"""
+
+    __slots__ = ("samples", "lost", "mean", "std")
+
+    def __init__(self, samples: int, lost: int, rtt_sum: float, rtt_sq_sum: float):
+        self.samples = samples
+        self.lost = lost
+        received = samples - lost
+        self.mean = rtt_sum / received if received > 0 else math.inf
+        if received > 1:
+            var = (rtt_sq_sum - rtt_sum * rtt_sum / received) / (received - 1)
+            self.std = math.sqrt(max(var, 0.0))
+        else:
+            self.std = 0.0
+
+    @property
+    def loss(self) -> float:
+        return self.lost / self.samples if self.samples else 0.0
+
+    def __repr__(self):
+        return f"NodePrior(samples={self.samples}, mean={self.mean:.1f}, loss={self.loss:.0%})"
+
+
+class MeasurementStore:
+    """SQLite测量库
+
+    Args:
+        path: 数据库文件路径
+        retention_days: 超过该天数未更新的记录在压缩时删除
+        max_rows: 记录数上限，超出时删除最久未更新的记录
+    """
+
+    def __init__(self, path: str, retention_days: float = 60.0, max_rows: int = 200000):
+        self.path = path
+        self.retention_days = retention_days
+        self.max_rows = max_rows
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        try:
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.executescript(_SCHEMA)
+        except sqlite3.Error as e:
+            logging.error(f"打开测量库失败: {str(e)}")
+            self._conn = None
+
+    @property
+    def available(self) -> bool:
+        return self._conn is not None
+
+    def record(self, server_group: str, network: str, kind: str,
+               results: Dict[str, ProbeResult], timestamp: Optional[float] = None):
+        """把一批探测结果累加到对应的键"""
+        if self._conn is None or not results:
+            return
+        timestamp = time.time() if timestamp is None else timestamp
+        hour = hour_of_week(timestamp)
+        rows = []
+        for node, result in results.items():
+            if result.sent == 0:
+                continue
+            rows.append((node, server_group, network, hour, kind, result.sent,
+                         result.sent - result.received, float(sum(result.rtts)),
+                         float(sum(rtt * rtt for rtt in result.rtts)), timestamp))
+        if not rows:
+            return
+        with self._lock:
+            try:
+                with self._conn:
+                    self._conn.executemany("""
+                        INSERT INTO measurements VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                        ON CONFLICT (node, server_group, network, hour_of_week, kind) DO UPDATE SET
+                            samples = samples + excluded.samples,
+                            lost = lost + excluded.lost,
+                            rtt_sum = rtt_sum + excluded.rtt_sum,
+                            rtt_sq_sum = rtt_sq_sum + excluded.rtt_sq_sum,
+                            updated = excluded.updated
+                    """, rows)
+            except sqlite3.Error as e:
+                logging.error(f"写入测量库失败: {str(e)}")
+
+    def priors(self, server_group: str, network: str, kind: str, nodes: Iterable[str],
+               timestamp: Optional[float] = None, hour_window: int = 1,
+               min_samples: int = 4) -> Dict[str, NodePrior]:
+        """节点在同一时段（前后hour_window小时）的历史统计
+
+        同一时段样本不足min_samples的节点改用所有时段的统计，仍然没有记录的节点不出现在结果中。
+        """
+        nodes = list(nodes)
+        if self._conn is None or not nodes:
+            return {}
+        hour = hour_of_week(timestamp)
+        hours = sorted({(hour + offset) % HOURS_PER_WEEK
+                        for offset in range(-hour_window, hour_window + 1)})
+        node_marks = ",".join("?" * len(nodes))
+        hour_marks = ",".join("?" * len(hours))
+        query = f"""
+            SELECT node, SUM(samples), SUM(lost), SUM(rtt_sum), SUM(rtt_sq_sum)
+            FROM measurements
+            WHERE server_group = ? AND network = ? AND kind = ? AND node IN ({node_marks})
+            {{hours}}
+            GROUP BY node
+        """
+        params = [server_group, network, kind] + nodes
+        try:
+            with self._lock:
+                in_window = self._conn.execute(
+                    query.format(hours=f"AND hour_of_week IN ({hour_marks})"),
+                    params + hours).fetchall()
+                overall = self._conn.execute(query.format(hours=""), params).fetchall()
+        except sqlite3.Error as e:
+            logging.error(f"读取测量库失败: {str(e)}")
+            return {}
+
+        priors = {row[0]: NodePrior(*row[1:]) for row in overall}
+        for row in in_window:
+            if row[1] >= min_samples:
+                priors[row[0]] = NodePrior(*row[1:])
+        return priors
+
+    def save_routes(self, server_group: str, network: str,
+                    routes: Dict[str, Tuple[str, float, float]], removed: Iterable[str] = (),
+                    timestamp: Optional[float] = None):
+        """保存上次验证可用的路由：服务器 -> (节点, 经节点延迟, 直连延迟)
+
+        逐个服务器更新，本次未涉及的服务器保留原有记录；removed 中的服务器（已改为直连）删除记录。
+        """
+        if self._conn is None:
+            return
+        timestamp = time.time() if timestamp is None else timestamp
+        rows = [(server_group, network, server, node, latency, direct_latency, timestamp)
+                for server, (node, latency, direct_latency) in routes.items()]
+        with self._lock:
+            try:
+                with self._conn:
+                    self._conn.executemany(
+                        "DELETE FROM known_routes WHERE server_group = ? AND network = ? AND server = ?",
+                        [(server_group, network, server) for server in removed])
+                    self._conn.executemany("""
+                        INSERT INTO known_routes VALUES (?, ?, ?, ?, ?, ?, ?)
+                        ON CONFLICT (server_group, network, server) DO UPDATE SET
+                            node = excluded.node,
+                            latency = excluded.latency,
+                            direct_latency = excluded.direct_latency,
+                            updated = excluded.updated
+                    """, rows)
+            except sqlite3.Error as e:
+                logging.error(f"保存已知路由失败: {str(e)}")
+
+    def load_routes(self, server_group: str, network: str,
+                    max_age_days: float = 7.0) -> Dict[str, Tuple[str, float, float]]:
+        """读取该组在同一网络下最近保存的可用路由"""
+        if self._conn is None:
+            return {}
+        cutoff = time.time() - max_age_days * 86400
+        try:
+            with self._lock:
+                rows = self._conn.execute("""
+                    SELECT server, node, latency, direct_latency FROM known_routes
+                    WHERE server_group = ? AND network = ? AND updated >= ?
+                """, (server_group, network, cutoff)).fetchall()
+        except sqlite3.Error as e:
+            logging.error(f"读取已知路由失败: {str(e)}")
+            return {}
+        return {server: (node, latency, direct_latency)
+                for server, node, latency, direct_latency in rows}
+
+    def compact(self, now: Optional[float] = None) -> int:
+        """删除过期和超出上限的记录，返回删除的行数"""
+        if self._conn is None:
+            return 0
+        now = time.time() if now is None else now
+        cutoff = now - self.retention_days * 86400
+        try:
+            with self._lock:
+                with self._conn:
+                    deleted = self._conn.execute(
+                        "DELETE FROM measurements WHERE updated < ?", (cutoff,)).rowcount
+                    deleted += self._conn.execute(
+                        "DELETE FROM known_routes WHERE updated < ?", (cutoff,)).rowcount
+                    deleted += self._conn.execute("""
+                        DELETE FROM measurements WHERE rowid IN (
+                            SELECT rowid FROM measurements ORDER BY updated DESC
+                            LIMIT -1 OFFSET ?)
+                    """, (self.max_rows,)).rowcount
+                if deleted:
+                    # 回收删除留下的空闲页
+                    self._conn.execute("VACUUM")
+            if deleted:
+                logging.info(f"测量库压缩完成，删除 {deleted} 条过期记录")
+            return deleted
+        except sqlite3.Error as e:
+            logging.error(f"压缩测量库失败: {str(e)}")
+            return 0
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
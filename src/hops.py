@@ -0,0 +1,348 @@
+"""
+逐跳路径分析（mtr式）
+
+一次性向所有TTL并发发送ICMP回显请求，而不是像traceroute那样逐跳串行等待，
+一轮分析的耗时约等于一次超时。每条路由按跳聚合延迟与丢包的时间序列，
+据此找出开始出现持续丢包或排队延迟的路段：只有在其后各跳都延续的丢包/延迟才计入，
+中间路由器对ICMP限速造成的单跳“丢包”不会被误判；延迟按每跳近期均值高出自身历史低位的部分计算，
+跨洋链路这类固定的长延迟不会被当作问题。
+"""
+import logging
+import os
+import random
+import select
+import socket
+import struct
+import threading
+import time
+from collections import Counter
+from typing import Callable, Dict, Hashable, Iterable, List, Optional, Sequence, Set, Tuple, Union
+
+from .prober import ProbeResult, _checksum, ICMP_ECHO_REQUEST, ICMP_ECHO_REPLY
+from .timeseries import LatencySeries
+
+ICMP_DEST_UNREACHABLE = 3
+ICMP_TIME_EXCEEDED = 11
+
+NO_REPLY = "*"
+
+# 每跳的探测结果：TTL -> ProbeResult（host为应答地址，未应答为"*"）
+HopResults = Dict[int, ProbeResult]
+
+
+class HopTracer:
+    """逐跳探测后端基类"""
+    name = ""
+
+    def trace(self, target: str, max_hops: int = 30, count: int = 3,
+              timeout: int = 1000) -> HopResults:
+        raise NotImplementedError
+
+
+class IcmpTracer(HopTracer):
+    """原始套接字ICMP逐跳探测
+
+    每轮对1..max_hops的全部TTL各发送一个请求，序列号编码 (轮次, TTL)，
+    中间路由器返回的超时报文中带有原请求的ICMP头，据此匹配到TTL。
+    需要创建原始套接字的权限（Windows下以管理员身份运行）。
+    """
+    name = "icmp"
+
+    def __init__(self):
+        self._ident = os.getpid() & 0xFFFF
+        self._counter = 0
+        self._lock = threading.Lock()
+        self._warned = False
+
+    def _next_ident(self) -> int:
+        # 每次分析使用不同的标识符，并发分析互不干扰
+        with self._lock:
+            self._counter += 1
+            return (self._ident + self._counter) & 0xFFFF
+
+    @staticmethod
+    def _build_packet(ident: int, seq: int) -> bytes:
+        payload = b'steam-accelerator'
+        header = struct.pack('!BBHHH', ICMP_ECHO_REQUEST, 0, 0, ident, seq)
+        checksum = _checksum(header + payload)
+        return struct.pack('!BBHHH', ICMP_ECHO_REQUEST, 0, checksum, ident, seq) + payload
+
+    @staticmethod
+    def _parse_reply(packet: bytes) -> Optional[Tuple[int, int, bool]]:
+        """解析应答，返回 (标识符, 序列号, 是否到达目标)"""
+        if not packet or packet[0] >> 4 != 4:
+            return None
+        packet = packet[(packet[0] & 0x0F) * 4:]
+        if len(packet) < 8:
+            return None
+        icmp_type = packet[0]
+        if icmp_type == ICMP_ECHO_REPLY:
+            _, _, _, ident, seq = struct.unpack('!BBHHH', packet[:8])
+            return ident, seq, True
+        if icmp_type in (ICMP_TIME_EXCEEDED, ICMP_DEST_UNREACHABLE):
+            # 报文中附带原请求的IP头和前8字节
+            inner = packet[8:]
+            if len(inner) < 20:
+                return None
+            inner = inner[(inner[0] & 0x0F) * 4:]
+            if len(inner) < 8 or inner[0] != ICMP_ECHO_REQUEST:
+                return None
+            _, _, _, ident, seq = struct.unpack('!BBHHH', inner[:8])
+            return ident, seq, icmp_type == ICMP_DEST_UNREACHABLE
+        return None
+
+    def trace(self, target: str, max_hops: int = 30, count: int = 3,
+              timeout: int = 1000) -> HopResults:
+        hops = {ttl: ProbeResult(NO_REPLY, sent=count) for ttl in range(1, max_hops + 1)}
+        try:
+            addr = socket.gethostbyname(target)
+            sock = socket.socket(socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_ICMP)
+        except OSError as e:
+            if not self._warned:
+                self._warned = True
+                logging.warning(f"无法进行逐跳分析: {str(e)}")
+            return {}
+
+        ident = self._next_ident()
+        sent_at: Dict[int, float] = {}
+        reached = max_hops + 1
+        try:
+            sock.setblocking(False)
+            for round_index in range(count):
+                for ttl in range(1, max_hops + 1):
+                    seq = (round_index << 8) | ttl
+                    try:
+                        sock.setsockopt(socket.IPPROTO_IP, socket.IP_TTL, ttl)
+                        sent_at[seq] = time.perf_counter()
+                        sock.sendto(self._build_packet(ident, seq), (addr, 0))
+                    except OSError as e:
+                        logging.debug(f"发送TTL={ttl}的请求失败: {str(e)}")
+
+            deadline = time.perf_counter() + timeout / 1000
+            remaining = len(sent_at)
+            while remaining > 0:
+                wait = deadline - time.perf_counter()
+                if wait <= 0:
+                    break
+                readable, _, _ = select.select([sock], [], [], wait)
+                if not readable:
+                    break
+                try:
+                    packet, (source, _) = sock.recvfrom(2048)
+                except (BlockingIOError, InterruptedError):
+                    continue
+                received_at = time.perf_counter()
+                parsed = self._parse_reply(packet)
+                if parsed is None or parsed[0] != ident or parsed[1] not in sent_at:
+                    continue
+                _, seq, at_target = parsed
+                ttl = seq & 0xFF
+                hop = hops[ttl]
+                if hop.host == NO_REPLY:
+                    hop.host = source
+                hop.rtts.append((received_at - sent_at.pop(seq)) * 1000)
+                remaining -= 1
+                if at_target:
+                    reached = min(reached, ttl)
+        finally:
+            sock.close()
+
+        # 目标之后的TTL也会由目标应答，只保留到首次到达目标的一跳
+        return {ttl: hop for ttl, hop in hops.items() if ttl <= reached}
+
+
+# 模拟路径的一跳：(地址, 延迟ms, 丢包率)
+SimulatedHop = Tuple[str, float, float]
+
+
+class SimulatedTracer(HopTracer):
+    """按给定的逐跳延迟和丢包率生成应答，用于模拟和回放录制的路径
+
+    Args:
+        paths: 目标到逐跳列表的映射，或按目标返回逐跳列表的函数
+        jitter: 每个样本的随机抖动幅度(ms)
+    """
+    name = "simulated"
+
+    def __init__(self, paths: Union[Dict[str, Sequence[SimulatedHop]],
+                                    Callable[[str], Sequence[SimulatedHop]]],
+                 jitter: float = 2.0, seed: Optional[int] = None):
+        self.paths = paths
+        self.jitter = jitter
+        self._random = random.Random(seed)
+
+    def trace(self, target: str, max_hops: int = 30, count: int = 3,
+              timeout: int = 1000) -> HopResults:
+        path = self.paths(target) if callable(self.paths) else self.paths.get(target, [])
+        hops = {}
+        for ttl, (address, rtt, loss) in enumerate(list(path)[:max_hops], start=1):
+            result = ProbeResult(address, sent=count)
+            for _ in range(count):
+                if self._random.random() >= loss:
+                    result.rtts.append(max(rtt + self._random.uniform(-self.jitter, self.jitter), 0.1))
+            if not result.rtts:
+                result.host = NO_REPLY
+            hops[ttl] = result
+        return hops
+
+
+class HopStats:
+    """一跳的聚合统计"""
+
+    __slots__ = ("ttl", "addresses", "series")
+
+    def __init__(self, ttl: int, capacity: int):
+        self.ttl = ttl
+        self.addresses: Counter = Counter()
+        self.series = LatencySeries(capacity)
+
+    @property
+    def address(self) -> str:
+        """出现最多的应答地址（负载均衡时同一跳可能有多个地址）"""
+        if not self.addresses:
+            return NO_REPLY
+        return self.addresses.most_common(1)[0][0]
+
+    def summary(self) -> Dict:
+        return {"ttl": self.ttl, "address": self.address, "addresses": sorted(self.addresses),
+                "baseline": self.series.percentile(10), **self.series.summary()}
+
+
+class Segment:
+    """路径上开始出现持续丢包或延迟跃升的路段"""
+
+    __slots__ = ("ttl", "start", "end", "added_loss", "added_latency")
+
+    def __init__(self, ttl: int, start: str, end: str, added_loss: float, added_latency: float):
+        self.ttl = ttl
+        self.start = start
+        self.end = end
+        self.added_loss = added_loss
+        self.added_latency = added_latency
+
+    def to_dict(self) -> Dict:
+        return {"ttl": self.ttl, "start": self.start, "end": self.end,
+                "added_loss": self.added_loss, "added_latency": self.added_latency}
+
+    def __repr__(self):
+        return (f"Segment(ttl={self.ttl}, {self.start} -> {self.end}, "
+                f"loss+{self.added_loss:.0%}, latency+{self.added_latency:.0f}ms)")
+
+
+class PathAnalyzer:
+    """按路由聚合逐跳测量并定位问题路段
+
+    Args:
+        tracer: 逐跳探测后端
+        capacity: 每跳保留的样本数
+        loss_threshold: 丢包率跃升超过该值的路段视为问题路段
+        latency_jump: 排队延迟（近期延迟高出历史低位的部分）跃升超过该值(ms)的路段视为问题路段
+        max_hops: 最大跳数
+        count: 每轮分析每跳的请求数
+        timeout: 每轮分析的超时时间(ms)
+    """
+
+    def __init__(self, tracer: HopTracer, capacity: int = 100, loss_threshold: float = 0.2,
+                 latency_jump: float = 30.0, max_hops: int = 30, count: int = 3,
+                 timeout: int = 1000):
+        self.tracer = tracer
+        self.capacity = capacity
+        self.loss_threshold = loss_threshold
+        self.latency_jump = latency_jump
+        self.max_hops = max_hops
+        self.count = count
+        self.timeout = timeout
+        self._paths: Dict[Hashable, Dict[int, HopStats]] = {}
+        self._lock = threading.Lock()
+
+    def analyze(self, key: Hashable, target: str) -> List[Segment]:
+        """对路由执行一轮逐跳探测并累加统计，返回当前定位到的问题路段"""
+        try:
+            hops = self.tracer.trace(target, self.max_hops, self.count, self.timeout)
+        except Exception as e:
+            logging.error(f"逐跳分析 {target} 失败: {str(e)}")
+            return []
+        if not hops:
+            return []
+        now = time.time()
+        with self._lock:
+            path = self._paths.setdefault(key, {})
+            # 路径变短（例如换了路由）时丢弃多余的跳
+            for ttl in [ttl for ttl in path if ttl > max(hops)]:
+                del path[ttl]
+            for ttl, result in hops.items():
+                stats = path.get(ttl)
+                if stats is None:
+                    stats = path[ttl] = HopStats(ttl, self.capacity)
+                if result.host != NO_REPLY:
+                    stats.addresses[result.host] += 1
+                stats.series.add_result(result, now)
+        return self.bad_segments(key)
+
+    def hops(self, key: Hashable) -> List[Dict]:
+        """路由的逐跳统计，按TTL排序"""
+        with self._lock:
+            path = self._paths.get(key, {})
+            return [path[ttl].summary() for ttl in sorted(path)]
+
+    def bad_segments(self, key: Hashable) -> List[Segment]:
+        """定位问题路段
+
+        每跳的有效丢包率和有效排队延迟取该跳及其后所有有应答的跳中的最小值，
+        有效值相对上一跳的增量超过阈值时，该跳与上一跳之间的路段即为问题路段。
+        """
+        hops = [hop for hop in self.hops(key) if hop["address"] != NO_REPLY]
+        floors: List[Tuple[float, float]] = []
+        loss_floor = excess_floor = float('inf')
+        for hop in reversed(hops):
+            loss_floor = min(loss_floor, hop["loss"])
+            if hop["ewma"] is not None and hop["baseline"] is not None:
+                excess_floor = min(excess_floor, max(hop["ewma"] - hop["baseline"], 0.0))
+            floors.append((loss_floor, excess_floor))
+        floors.reverse()
+
+        segments = []
+        previous_address, previous_loss, previous_excess = "local", 0.0, 0.0
+        for hop, (loss, excess) in zip(hops, floors):
+            if excess == float('inf'):
+                excess = previous_excess
+            added_loss = loss - previous_loss
+            added_latency = excess - previous_excess
+            if added_loss >= self.loss_threshold or added_latency >= self.latency_jump:
+                segments.append(Segment(hop["ttl"], previous_address, hop["address"],
+                                        max(added_loss, 0.0), max(added_latency, 0.0)))
+            previous_address, previous_loss, previous_excess = hop["address"], loss, excess
+        return segments
+
+    def addresses(self, key: Hashable) -> Set[str]:
+        """路由经过的全部应答地址"""
+        with self._lock:
+            return {address for stats in self._paths.get(key, {}).values()
+                    for address in stats.addresses}
+
+    def shares_segment(self, key: Hashable, segments: Iterable[Segment]) -> bool:
+        """路由是否经过这些问题路段（路段两端的地址都在路径上）"""
+        addresses = self.addresses(key)
+        return any(segment.end in addresses
+                   and (segment.start == "local" or segment.start in addresses)
+                   for segment in segments)
+
+    def known(self, key: Hashable) -> bool:
+        with self._lock:
+            return key in self._paths
+
+    def forget(self, key: Hashable):
+        with self._lock:
+            self._paths.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._paths.clear()
+
+    def summaries(self) -> Dict[Hashable, Dict]:
+        """全部路由的逐跳统计和问题路段"""
+        with self._lock:
+            keys = list(self._paths)
+        return {key: {"hops": self.hops(key),
+                      "bad_segments": [segment.to_dict() for segment in self.bad_segments(key)]}
+                for key in keys}
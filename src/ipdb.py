@@ -0,0 +1,204 @@
+"""
+离线IP归属库
+
+把 "起始IP,结束IP,运营商,省份,ASN" 格式的CSV编译为按起始地址排序的区间索引文件，
+运行时用mmap直接映射，起止地址数组无需解析即可二分查找，单次查询为微秒级。
+
+文件格式（小端）：
+    头部   magic(4s) version(H) 保留(H) 区间数(I) 字符串表长度(I)
+    数组   starts[uint32 × N] ends[uint32 × N] isp[uint16 × N] province[uint16 × N] asn[uint32 × N]
+    字符串表  UTF-8 JSON 数组，isp/province 为其中的下标
+
+用法: python -m src.ipdb input.csv output.ipdb
+"""
+import bisect
+import csv
+import ipaddress
+import json
+import logging
+import mmap
+import socket
+import struct
+import sys
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+
+MAGIC = b"IPDB"
+VERSION = 1
+_HEADER = struct.Struct("<4sHHII")
+
+
+class IpInfo:
+    """IP地址的归属信息"""
+
+    __slots__ = ("isp", "province", "asn")
+
+    def __init__(self, isp: str, province: str, asn: int):
+        self.isp = isp
+        self.province = province
+        self.asn = asn
+
+    def __repr__(self):
+        return f"IpInfo(isp={self.isp!r}, province={self.province!r}, asn={self.asn})"
+
+
+def _to_int(value: str) -> int:
+    return int(ipaddress.IPv4Address(value.strip()))
+
+
+def compile_ipdb(rows: Iterable[Tuple[str, str, str, str, int]], path: str) -> int:
+    """把 (起始IP, 结束IP, 运营商, 省份, ASN) 编译为索引文件，返回区间数
+
+    重叠的部分以起始地址较大（更具体）的区间为准，嵌套在内的区间把外层区间拆为前后两段。
+    """
+    strings: List[str] = []
+    string_ids = {}
+
+    def string_id(value: str) -> int:
+        if value not in string_ids:
+            string_ids[value] = len(strings)
+            strings.append(value)
+        return string_ids[value]
+
+    # 起始地址相同时外层（结束地址较大）的区间在前
+    ranges = sorted(((_to_int(start), _to_int(end), string_id(isp), string_id(province), int(asn or 0))
+                     for start, end, isp, province, asn in rows),
+                    key=lambda r: (r[0], -r[1]))
+    merged = []
+    stack = []  # 包含当前地址的区间，外层在前
+    cursor = 0  # 尚未输出的第一个地址
+
+    def emit(last: int, entry: Tuple):
+        nonlocal cursor
+        if cursor <= last:
+            merged.append((cursor, last) + entry[2:])
+            cursor = last + 1
+
+    for entry in ranges:
+        start, end = entry[0], entry[1]
+        if start > end:
+            continue
+        # 在新区间之前结束的内层区间输出剩余部分
+        while stack and stack[-1][1] < start:
+            emit(stack[-1][1], stack.pop())
+        if stack:
+            emit(start - 1, stack[-1])
+        stack.append(entry)
+        cursor = start
+    while stack:
+        emit(stack[-1][1], stack.pop())
+
+    table = json.dumps(strings, ensure_ascii=False).encode('utf-8')
+    columns = list(zip(*merged)) if merged else [(), (), (), (), ()]
+    with open(path, 'wb') as f:
+        f.write(_HEADER.pack(MAGIC, VERSION, 0, len(merged), len(table)))
+        f.write(np.asarray(columns[0], dtype='<u4').tobytes())
+        f.write(np.asarray(columns[1], dtype='<u4').tobytes())
+        f.write(np.asarray(columns[2], dtype='<u2').tobytes())
+        f.write(np.asarray(columns[3], dtype='<u2').tobytes())
+        f.write(np.asarray(columns[4], dtype='<u4').tobytes())
+        f.write(table)
+    return len(merged)
+
+
+def compile_csv(csv_path: str, path: str) -> int:
+    """从CSV编译索引文件，以#开头的行为注释"""
+    with open(csv_path, 'r', encoding='utf-8', newline='') as f:
+        rows = [row for row in csv.reader(f) if row and not row[0].startswith('#')]
+    return compile_ipdb(((row[0], row[1], row[2], row[3] if len(row) > 3 else "",
+                          row[4] if len(row) > 4 else 0) for row in rows), path)
+
+
+class IpIndex:
+    """mmap映射的IP区间索引
+
+    Args:
+        path: compile_ipdb 生成的索引文件
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, _, count, table_size = _HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC or version != VERSION:
+            self._mmap.close()
+            raise ValueError(f"不是有效的IP归属库: {path}")
+
+        offset = _HEADER.size
+        self.count = count
+        self.starts = np.frombuffer(self._mmap, dtype='<u4', count=count, offset=offset)
+        self.ends = np.frombuffer(self._mmap, dtype='<u4', count=count, offset=offset + 4 * count)
+        self.isps = np.frombuffer(self._mmap, dtype='<u2', count=count, offset=offset + 8 * count)
+        self.provinces = np.frombuffer(self._mmap, dtype='<u2', count=count,
+                                       offset=offset + 10 * count)
+        self.asns = np.frombuffer(self._mmap, dtype='<u4', count=count, offset=offset + 12 * count)
+        table_offset = offset + 16 * count
+        self.strings: List[str] = json.loads(
+            self._mmap[table_offset:table_offset + table_size].decode('utf-8'))
+        # 小端机器上直接在映射内存上二分，避免为单次查询创建numpy标量
+        if sys.byteorder == 'little':
+            view = memoryview(self._mmap)
+            self._views = (view[offset:offset + 4 * count].cast('I'),
+                           view[offset + 4 * count:offset + 8 * count].cast('I'))
+            view.release()
+        else:
+            self._views = (self.starts.tolist(), self.ends.tolist())
+
+    def __len__(self) -> int:
+        return self.count
+
+    def _find(self, value: int) -> int:
+        starts, ends = self._views
+        i = bisect.bisect_right(starts, value) - 1
+        if i >= 0 and value <= ends[i]:
+            return i
+        return -1
+
+    def lookup(self, ip: str) -> Optional[IpInfo]:
+        """查询单个地址，不在任何区间内时返回None"""
+        try:
+            value = int.from_bytes(socket.inet_aton(ip), 'big')
+        except (OSError, TypeError):
+            return None
+        i = self._find(value)
+        if i < 0:
+            return None
+        return IpInfo(self.strings[self.isps[i]], self.strings[self.provinces[i]], int(self.asns[i]))
+
+    def lookup_many(self, values: np.ndarray) -> np.ndarray:
+        """批量查询整数地址，返回区间下标数组（未命中为-1）"""
+        values = np.asarray(values, dtype=np.uint32)
+        index = np.searchsorted(self.starts, values, side='right') - 1
+        hit = (index >= 0) & (values <= self.ends[np.maximum(index, 0)])
+        return np.where(hit, index, -1)
+
+    def close(self):
+        views, self._views = self._views, ((), ())
+        self.starts = self.ends = self.isps = self.provinces = self.asns = None
+        for view in views:
+            if isinstance(view, memoryview):
+                view.release()
+        try:
+            self._mmap.close()
+        except BufferError:
+            # 仍有外部引用的数组时由垃圾回收释放
+            pass
+
+
+def load_ipdb(path: str) -> Optional[IpIndex]:
+    """加载IP归属库，文件不存在或无效时返回None"""
+    try:
+        return IpIndex(path)
+    except (OSError, ValueError) as e:
+        logging.info(f"未加载IP归属库: {str(e)}")
+        return None
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3:
+        print(__doc__)
+        sys.exit(1)
+    total = compile_csv(sys.argv[1], sys.argv[2])
+    print(f"已编译 {total} 个区间到 {sys.argv[2]}")
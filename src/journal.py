@@ -0,0 +1,112 @@
+"""
+路由变更日志
+
+以追加方式把加速器对路由表的每次修改写入磁盘（先写日志再改路由），
+进程异常退出后，下次启动时据此找出遗留的路由并与实际路由表比对清理。
+"""
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, Iterable
+
+from .routing import RouteChange, RouteKey
+
+
+class RouteJournal:
+    """追加写入的路由变更日志
+
+    Args:
+        path: 日志文件路径
+        compact_after: 日志超过该行数时自动压缩为当前状态
+    """
+
+    def __init__(self, path: str, compact_after: int = 1000):
+        self.path = path
+        self.compact_after = compact_after
+        self._lock = threading.Lock()
+        self._lines = 0
+        self._state: Dict[RouteKey, str] = self._replay()
+
+    def _replay(self) -> Dict[RouteKey, str]:
+        """重放日志，得到加速器认为自己安装的路由"""
+        state = {}
+        if not os.path.exists(self.path):
+            return state
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    self._lines += 1
+                    try:
+                        entry = json.loads(line)
+                        key = (entry["dst"], entry["prefixlen"])
+                    except (ValueError, KeyError):
+                        # 崩溃时可能留下写了一半的最后一行
+                        continue
+                    if entry.get("op") == RouteChange.ADD:
+                        state[key] = entry["gw"]
+                    else:
+                        state.pop(key, None)
+        except OSError as e:
+            logging.error(f"读取路由日志失败: {str(e)}")
+        return state
+
+    @property
+    def owned(self) -> Dict[RouteKey, str]:
+        """日志记录的、由加速器安装的路由"""
+        with self._lock:
+            return dict(self._state)
+
+    def record(self, changes: Iterable[RouteChange]):
+        """在修改路由表之前记录变更"""
+        lines = []
+        with self._lock:
+            for change in changes:
+                entry = {"op": change.action, "dst": change.destination,
+                         "prefixlen": change.prefixlen, "ts": round(time.time(), 3)}
+                if change.action == RouteChange.ADD:
+                    entry["gw"] = change.gateway
+                    self._state[change.key] = change.gateway
+                else:
+                    self._state.pop(change.key, None)
+                lines.append(json.dumps(entry, ensure_ascii=False))
+            if not lines:
+                return
+            try:
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write('\n'.join(lines) + '\n')
+                    f.flush()
+                    os.fsync(f.fileno())
+                self._lines += len(lines)
+            except OSError as e:
+                logging.error(f"写入路由日志失败: {str(e)}")
+                return
+            if self._lines > self.compact_after:
+                self._compact_locked()
+
+    def forget(self, keys: Iterable[RouteKey]):
+        """从日志状态中移除已确认不存在的路由"""
+        with self._lock:
+            for key in keys:
+                self._state.pop(key, None)
+            self._compact_locked()
+
+    def compact(self):
+        """把日志重写为当前状态"""
+        with self._lock:
+            self._compact_locked()
+
+    def _compact_locked(self):
+        tmp_path = self.path + '.tmp'
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                for (dst, prefixlen), gw in self._state.items():
+                    f.write(json.dumps({"op": RouteChange.ADD, "dst": dst, "prefixlen": prefixlen,
+                                        "gw": gw, "ts": round(time.time(), 3)}) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+            self._lines = len(self._state)
+        except OSError as e:
+            logging.error(f"压缩路由日志失败: {str(e)}")
@@ -0,0 +1,237 @@
+"""
+节点×服务器延迟矩阵
+
+每个加速会话只建立一次，节点评分、排序和逐服务器选路都在数组上完成。
+"""
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+
+from .prober import ProbeResult
+
+DEFAULT_SCORE_WEIGHTS = {
+    "node_latency": 40,   # 节点延迟
+    "connectivity": 30,   # 连通性
+    "avg_latency": 30,    # 服务器平均延迟
+    "loss": 20,           # 丢包率
+    "jitter": 10,         # 抖动
+}
+
+DEFAULT_SCORE_LIMITS = {
+    "max_node_latency": 100,    # 节点延迟达到该值时直接记0分(ms)
+    "node_latency_scale": 200,  # 节点延迟得分降为0的延迟(ms)
+    "avg_latency_scale": 500,   # 服务器平均延迟得分降为0的延迟(ms)
+    "loss_scale": 0.1,          # 丢包得分降为0的丢包率
+    "jitter_scale": 50,         # 抖动得分降为0的抖动(ms)
+    "loss_penalty": 200,        # 逐服务器选路时每100%丢包折算的延迟(ms)
+}
+
+
+def _to_arrays(results: List[Optional[ProbeResult]]
+               ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """把探测结果转换为 (延迟, 丢包率, 抖动) 数组，无应答的延迟和抖动记为NaN"""
+    rtt = np.full(len(results), np.nan)
+    loss = np.ones(len(results))
+    jitter = np.full(len(results), np.nan)
+    for i, result in enumerate(results):
+        if result is None:
+            continue
+        loss[i] = result.loss
+        if result.received:
+            rtt[i] = result.avg
+            jitter[i] = result.jitter
+    return rtt, loss, jitter
+
+
+class LatencyMatrix:
+    """节点×服务器的延迟/丢包矩阵
+
+    node_* 为本机到各节点的测量，direct_* 为本机直连各服务器的测量，
+    rtt/loss/jitter[n, s] 为经节点n访问服务器s的测量（未测量为NaN）。
+    """
+
+    def __init__(self, nodes: List[Dict], servers: List[str]):
+        self.nodes = list(nodes)
+        self.node_ips = [node["ip"] for node in self.nodes]
+        self.servers = list(servers)
+        self.node_index = {ip: i for i, ip in enumerate(self.node_ips)}
+        self.server_index = {server: i for i, server in enumerate(self.servers)}
+
+        shape = (len(self.nodes), len(self.servers))
+        self.node_rtt = np.full(shape[0], np.nan)
+        self.node_loss = np.ones(shape[0])
+        self.node_jitter = np.full(shape[0], np.nan)
+        self.direct_rtt = np.full(shape[1], np.nan)
+        self.direct_loss = np.ones(shape[1])
+        self.direct_jitter = np.full(shape[1], np.nan)
+        self.rtt = np.full(shape, np.nan)
+        self.loss = np.full(shape, np.nan)
+        self.jitter = np.full(shape, np.nan)
+
+    def set_node_results(self, results: Dict[str, ProbeResult],
+                         priors: Optional[Dict[str, Tuple[float, float]]] = None,
+                         prior_weight: float = 0.0):
+        """写入本机到各节点的测量
+
+        priors 为节点历史的 (平均延迟, 丢包率)，按 prior_weight 个样本的权重与本次测量合并。
+        本次没有应答的节点只合并丢包率，不会因历史延迟而被视为可达。
+        """
+        self.node_rtt, self.node_loss, self.node_jitter = _to_arrays(
+            [results.get(ip) for ip in self.node_ips])
+        if not priors or prior_weight <= 0:
+            return
+        for i, ip in enumerate(self.node_ips):
+            prior, result = priors.get(ip), results.get(ip)
+            if prior is None or result is None:
+                continue
+            mean, loss = prior
+            self.node_loss[i] = ((result.loss * result.sent + loss * prior_weight)
+                                 / (result.sent + prior_weight))
+            prior_received = prior_weight * (1 - loss)
+            if result.received and np.isfinite(mean) and prior_received > 0:
+                self.node_rtt[i] = ((result.avg * result.received + mean * prior_received)
+                                    / (result.received + prior_received))
+
+    def set_direct_results(self, results: Dict[str, ProbeResult]):
+        """写入本机直连各服务器的测量"""
+        self.direct_rtt, self.direct_loss, self.direct_jitter = _to_arrays(
+            [results.get(s) for s in self.servers])
+
+    def add_servers(self, servers: List[str], results: Dict[str, ProbeResult]):
+        """追加服务器列，已有的测量和下标保持不变
+
+        results 为本机直连新服务器的测量，经节点的测量初始为未测量。
+        """
+        servers = [server for server in servers if server not in self.server_index]
+        if not servers:
+            return
+        rtt, loss, jitter = _to_arrays([results.get(s) for s in servers])
+        self.direct_rtt = np.concatenate([self.direct_rtt, rtt])
+        self.direct_loss = np.concatenate([self.direct_loss, loss])
+        self.direct_jitter = np.concatenate([self.direct_jitter, jitter])
+        missing = np.full((len(self.nodes), len(servers)), np.nan)
+        self.rtt = np.hstack([self.rtt, missing])
+        self.loss = np.hstack([self.loss, missing])
+        self.jitter = np.hstack([self.jitter, missing])
+        # 数组扩展完成后再登记下标，并发读取的一方不会取到越界的列
+        for server in servers:
+            self.server_index[server] = len(self.servers)
+            self.servers.append(server)
+
+    def set_direct_result(self, server: str, result: ProbeResult):
+        """更新本机直连单个服务器的测量"""
+        s = self.server_index[server]
+        self.direct_loss[s] = result.loss
+        self.direct_rtt[s] = result.avg if result.received else np.nan
+        self.direct_jitter[s] = result.jitter if result.received else np.nan
+
+    def set_path_result(self, node_ip: str, server: str, result: ProbeResult):
+        """写入经节点访问服务器的测量"""
+        n, s = self.node_index[node_ip], self.server_index[server]
+        self.loss[n, s] = result.loss
+        self.rtt[n, s] = result.avg if result.received else np.nan
+        self.jitter[n, s] = result.jitter if result.received else np.nan
+
+    def path_matrix(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """经节点访问服务器的延迟、丢包与抖动，未实测的位置用直连测量代替"""
+        measured = ~np.isnan(self.loss)
+        rtt = np.where(measured, self.rtt, self.direct_rtt[np.newaxis, :])
+        loss = np.where(measured, self.loss, self.direct_loss[np.newaxis, :])
+        jitter = np.where(measured, self.jitter, self.direct_jitter[np.newaxis, :])
+        return rtt, loss, jitter
+
+    def score_nodes(self, weights: Optional[Dict[str, float]] = None,
+                    limits: Optional[Dict[str, float]] = None,
+                    bonus: Optional[np.ndarray] = None) -> Dict[str, np.ndarray]:
+        """为所有节点评分 (0-100)
+
+        各项得分按 limits 中的尺度线性折算到 0-1，再按 weights 加权平均。
+        丢包和抖动为本机到节点与经节点到各服务器两段的合计。
+        bonus 为各节点的额外加分（例如与本机同运营商的节点），只加给得分大于0的节点，
+        加分后的得分可能超过100。
+
+        Returns:
+            包含 score/latency/connectivity/avg_latency/loss/jitter 数组的字典
+        """
+        weights = {**DEFAULT_SCORE_WEIGHTS, **(weights or {})}
+        limits = {**DEFAULT_SCORE_LIMITS, **(limits or {})}
+        node_latency = np.nan_to_num(self.node_rtt, nan=999.0)
+
+        rtt, path_loss, path_jitter = self.path_matrix()
+        reachable = ~np.isnan(rtt)
+        success = reachable.sum(axis=1)
+        if self.servers:
+            connectivity = success / len(self.servers)
+        else:
+            connectivity = np.zeros(len(self.nodes))
+        total = np.where(reachable, rtt, 0.0).sum(axis=1)
+        avg_latency = np.where(success > 0, total / np.maximum(success, 1), 999.0)
+
+        # 可达服务器上的平均丢包和抖动
+        denominator = np.maximum(success, 1)
+        avg_path_loss = np.where(reachable, path_loss, 0.0).sum(axis=1) / denominator
+        avg_path_jitter = np.where(reachable, np.nan_to_num(path_jitter), 0.0).sum(axis=1) / denominator
+        loss = 1 - (1 - self.node_loss) * (1 - avg_path_loss)
+        jitter = np.nan_to_num(self.node_jitter) + avg_path_jitter
+
+        terms = {
+            "node_latency": 1 - node_latency / limits["node_latency_scale"],
+            "connectivity": connectivity,
+            "avg_latency": 1 - avg_latency / limits["avg_latency_scale"],
+            "loss": 1 - np.clip(loss / limits["loss_scale"], 0, 1),
+            "jitter": 1 - np.clip(jitter / limits["jitter_scale"], 0, 1),
+        }
+        total_weight = sum(weights.get(name, 0) for name in terms) or 1
+        score = sum(term * weights.get(name, 0) for name, term in terms.items()) * 100 / total_weight
+        # 跳过高延迟节点
+        score = np.where(node_latency < limits["max_node_latency"], score, 0.0)
+        score = np.clip(score, 0, 100)
+        if bonus is not None:
+            score = np.where(score > 0, score + bonus, 0.0)
+
+        return {
+            "score": score,
+            "latency": node_latency,
+            "connectivity": connectivity,
+            "avg_latency": avg_latency,
+            "loss": loss,
+            "jitter": jitter,
+        }
+
+    def top_nodes(self, scores: np.ndarray, k: int = 5) -> np.ndarray:
+        """得分大于0的前k个节点下标，按得分降序"""
+        candidates = np.flatnonzero(scores > 0)
+        if candidates.size > k:
+            part = np.argpartition(-scores[candidates], k - 1)[:k]
+            candidates = candidates[part]
+        return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+    def best_nodes_for_servers(self, candidates: Optional[List[str]] = None,
+                               loss_penalty: float = DEFAULT_SCORE_LIMITS["loss_penalty"]
+                               ) -> Dict[str, Tuple[Optional[str], float]]:
+        """为每个服务器选出实测延迟最低的节点
+
+        比较时丢包率按 loss_penalty 折算为额外延迟，返回的仍是实测延迟。
+
+        Returns:
+            服务器到 (节点IP, 延迟) 的映射；没有实测数据的服务器节点为None
+        """
+        if candidates is None:
+            rows = np.arange(len(self.nodes))
+        else:
+            rows = np.array([self.node_index[ip] for ip in candidates], dtype=int)
+        best = {}
+        if rows.size == 0:
+            return {server: (None, 999.0) for server in self.servers}
+
+        sub = self.rtt[rows]
+        cost = sub + np.nan_to_num(self.loss[rows]) * loss_penalty
+        cost = np.where(np.isnan(sub), np.inf, cost)
+        argmin = cost.argmin(axis=0)
+        columns = np.arange(len(self.servers))
+        minimum = cost[argmin, columns]
+        for s, server in enumerate(self.servers):
+            if np.isfinite(minimum[s]):
+                best[server] = (self.node_ips[rows[argmin[s]]], float(sub[argmin[s], s]))
+            else:
+                best[server] = (None, 999.0)
+        return best
@@ -0,0 +1,115 @@
+"""
+探测结果缓存
+
+按 (目标, 探测参数) 缓存探测结果，支持TTL过期、按容量的LRU淘汰，
+并合并对同一目标的并发请求，使同时发起的调用共享一次测量。
+"""
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Dict, Hashable, List, Tuple
+
+
+class ProbeCache:
+    """线程安全的探测结果缓存
+
+    缓存键的第一个元素必须是目标地址，以便按目标失效。
+
+    Args:
+        ttl: 结果有效期(秒)
+        max_size: 最多缓存的条目数
+    """
+
+    def __init__(self, ttl: float = 5.0, max_size: int = 1024):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._inflight: Dict[Hashable, Future] = {}
+        self._generations: Dict[str, int] = {}
+        self._epoch = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    def claim(self, keys: List[Hashable], use_cache: bool = True
+              ) -> Tuple[Dict[Hashable, Any], Dict[Hashable, Future], Dict[Hashable, Tuple[int, int]]]:
+        """查询一批键
+
+        Returns:
+            (命中的结果, 其他线程正在测量的键及其Future, 需要由调用方测量的键及其代数)
+            调用方必须对第三项中的每个键调用 fulfill 或 fail。
+        """
+        hits, waiting, claimed = {}, {}, {}
+        now = time.monotonic()
+        with self._lock:
+            for key in keys:
+                if use_cache:
+                    entry = self._entries.get(key)
+                    if entry is not None:
+                        if now - entry[0] <= self.ttl:
+                            self._entries.move_to_end(key)
+                            hits[key] = entry[1]
+                            self.hits += 1
+                            continue
+                        del self._entries[key]
+
+                    future = self._inflight.get(key)
+                    if future is not None:
+                        waiting[key] = future
+                        self.coalesced += 1
+                        continue
+
+                self.misses += 1
+                if key not in self._inflight:
+                    self._inflight[key] = Future()
+                claimed[key] = self._generation(key[0])
+        return hits, waiting, claimed
+
+    def _generation(self, target: str) -> Tuple[int, int]:
+        return self._epoch, self._generations.get(target, 0)
+
+    def fulfill(self, key: Hashable, value: Any, generation: Tuple[int, int]):
+        """写入测量结果并唤醒等待者"""
+        with self._lock:
+            # 测量期间目标被失效（例如路由已变更）时不写入缓存
+            if self._generation(key[0]) == generation:
+                self._entries[key] = (time.monotonic(), value)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+            future = self._inflight.pop(key, None)
+        if future is not None and not future.done():
+            future.set_result(value)
+
+    def fail(self, key: Hashable, error: BaseException):
+        """测量失败，唤醒等待者"""
+        with self._lock:
+            future = self._inflight.pop(key, None)
+        if future is not None and not future.done():
+            future.set_exception(error)
+
+    def invalidate(self, target: str = None):
+        """使某个目标（或全部目标）的缓存失效"""
+        with self._lock:
+            if target is None:
+                self._entries.clear()
+                self._epoch += 1
+                return
+            self._generations[target] = self._generations.get(target, 0) + 1
+            for key in [key for key in self._entries if key[0] == target]:
+                del self._entries[key]
+
+    def stats(self) -> Dict[str, int]:
+        """命中统计"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "evictions": self.evictions,
+                "size": len(self._entries),
+            }
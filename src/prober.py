@@ -0,0 +1,283 @@
+"""
+进程内ICMP探测引擎
+
+通过单个套接字同时向多个目标发送ICMP回显请求，按标识符和序列号匹配应答，
+避免为每次测速启动ping子进程并解析与系统语言相关的输出。
+"""
+import os
+import select
+import socket
+import struct
+import sys
+import threading
+import logging
+import time
+from typing import Dict, Optional, List
+
+ICMP_ECHO_REQUEST = 8
+ICMP_ECHO_REPLY = 0
+
+
+class ProbeResult:
+    """单个目标的探测结果"""
+
+    __slots__ = ("host", "sent", "rtts")
+
+    def __init__(self, host: str, sent: int = 0, rtts: Optional[List[float]] = None):
+        self.host = host
+        self.sent = sent
+        self.rtts = rtts if rtts is not None else []
+
+    @property
+    def received(self) -> int:
+        return len(self.rtts)
+
+    @property
+    def avg(self) -> float:
+        """平均延迟(ms)，无应答时返回999.0"""
+        if not self.rtts:
+            return 999.0
+        return sum(self.rtts) / len(self.rtts)
+
+    @property
+    def loss(self) -> float:
+        """丢包率 (0-1)"""
+        if self.sent <= 0:
+            return 1.0
+        return 1.0 - min(self.received, self.sent) / self.sent
+
+    @property
+    def jitter(self) -> float:
+        """相邻样本延迟差的平均绝对值(ms)，样本少于2个时为0"""
+        if len(self.rtts) < 2:
+            return 0.0
+        return sum(abs(b - a) for a, b in zip(self.rtts, self.rtts[1:])) / (len(self.rtts) - 1)
+
+    def __repr__(self):
+        return (f"ProbeResult(host={self.host!r}, sent={self.sent}, "
+                f"received={self.received}, avg={self.avg:.1f})")
+
+
+def _checksum(data: bytes) -> int:
+    """计算ICMP校验和"""
+    if len(data) % 2:
+        data += b'\x00'
+    total = sum(struct.unpack(f'!{len(data) // 2}H', data))
+    total = (total >> 16) + (total & 0xFFFF)
+    total += total >> 16
+    return ~total & 0xFFFF
+
+
+class _Batch:
+    """一次probe调用中所有待应答请求的计数"""
+
+    def __init__(self, remaining: int):
+        self.remaining = remaining
+        self.done = threading.Event()
+        if remaining <= 0:
+            self.done.set()
+
+
+class _Pending:
+    __slots__ = ("addr", "sent_at", "result", "batch")
+
+    def __init__(self, addr: str, sent_at: float, result: ProbeResult, batch: _Batch):
+        self.addr = addr
+        self.sent_at = sent_at
+        self.result = result
+        self.batch = batch
+
+
+class IcmpProber:
+    """多目标ICMP探测器
+
+    Linux下优先使用无需特权的SOCK_DGRAM ICMP套接字，失败时回退到原始套接字。
+    所有调用共享同一个套接字，由后台线程接收应答并按序列号分发，因此可被多个线程并发调用。
+    """
+
+    def __init__(self):
+        self._sock: Optional[socket.socket] = None
+        self._raw = False
+        self._ident = os.getpid() & 0xFFFF
+        self._seq = 0
+        self._pending: Dict[int, _Pending] = {}
+        self._lock = threading.Lock()
+        self._receiver: Optional[threading.Thread] = None
+        self._closed = False
+        self._open_failed = False
+
+    @property
+    def available(self) -> bool:
+        """当前环境是否能够创建ICMP套接字"""
+        return self._ensure_socket()
+
+    def _open_socket(self) -> Optional[socket.socket]:
+        """打开ICMP套接字，优先使用无特权的数据报套接字"""
+        if sys.platform.startswith('linux'):
+            try:
+                sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_ICMP)
+                self._raw = False
+                logging.info("ICMP探测使用无特权数据报套接字")
+                return sock
+            except OSError as e:
+                logging.debug(f"无法创建ICMP数据报套接字: {str(e)}")
+        try:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_ICMP)
+            self._raw = True
+            logging.info("ICMP探测使用原始套接字")
+            return sock
+        except OSError as e:
+            logging.warning(f"无法创建ICMP原始套接字: {str(e)}")
+            return None
+
+    def _ensure_socket(self) -> bool:
+        with self._lock:
+            if self._sock is not None:
+                return True
+            if self._open_failed or self._closed:
+                return False
+            sock = self._open_socket()
+            if sock is None:
+                self._open_failed = True
+                return False
+            sock.setblocking(False)
+            self._sock = sock
+            self._receiver = threading.Thread(target=self._receive_loop,
+                                              name="icmp-receiver", daemon=True)
+            self._receiver.start()
+            return True
+
+    def _next_seq(self) -> int:
+        """分配一个未被占用的序列号（调用方持有锁）"""
+        for _ in range(0x10000):
+            self._seq = (self._seq + 1) & 0xFFFF
+            if self._seq not in self._pending:
+                return self._seq
+        raise RuntimeError("ICMP序列号已耗尽")
+
+    def _build_packet(self, seq: int) -> bytes:
+        payload = struct.pack('!d', time.perf_counter()) + b'steam-accelerator'
+        header = struct.pack('!BBHHH', ICMP_ECHO_REQUEST, 0, 0, self._ident, seq)
+        checksum = _checksum(header + payload)
+        header = struct.pack('!BBHHH', ICMP_ECHO_REQUEST, 0, checksum, self._ident, seq)
+        return header + payload
+
+    def _parse_reply(self, packet: bytes) -> Optional[int]:
+        """解析应答报文，返回序列号"""
+        if self._raw and packet and packet[0] >> 4 == 4:
+            packet = packet[(packet[0] & 0x0F) * 4:]
+        if len(packet) < 8:
+            return None
+        icmp_type, _, _, ident, seq = struct.unpack('!BBHHH', packet[:8])
+        if icmp_type != ICMP_ECHO_REPLY:
+            return None
+        # 数据报套接字的标识符由内核改写，且只会收到本套接字的应答
+        if self._raw and ident != self._ident:
+            return None
+        return seq
+
+    def _receive_loop(self):
+        """后台接收线程"""
+        while not self._closed:
+            sock = self._sock
+            if sock is None:
+                break
+            try:
+                readable, _, _ = select.select([sock], [], [], 0.2)
+                if not readable:
+                    continue
+                packet, (addr, _) = sock.recvfrom(2048)
+            except (BlockingIOError, InterruptedError):
+                continue
+            except OSError as e:
+                if self._closed:
+                    break
+                logging.debug(f"接收ICMP应答失败: {str(e)}")
+                time.sleep(0.05)
+                continue
+
+            received_at = time.perf_counter()
+            seq = self._parse_reply(packet)
+            if seq is None:
+                continue
+            with self._lock:
+                pending = self._pending.get(seq)
+                if pending is None or pending.addr != addr:
+                    continue
+                del self._pending[seq]
+                pending.result.rtts.append((received_at - pending.sent_at) * 1000)
+                pending.batch.remaining -= 1
+                if pending.batch.remaining <= 0:
+                    pending.batch.done.set()
+
+    def probe(self, hosts: List[str], count: int = 4, timeout: int = 1000,
+              interval: int = 20) -> Dict[str, ProbeResult]:
+        """向多个目标发送ICMP回显请求
+
+        Args:
+            hosts: 目标主机列表
+            count: 每个目标的请求次数
+            timeout: 单次请求超时时间(ms)
+            interval: 两轮请求之间的间隔(ms)
+
+        Returns:
+            目标到探测结果的映射
+        """
+        results = {host: ProbeResult(host) for host in hosts}
+        if not hosts or count <= 0:
+            return results
+        if not self._ensure_socket():
+            raise OSError("ICMP套接字不可用")
+
+        addrs = {}
+        for host in results:
+            try:
+                addrs[host] = socket.gethostbyname(host)
+            except OSError:
+                logging.warning(f"无法解析主机名: {host}")
+                results[host].sent = count
+
+        batch = _Batch(len(addrs) * count)
+        seqs = []
+        try:
+            for round_index in range(count):
+                if round_index and interval > 0:
+                    time.sleep(interval / 1000)
+                for host, addr in addrs.items():
+                    result = results[host]
+                    with self._lock:
+                        seq = self._next_seq()
+                        packet = self._build_packet(seq)
+                        pending = _Pending(addr, time.perf_counter(), result, batch)
+                        self._pending[seq] = pending
+                    seqs.append(seq)
+                    result.sent += 1
+                    try:
+                        self._sock.sendto(packet, (addr, 0))
+                    except OSError as e:
+                        logging.debug(f"发送ICMP请求到 {host} 失败: {str(e)}")
+                        with self._lock:
+                            if self._pending.pop(seq, None) is not None:
+                                batch.remaining -= 1
+
+            with self._lock:
+                if batch.remaining <= 0:
+                    batch.done.set()
+            batch.done.wait(timeout / 1000)
+        finally:
+            with self._lock:
+                for seq in seqs:
+                    pending = self._pending.get(seq)
+                    if pending is not None and pending.batch is batch:
+                        del self._pending[seq]
+
+        return results
+
+    def close(self):
+        """关闭套接字并停止接收线程"""
+        self._closed = True
+        with self._lock:
+            sock, self._sock = self._sock, None
+            self._pending.clear()
+        if sock is not None:
+            sock.close()
@@ -0,0 +1,176 @@
+"""
+进程监视
+
+维护增量的 pid -> 进程名 表：每次轮询只取得当前的pid集合与上一次比较，
+只为新出现的pid读取进程名，不再每次遍历所有进程的详细信息。
+启动器先fork再exec游戏时，刚出现的进程名可能还是父进程的，因此新进程在settle秒内每次轮询都重新读取名称。
+Linux下直接比较/proc中的目录，其他平台使用psutil.pids()快照比较。
+"""
+import logging
+import os
+import sys
+import threading
+import time
+from typing import Callable, Dict, Optional, Set, Tuple
+
+import psutil
+
+# 进程变化回调：(新启动的进程, 已退出的进程)，均为 pid -> 进程名
+ChangeCallback = Callable[[Dict[int, str], Dict[int, str]], None]
+
+
+class ProcessSource:
+    """进程列表来源基类"""
+    name = ""
+
+    def pids(self) -> Set[int]:
+        raise NotImplementedError
+
+    def process_name(self, pid: int) -> Optional[str]:
+        """进程名，进程已退出或无权访问时返回None"""
+        raise NotImplementedError
+
+
+class ProcSource(ProcessSource):
+    """Linux /proc 目录比较"""
+    name = "proc"
+
+    def __init__(self, root: str = "/proc"):
+        self.root = root
+
+    def pids(self) -> Set[int]:
+        return {int(entry) for entry in os.listdir(self.root) if entry.isdigit()}
+
+    def process_name(self, pid: int) -> Optional[str]:
+        try:
+            with open(os.path.join(self.root, str(pid), "comm"), 'r', encoding='utf-8',
+                      errors='replace') as f:
+                name = f.read().strip()
+            # comm最多15个字符，可能被截断时从命令行取完整的程序名（包括Wine下的exe）
+            if len(name) >= 15:
+                with open(os.path.join(self.root, str(pid), "cmdline"), 'rb') as f:
+                    argv0 = f.read().split(b'\0', 1)[0].decode('utf-8', errors='replace')
+                if argv0:
+                    name = os.path.basename(argv0.replace('\\', '/'))
+            return name
+        except OSError:
+            return None
+
+
+class PsutilSource(ProcessSource):
+    """psutil pid快照比较（Windows下为一次EnumProcesses调用）"""
+    name = "psutil"
+
+    def pids(self) -> Set[int]:
+        return set(psutil.pids())
+
+    def process_name(self, pid: int) -> Optional[str]:
+        try:
+            return psutil.Process(pid).name()
+        except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+            return None
+
+
+def default_process_source() -> ProcessSource:
+    if sys.platform.startswith('linux') and os.path.isdir("/proc"):
+        return ProcSource()
+    return PsutilSource()
+
+
+class ProcessWatcher:
+    """增量进程表
+
+    Args:
+        source: 进程列表来源，默认按平台选择
+        interval: 后台轮询间隔(秒)
+        settle: 新进程在该时间(秒)内重新读取名称，以发现exec后的真实程序名
+    """
+
+    def __init__(self, source: Optional[ProcessSource] = None, interval: float = 1.0,
+                 settle: float = 3.0):
+        self.source = source or default_process_source()
+        self.interval = interval
+        self.settle = settle
+        self.processes: Dict[int, str] = {}
+        self._young: Dict[int, float] = {}  # 新进程 pid -> 首次发现时间
+        self._primed = False  # 第一次轮询得到的是已有进程，不需要重新读取名称
+        self._unnamed: Set[int] = set()  # 读取进程名失败的pid，不再重复读取
+        self._listeners: list = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def subscribe(self, listener: ChangeCallback):
+        with self._lock:
+            self._listeners.append(listener)
+
+    def poll(self) -> Tuple[Dict[int, str], Dict[int, str]]:
+        """比较一次进程列表，返回 (新启动的进程, 已退出的进程) 并通知订阅者"""
+        try:
+            current = self.source.pids()
+        except Exception as e:
+            logging.error(f"获取进程列表失败: {str(e)}")
+            return {}, {}
+        now = time.monotonic()
+        with self._lock:
+            known = self.processes.keys() | self._unnamed
+            started = {}
+            exited = {pid: self.processes[pid] for pid in self.processes.keys() - current}
+            for pid, first_seen in list(self._young.items()):
+                if pid not in current or now - first_seen > self.settle:
+                    del self._young[pid]
+                elif pid in self.processes and pid not in exited:
+                    # exec后进程名改变，视为旧程序退出、新程序启动
+                    name = self.source.process_name(pid)
+                    if name is not None and name != self.processes[pid]:
+                        exited[pid] = self.processes[pid]
+                        started[pid] = name
+            for pid in current - known:
+                if self._primed:
+                    self._young[pid] = now
+                name = self.source.process_name(pid)
+                if name is None:
+                    self._unnamed.add(pid)
+                else:
+                    started[pid] = name
+            self._primed = True
+            for pid in exited:
+                del self.processes[pid]
+            self._unnamed &= current
+            self.processes.update(started)
+            listeners = list(self._listeners) if started or exited else []
+        for listener in listeners:
+            try:
+                listener(started, exited)
+            except Exception as e:
+                logging.error(f"处理进程变化失败: {str(e)}")
+        return started, exited
+
+    def find(self, names) -> Dict[int, str]:
+        """当前进程表中名称属于names的进程"""
+        with self._lock:
+            return {pid: name for pid, name in self.processes.items() if name in names}
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="process-watcher", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        with self._lock:
+            thread, self._thread = self._thread, None
+        self._stop.set()
+        if thread is not None:
+            thread.join()
+
+    def _run(self):
+        self.poll()
+        while not self._stop.wait(self.interval):
+            self.poll()
@@ -0,0 +1,133 @@
+"""
+重新优化控制
+
+监控发现延迟恶化时不再每次都直接提交优化任务，而是交给控制器决定：
+每个服务器同时最多一个优化任务；超过上阈值才触发、回落到下阈值以下才算恢复（滞回）；
+任务结束后进入冷却期，连续优化仍未恢复时冷却时间指数增长。
+"""
+import logging
+import threading
+import time
+from concurrent.futures import Executor, Future
+from typing import Callable, Dict, Optional
+
+# 优化函数：(服务器, 是否已被取代) -> 是否成功
+OptimizeFunc = Callable[[str, Callable[[], bool]], bool]
+
+
+class _ServerState:
+    __slots__ = ("future", "generation", "cooldown_until", "backoff", "degraded")
+
+    def __init__(self):
+        self.future: Optional[Future] = None
+        self.generation = 0
+        self.cooldown_until = 0.0
+        self.backoff = 0
+        self.degraded = False
+
+
+class ReoptimizeController:
+    """逐服务器的重新优化任务控制器
+
+    Args:
+        executor: 执行优化任务的线程池
+        optimize: 优化函数，第二个参数返回True时应尽快放弃且不再修改路由
+        trigger_ratio: 延迟超过原始延迟的该倍数时触发优化
+        clear_ratio: 延迟回落到原始延迟的该倍数以下时视为恢复，并重置退避
+        cooldown: 任务结束后的基础冷却时间(秒)
+        max_cooldown: 冷却时间上限(秒)
+    """
+
+    def __init__(self, executor: Executor, optimize: OptimizeFunc,
+                 trigger_ratio: float = 1.5, clear_ratio: float = 1.2,
+                 cooldown: float = 10.0, max_cooldown: float = 300.0):
+        self.executor = executor
+        self.optimize = optimize
+        self.trigger_ratio = trigger_ratio
+        self.clear_ratio = min(clear_ratio, trigger_ratio)
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self._servers: Dict[str, _ServerState] = {}
+        self._lock = threading.Lock()
+        self._counters = {"submitted": 0, "completed": 0, "merged": 0,
+                          "avoided": 0, "cancelled": 0}
+
+    def observe(self, server: str, latency: float, original_latency: float) -> bool:
+        """报告一次延迟测量，返回是否因此提交了新的优化任务"""
+        with self._lock:
+            state = self._servers.setdefault(server, _ServerState())
+            if latency < original_latency * self.clear_ratio:
+                if state.degraded:
+                    state.degraded = False
+                    state.backoff = 0
+                return False
+            if latency <= original_latency * self.trigger_ratio:
+                # 滞回区间：保持原状态
+                return False
+
+            state.degraded = True
+            if state.future is not None:
+                self._counters["merged"] += 1
+                return False
+            if time.monotonic() < state.cooldown_until:
+                self._counters["avoided"] += 1
+                return False
+
+            state.generation += 1
+            generation = state.generation
+            self._counters["submitted"] += 1
+            logging.info(f"服务器 {server} 延迟显著增加，"
+                         f"从 {original_latency:.0f}ms 到 {latency:.0f}ms，准备重新优化")
+            state.future = self.executor.submit(self._run, server, generation)
+            return True
+
+    def _superseded(self, server: str, generation: int) -> bool:
+        with self._lock:
+            state = self._servers.get(server)
+            return state is None or state.generation != generation
+
+    def _run(self, server: str, generation: int):
+        success = False
+        try:
+            success = self.optimize(server, lambda: self._superseded(server, generation))
+        except Exception as e:
+            logging.error(f"重新优化服务器 {server} 失败: {str(e)}")
+        finally:
+            with self._lock:
+                state = self._servers.get(server)
+                if state is not None and state.generation == generation:
+                    state.future = None
+                    # 连续优化仍未恢复时冷却时间翻倍
+                    delay = min(self.cooldown * (2 ** state.backoff), self.max_cooldown)
+                    state.cooldown_until = time.monotonic() + delay
+                    state.backoff += 1
+                    self._counters["completed"] += 1
+        return success
+
+    def cancel(self, server: str):
+        """取消服务器的优化任务（例如路由已被其他方式更换），未开始的任务不再执行"""
+        with self._lock:
+            state = self._servers.get(server)
+            if state is None:
+                return
+            if state.future is not None:
+                state.future.cancel()
+                state.future = None
+                self._counters["cancelled"] += 1
+            state.generation += 1
+
+    def clear(self):
+        """取消所有任务并清空状态"""
+        with self._lock:
+            for state in self._servers.values():
+                if state.future is not None:
+                    state.future.cancel()
+                    self._counters["cancelled"] += 1
+            self._servers.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            stats = dict(self._counters)
+            stats["in_flight"] = sum(1 for state in self._servers.values()
+                                     if state.future is not None)
+            return stats
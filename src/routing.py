@@ -0,0 +1,378 @@
+"""
+路由后端
+
+把一组路由变更作为一个事务应用：先记录变更前的路由表，批量执行所有变更，
+再用一次解析后的路由表快照校验结果，任一变更失败时把涉及的目标恢复到变更前的状态。
+"""
+import errno
+import ipaddress
+import logging
+import re
+import socket
+import struct
+import subprocess
+import sys
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+RouteKey = Tuple[str, int]
+
+
+class RouteError(Exception):
+    """路由变更失败"""
+
+
+class RouteChange:
+    """单条路由变更"""
+
+    ADD = "add"
+    DELETE = "delete"
+
+    __slots__ = ("action", "destination", "prefixlen", "gateway")
+
+    def __init__(self, action: str, destination: str, prefixlen: int = 32,
+                 gateway: Optional[str] = None):
+        self.action = action
+        self.destination = destination
+        self.prefixlen = prefixlen
+        self.gateway = gateway
+
+    @classmethod
+    def add(cls, destination: str, gateway: str, prefixlen: int = 32) -> "RouteChange":
+        return cls(cls.ADD, destination, prefixlen, gateway)
+
+    @classmethod
+    def delete(cls, destination: str, prefixlen: int = 32) -> "RouteChange":
+        return cls(cls.DELETE, destination, prefixlen)
+
+    @property
+    def key(self) -> RouteKey:
+        return self.destination, self.prefixlen
+
+    @property
+    def netmask(self) -> str:
+        return str(ipaddress.IPv4Network(f"0.0.0.0/{self.prefixlen}").netmask)
+
+    def __repr__(self):
+        target = f"{self.destination}/{self.prefixlen}"
+        if self.action == self.ADD:
+            return f"RouteChange(add {target} via {self.gateway})"
+        return f"RouteChange(delete {target})"
+
+
+class RouteBackend:
+    """路由后端基类
+
+    子类实现 snapshot() 和 _apply_batch()，事务、校验和回滚由基类完成。
+    """
+
+    name = ""
+
+    def snapshot(self) -> Dict[RouteKey, str]:
+        """读取当前路由表，返回 (目标, 前缀长度) 到网关的映射"""
+        raise NotImplementedError
+
+    def _apply_batch(self, changes: List[RouteChange]):
+        """执行一批变更，失败时抛出RouteError"""
+        raise NotImplementedError
+
+    def apply(self, changes: Iterable[RouteChange]) -> bool:
+        """以事务方式应用一组路由变更"""
+        changes = list(changes)
+        if not changes:
+            return True
+
+        before = self.snapshot()
+        # 只执行与当前路由表不一致的变更
+        changes = [change for change in changes if not self._verify(change, before)]
+        if not changes:
+            return True
+        try:
+            self._apply_batch(changes)
+            after = self.snapshot()
+            failed = [change for change in changes if not self._verify(change, after)]
+            if failed:
+                raise RouteError(f"路由校验失败: {failed}")
+            return True
+        except Exception as e:
+            logging.error(f"应用路由变更失败，正在回滚: {str(e)}")
+            self._rollback(before, {change.key for change in changes})
+            return False
+
+    @staticmethod
+    def _verify(change: RouteChange, table: Dict[RouteKey, str]) -> bool:
+        if change.action == RouteChange.ADD:
+            return table.get(change.key) == change.gateway
+        return change.key not in table
+
+    def _rollback(self, before: Dict[RouteKey, str], keys: set):
+        """把涉及的目标恢复到变更前的状态"""
+        try:
+            current = self.snapshot()
+            restore = []
+            for key in keys:
+                if key in before:
+                    if current.get(key) != before[key]:
+                        restore.append(RouteChange.add(key[0], before[key], key[1]))
+                elif key in current:
+                    restore.append(RouteChange.delete(key[0], key[1]))
+            if restore:
+                self._apply_batch(restore)
+        except Exception as e:
+            logging.error(f"路由回滚失败: {str(e)}")
+
+
+class MemoryRouteBackend(RouteBackend):
+    """内存中的路由表，用于离线测试
+
+    Args:
+        fail_on: 对这些目标的变更会失败
+    """
+
+    name = "memory"
+
+    def __init__(self, fail_on: Optional[Iterable[str]] = None):
+        self.table: Dict[RouteKey, str] = {}
+        self.fail_on = set(fail_on or [])
+        self.batches = 0
+        self._lock = threading.Lock()
+
+    def snapshot(self) -> Dict[RouteKey, str]:
+        with self._lock:
+            return dict(self.table)
+
+    def _apply_batch(self, changes: List[RouteChange]):
+        with self._lock:
+            self.batches += 1
+            for change in changes:
+                if change.destination in self.fail_on:
+                    raise RouteError(f"模拟失败: {change}")
+                if change.action == RouteChange.ADD:
+                    self.table[change.key] = change.gateway
+                else:
+                    self.table.pop(change.key, None)
+
+
+_IPV4 = re.compile(r'^\d{1,3}(\.\d{1,3}){3}$')
+
+
+class WindowsRouteBackend(RouteBackend):
+    """Windows路由后端
+
+    一批变更合并为一条命令行执行，校验只解析一次 route print 的输出。
+
+    Args:
+        persistent: 是否添加永久路由 (-p)
+    """
+
+    name = "windows"
+    MAX_COMMAND_LENGTH = 7000
+
+    def __init__(self, persistent: bool = True):
+        self.persistent = persistent
+
+    def snapshot(self) -> Dict[RouteKey, str]:
+        result = subprocess.run('route print -4', capture_output=True, text=True, shell=True)
+        if result.returncode != 0:
+            raise RouteError(f"读取路由表失败: {result.stderr}")
+        return self.parse_route_print(result.stdout)
+
+    @staticmethod
+    def parse_route_print(output: str) -> Dict[RouteKey, str]:
+        """解析 route print 输出中的活动路由和永久路由"""
+        table = {}
+        for line in output.splitlines():
+            fields = line.split()
+            if len(fields) < 3 or not (_IPV4.match(fields[0]) and _IPV4.match(fields[1])):
+                continue
+            if not _IPV4.match(fields[2]):
+                continue  # 在链路上的路由没有网关
+            try:
+                prefixlen = ipaddress.IPv4Network(f"0.0.0.0/{fields[1]}").prefixlen
+            except ValueError:
+                continue
+            table.setdefault((fields[0], prefixlen), fields[2])
+        return table
+
+    def _commands(self, change: RouteChange) -> List[str]:
+        delete = f'route delete {change.destination} mask {change.netmask}'
+        if change.action == RouteChange.DELETE:
+            return [delete]
+        # route add 不会覆盖已存在的路由，先删除
+        add = f'route add {change.destination} mask {change.netmask} {change.gateway}'
+        return [delete, add + (' -p' if self.persistent else '')]
+
+    def _apply_batch(self, changes: List[RouteChange]):
+        commands = [cmd for change in changes for cmd in self._commands(change)]
+        # 受命令行长度限制，分段执行
+        chunk: List[str] = []
+        length = 0
+        for cmd in commands + [None]:
+            if cmd is None or (chunk and length + len(cmd) > self.MAX_COMMAND_LENGTH):
+                if chunk:
+                    subprocess.run(' & '.join(chunk), capture_output=True, shell=True)
+                chunk, length = [], 0
+            if cmd is not None:
+                chunk.append(cmd)
+                length += len(cmd) + 3
+        # 单条命令的结果不可靠，统一由快照校验
+
+
+NETLINK_ROUTE = 0
+RTM_NEWROUTE = 24
+RTM_DELROUTE = 25
+RTM_GETROUTE = 26
+NLMSG_ERROR = 2
+NLMSG_DONE = 3
+NLM_F_REQUEST = 0x1
+NLM_F_ACK = 0x4
+NLM_F_REPLACE = 0x100
+NLM_F_CREATE = 0x400
+NLM_F_DUMP = 0x300
+RT_TABLE_MAIN = 254
+RTPROT_STATIC = 4
+RT_SCOPE_UNIVERSE = 0
+RTN_UNICAST = 1
+RTA_DST = 1
+RTA_GATEWAY = 5
+RTA_TABLE = 15
+
+_NLMSGHDR = struct.Struct('=IHHII')
+_RTMSG = struct.Struct('=BBBBBBBBI')
+_RTATTR = struct.Struct('=HH')
+
+
+def _align(length: int) -> int:
+    return (length + 3) & ~3
+
+
+def _rtattr(attr_type: int, data: bytes) -> bytes:
+    length = _RTATTR.size + len(data)
+    return _RTATTR.pack(length, attr_type) + data + b'\x00' * (_align(length) - length)
+
+
+class NetlinkRouteBackend(RouteBackend):
+    """Linux rtnetlink路由后端
+
+    一批变更的所有消息在一次sendto中提交给内核，逐条收取ACK。
+    """
+
+    name = "netlink"
+
+    def __init__(self):
+        self._seq = 0
+        self._lock = threading.Lock()
+
+    def _open(self) -> socket.socket:
+        sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, NETLINK_ROUTE)
+        sock.bind((0, 0))
+        return sock
+
+    def _next_seq(self) -> int:
+        self._seq = (self._seq + 1) & 0xFFFFFFFF
+        return self._seq
+
+    def _message(self, change: RouteChange, seq: int) -> bytes:
+        if change.action == RouteChange.ADD:
+            msg_type = RTM_NEWROUTE
+            flags = NLM_F_REQUEST | NLM_F_ACK | NLM_F_CREATE | NLM_F_REPLACE
+        else:
+            msg_type = RTM_DELROUTE
+            flags = NLM_F_REQUEST | NLM_F_ACK
+        body = _RTMSG.pack(socket.AF_INET, change.prefixlen, 0, 0, RT_TABLE_MAIN,
+                           RTPROT_STATIC, RT_SCOPE_UNIVERSE, RTN_UNICAST, 0)
+        body += _rtattr(RTA_DST, socket.inet_aton(change.destination))
+        if change.action == RouteChange.ADD:
+            body += _rtattr(RTA_GATEWAY, socket.inet_aton(change.gateway))
+        return _NLMSGHDR.pack(_NLMSGHDR.size + len(body), msg_type, flags, seq, 0) + body
+
+    @staticmethod
+    def _iter_messages(data: bytes):
+        offset = 0
+        while offset + _NLMSGHDR.size <= len(data):
+            length, msg_type, flags, seq, pid = _NLMSGHDR.unpack_from(data, offset)
+            if length < _NLMSGHDR.size:
+                break
+            yield msg_type, seq, data[offset + _NLMSGHDR.size:offset + length]
+            offset += _align(length)
+
+    def _apply_batch(self, changes: List[RouteChange]):
+        with self._lock:
+            sock = self._open()
+            try:
+                pending = {}
+                payload = b''
+                for change in changes:
+                    seq = self._next_seq()
+                    pending[seq] = change
+                    payload += self._message(change, seq)
+                sock.sendto(payload, (0, 0))
+
+                errors = []
+                while pending:
+                    data = sock.recv(65536)
+                    for msg_type, seq, body in self._iter_messages(data):
+                        if msg_type != NLMSG_ERROR or seq not in pending:
+                            continue
+                        change = pending.pop(seq)
+                        error = -struct.unpack_from('=i', body)[0]
+                        # 删除不存在的路由视为成功
+                        if error and not (change.action == RouteChange.DELETE and error == errno.ESRCH):
+                            errors.append(f"{change}: {errno.errorcode.get(error, error)}")
+                if errors:
+                    raise RouteError("; ".join(errors))
+            finally:
+                sock.close()
+
+    def snapshot(self) -> Dict[RouteKey, str]:
+        with self._lock:
+            sock = self._open()
+            try:
+                seq = self._next_seq()
+                body = _RTMSG.pack(socket.AF_INET, 0, 0, 0, 0, 0, 0, 0, 0)
+                sock.sendto(_NLMSGHDR.pack(_NLMSGHDR.size + len(body), RTM_GETROUTE,
+                                           NLM_F_REQUEST | NLM_F_DUMP, seq, 0) + body, (0, 0))
+                table = {}
+                while True:
+                    data = sock.recv(65536)
+                    for msg_type, msg_seq, body in self._iter_messages(data):
+                        if msg_seq != seq:
+                            continue
+                        if msg_type == NLMSG_DONE:
+                            return table
+                        if msg_type == NLMSG_ERROR:
+                            raise RouteError("读取路由表失败")
+                        if msg_type == RTM_NEWROUTE:
+                            self._parse_route(body, table)
+            finally:
+                sock.close()
+
+    @staticmethod
+    def _parse_route(body: bytes, table: Dict[RouteKey, str]):
+        family, dst_len, _, _, rt_table, _, _, _, _ = _RTMSG.unpack_from(body)
+        if family != socket.AF_INET:
+            return
+        attrs = {}
+        offset = _RTMSG.size
+        while offset + _RTATTR.size <= len(body):
+            length, attr_type = _RTATTR.unpack_from(body, offset)
+            if length < _RTATTR.size:
+                break
+            attrs[attr_type] = body[offset + _RTATTR.size:offset + length]
+            offset += _align(length)
+        if RTA_TABLE in attrs:
+            rt_table = struct.unpack('=I', attrs[RTA_TABLE])[0]
+        if rt_table != RT_TABLE_MAIN or RTA_GATEWAY not in attrs:
+            return
+        destination = socket.inet_ntoa(attrs[RTA_DST]) if RTA_DST in attrs else '0.0.0.0'
+        table[(destination, dst_len)] = socket.inet_ntoa(attrs[RTA_GATEWAY])
+
+
+def default_route_backend() -> RouteBackend:
+    """按平台选择路由后端"""
+    if sys.platform == 'win32':
+        return WindowsRouteBackend()
+    if sys.platform.startswith('linux'):
+        return NetlinkRouteBackend()
+    logging.warning(f"平台 {sys.platform} 不支持修改路由，使用内存路由表")
+    return MemoryRouteBackend()
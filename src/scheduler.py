@@ -0,0 +1,287 @@
+"""
+自适应探测调度
+
+每个监控目标有独立的下次探测时间，统一放在最小堆中由一个调度线程按时分发。
+延迟稳定的目标逐步拉长探测间隔，波动大的目标缩短间隔，连续失败的目标指数退避；
+所有探测受每秒探测次数上限约束，并分批交给少量工作线程并发执行。
+"""
+import heapq
+import itertools
+import logging
+import math
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+from .prober import ProbeResult
+
+ProbeFunc = Callable[[List[str]], Dict[str, ProbeResult]]
+ResultFunc = Callable[[Dict[str, ProbeResult]], None]
+
+
+class _Target:
+    """单个监控目标的调度状态（延迟的指数加权均值和方差）"""
+
+    __slots__ = ("interval", "mean", "var", "samples", "failures", "in_flight", "generation")
+
+    def __init__(self, interval: float, generation: int):
+        self.interval = interval
+        self.mean = 0.0
+        self.var = 0.0
+        self.samples = 0
+        self.failures = 0
+        self.in_flight = False
+        self.generation = generation
+
+    def add(self, value: float, alpha: float):
+        if self.samples == 0:
+            self.mean = value
+        else:
+            delta = value - self.mean
+            self.mean += alpha * delta
+            self.var = (1 - alpha) * (self.var + alpha * delta * delta)
+        self.samples += 1
+
+    @property
+    def cv(self) -> float:
+        """变异系数（标准差/均值）"""
+        if self.mean <= 0:
+            return 0.0
+        return math.sqrt(self.var) / self.mean
+
+
+class ProbeScheduler:
+    """基于最小堆的自适应探测调度器
+
+    Args:
+        probe: 对一批目标各探测一次的函数
+        on_results: 每批探测完成后的回调，在工作线程中调用
+        min_interval: 最短探测间隔(秒)，新目标和波动大的目标使用该间隔
+        max_interval: 稳定目标的最长探测间隔(秒)
+        max_backoff: 连续失败目标的最长退避间隔(秒)
+        jitter: 间隔的随机抖动比例，避免探测集中在同一时刻
+        rate: 每秒最多探测的目标数
+        max_batch: 每批最多探测的目标数
+        workers: 并发执行探测批次的线程数
+        stable_cv: 变异系数低于该值时拉长间隔
+        volatile_cv: 变异系数高于该值时恢复最短间隔
+        alpha: 延迟均值/方差的平滑系数
+    """
+
+    def __init__(self, probe: ProbeFunc, on_results: ResultFunc,
+                 min_interval: float = 1.0, max_interval: float = 10.0,
+                 max_backoff: float = 60.0, jitter: float = 0.2, rate: float = 50.0,
+                 max_batch: int = 64, workers: int = 4, stable_cv: float = 0.1,
+                 volatile_cv: float = 0.3, alpha: float = 0.3):
+        self.probe = probe
+        self.on_results = on_results
+        self.min_interval = min_interval
+        self.max_interval = max(max_interval, min_interval)
+        self.max_backoff = max(max_backoff, min_interval)
+        self.jitter = jitter
+        self.rate = rate
+        self.max_batch = max_batch
+        self.workers = workers
+        self.stable_cv = stable_cv
+        self.volatile_cv = volatile_cv
+        self.alpha = alpha
+
+        self._targets: Dict[str, _Target] = {}
+        self._heap: list = []  # (到期时间, 序号, 目标, 代数)
+        self._seq = itertools.count()
+        self._generation = itertools.count()
+        self._cond = threading.Condition()
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._slots = threading.Semaphore(workers)
+        self._tokens = float(max_batch)
+        self._refilled = time.monotonic()
+        self._probes = 0
+        self._deferred = 0
+
+    # 目标管理
+
+    def _push(self, target: str, state: _Target, delay: float):
+        if self.jitter > 0:
+            delay *= random.uniform(1 - self.jitter, 1 + self.jitter)
+        heapq.heappush(self._heap, (time.monotonic() + delay, next(self._seq),
+                                    target, state.generation))
+
+    def add(self, target: str, delay: float = 0.0):
+        """加入监控目标，已存在时保持原有调度"""
+        with self._cond:
+            if target in self._targets:
+                return
+            state = _Target(self.min_interval, next(self._generation))
+            self._targets[target] = state
+            self._push(target, state, delay)
+            self._cond.notify()
+
+    def remove(self, target: str):
+        """移除监控目标，堆中的旧条目在出堆时丢弃"""
+        with self._cond:
+            self._targets.pop(target, None)
+
+    def clear(self):
+        with self._cond:
+            self._targets.clear()
+            self._heap.clear()
+
+    def targets(self) -> List[str]:
+        with self._cond:
+            return list(self._targets)
+
+    def interval(self, target: str) -> Optional[float]:
+        """目标当前的探测间隔"""
+        with self._cond:
+            state = self._targets.get(target)
+            return state.interval if state else None
+
+    def stats(self) -> Dict:
+        with self._cond:
+            intervals = [state.interval for state in self._targets.values()]
+            return {
+                "targets": len(intervals),
+                "in_flight": sum(1 for state in self._targets.values() if state.in_flight),
+                "probes": self._probes,
+                "deferred": self._deferred,
+                "mean_interval": sum(intervals) / len(intervals) if intervals else 0.0
+            }
+
+    # 调度线程
+
+    def start(self):
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+            # 上次停止时仍在探测的目标重新排期
+            for target, state in self._targets.items():
+                if state.in_flight:
+                    state.in_flight = False
+                    state.generation = next(self._generation)
+                    self._push(target, state, 0.0)
+            self._pool = ThreadPoolExecutor(max_workers=self.workers)
+            self._thread = threading.Thread(target=self._run, name="probe-scheduler",
+                                            daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """停止调度，正在进行的探测完成后其结果被丢弃"""
+        with self._cond:
+            if not self._running:
+                return
+            self._running = False
+            self._cond.notify()
+            thread, pool = self._thread, self._pool
+            self._thread = self._pool = None
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+        if pool is not None:
+            pool.shutdown(wait=False)
+
+    def _refill(self, now: float):
+        self._tokens = min(float(self.max_batch),
+                           self._tokens + (now - self._refilled) * self.rate)
+        self._refilled = now
+
+    def _collect(self, now: float) -> List[str]:
+        """取出已到期且在探测预算内的目标（调用方持有self._cond）"""
+        batch = []
+        while self._heap and len(batch) < self.max_batch:
+            due, _, target, generation = self._heap[0]
+            state = self._targets.get(target)
+            if state is None or state.generation != generation or state.in_flight:
+                heapq.heappop(self._heap)
+                continue
+            if due > now:
+                break
+            if self._tokens < 1:
+                self._deferred += 1
+                break
+            heapq.heappop(self._heap)
+            self._tokens -= 1
+            state.in_flight = True
+            batch.append(target)
+        return batch
+
+    def _next_wait(self, now: float) -> Optional[float]:
+        if not self._heap:
+            return None
+        wait = self._heap[0][0] - now
+        if self._tokens < 1 and self.rate > 0:
+            wait = max(wait, (1 - self._tokens) / self.rate)
+        return max(wait, 0.0)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._running:
+                    return
+                now = time.monotonic()
+                self._refill(now)
+                batch = self._collect(now)
+                if not batch:
+                    self._cond.wait(self._next_wait(now))
+                    continue
+                pool = self._pool
+
+            # 工作线程都在忙时等待，探测中的目标不会重复出堆
+            self._slots.acquire()
+            try:
+                pool.submit(self._dispatch, batch)
+            except RuntimeError:
+                self._slots.release()
+                return
+
+    def _dispatch(self, batch: List[str]):
+        try:
+            try:
+                results = self.probe(batch)
+            except Exception as e:
+                logging.error(f"调度探测失败: {str(e)}")
+                results = {target: ProbeResult(target) for target in batch}
+
+            with self._cond:
+                if not self._running:
+                    return
+                self._probes += len(batch)
+                reported = {}
+                for target in batch:
+                    state = self._targets.get(target)
+                    if state is None:
+                        continue
+                    result = results.get(target) or ProbeResult(target)
+                    state.in_flight = False
+                    self._reschedule(target, state, result)
+                    reported[target] = result
+                self._cond.notify()
+
+            if reported:
+                self.on_results(reported)
+        except Exception as e:
+            logging.error(f"处理探测结果失败: {str(e)}")
+        finally:
+            self._slots.release()
+
+    def _reschedule(self, target: str, state: _Target, result: ProbeResult):
+        """根据本次结果调整目标的探测间隔（调用方持有self._cond）"""
+        if result.received == 0:
+            state.failures += 1
+            state.interval = min(self.min_interval * (2 ** state.failures), self.max_backoff)
+        else:
+            if state.failures:
+                # 从失败中恢复，重新开始积累统计
+                state.failures = 0
+                state.samples = 0
+                state.interval = self.min_interval
+            state.add(result.avg, self.alpha)
+            cv = state.cv
+            if state.samples >= 3 and cv < self.stable_cv:
+                state.interval = min(state.interval * 1.5, self.max_interval)
+            elif cv > self.volatile_cv:
+                state.interval = self.min_interval
+        self._push(target, state, state.interval)
@@ -0,0 +1,104 @@
+"""
+自适应节点筛选
+
+先以极低代价对所有候选节点各采样一次，之后每轮淘汰置信区间明显劣于当前前K名的节点，
+只对仍有竞争力的节点继续采样，直到探测预算用完或结果已足够确定。
+"""
+import logging
+import math
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .prober import ProbeResult
+
+ProbeFunc = Callable[[List[str]], Dict[str, ProbeResult]]
+
+
+def _prior_value(prior: Tuple[float, float], penalty: float) -> float:
+    """历史 (平均延迟, 丢包率) 折算的单样本期望值，丢包按penalty计入"""
+    mean, loss = prior
+    if not math.isfinite(mean):
+        return penalty
+    return (1 - loss) * mean + loss * penalty
+
+
+def _bounds(result: ProbeResult, z: float, min_spread: float, penalty: float,
+            prior: Optional[Tuple[float, float]] = None, prior_weight: float = 0.0):
+    """返回 (下界, 均值, 上界)，丢失的样本按penalty计入，历史统计按prior_weight个样本计入"""
+    samples = result.rtts + [penalty] * (result.sent - result.received)
+    n = len(samples)
+    weight = prior_weight if prior is not None else 0.0
+    if n + weight <= 0:
+        return 0.0, penalty, penalty
+    total = sum(samples) + (weight * _prior_value(prior, penalty) if weight else 0.0)
+    mean = total / (n + weight)
+    if n > 1:
+        std = math.sqrt(sum((x - mean) ** 2 for x in samples) / (n - 1))
+    else:
+        std = 0.0
+    half_width = z * max(std, min_spread) / math.sqrt(n + weight)
+    return mean - half_width, mean, mean + half_width
+
+
+def adaptive_select(probe: ProbeFunc, candidates: List[str], k: int = 5,
+                    budget: int = 0, max_samples: int = 4, min_samples: int = 2,
+                    cutoff: float = 100.0, z: float = 2.0, min_spread: float = 5.0,
+                    penalty: float = 999.0,
+                    priors: Optional[Dict[str, Tuple[float, float]]] = None,
+                    prior_weight: float = 0.0) -> Dict[str, ProbeResult]:
+    """逐轮淘汰的候选节点采样
+
+    Args:
+        probe: 对一批目标各采样一次的函数
+        candidates: 候选节点IP列表
+        k: 需要保留的最佳节点数
+        budget: 总探测次数上限，0表示为每个候选预留 max_samples 次
+        max_samples: 每个节点的最大采样次数
+        min_samples: 进入前K名的节点至少需要的采样次数
+        cutoff: 延迟下界超过该值的节点直接淘汰（与评分中的高延迟阈值一致）
+        z: 置信区间宽度（标准差倍数）
+        min_spread: 标准差下限(ms)，避免样本过少时区间过窄
+        penalty: 丢包样本按该延迟计入
+        priors: 节点历史的 (平均延迟, 丢包率)，计入淘汰时的置信区间
+        prior_weight: 每个节点的历史统计相当于的样本数
+
+    Returns:
+        每个候选节点累计的探测结果，被淘汰节点保留其已有样本
+    """
+    results = {ip: ProbeResult(ip) for ip in candidates}
+    if not candidates:
+        return results
+    if budget <= 0:
+        budget = len(candidates) * max_samples
+
+    priors = priors or {}
+    alive = list(candidates)
+    spent = 0
+    rounds = 0
+    while alive and spent < budget:
+        to_probe = [ip for ip in alive if results[ip].sent < max_samples]
+        to_probe = to_probe[:budget - spent]
+        if not to_probe:
+            break
+
+        for ip, result in probe(to_probe).items():
+            merged = results[ip]
+            merged.sent += result.sent
+            merged.rtts.extend(result.rtts)
+        spent += len(to_probe)
+        rounds += 1
+
+        bounds = {ip: _bounds(results[ip], z, min_spread, penalty, priors.get(ip), prior_weight)
+                  for ip in alive}
+        # 当前第K名的上界：下界比它还差的节点不可能进入前K名
+        uppers = sorted(upper for _, _, upper in bounds.values())
+        kth_upper = uppers[min(k, len(uppers)) - 1]
+        alive = [ip for ip in alive
+                 if bounds[ip][0] <= kth_upper and bounds[ip][0] < cutoff]
+
+        # 剩余节点都已足够确定时提前结束
+        if len(alive) <= k and all(results[ip].sent >= min_samples for ip in alive):
+            break
+
+    logging.info(f"自适应筛选完成: {rounds} 轮, 共探测 {spent} 次, "
+                 f"剩余 {len(alive)}/{len(candidates)} 个候选节点")
+    return results
@@ -0,0 +1,203 @@
+"""
+路由延迟时间序列
+
+每条路由一个固定容量的环形缓冲区（时间戳、float32延迟、丢包标记），写入时增量维护
+窗口内的和、指数加权均值、抖动和对数分桶直方图，因此均值、EWMA、抖动为O(1)，
+分位数只需扫描固定数量的桶。
+"""
+import math
+import threading
+import time
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+
+from .prober import ProbeResult
+
+# 直方图分桶：1ms到5000ms之间按对数等分，最后一个桶收纳更大的值
+HISTOGRAM_MIN = 1.0
+HISTOGRAM_MAX = 5000.0
+HISTOGRAM_BINS = 128
+_LOG_MIN = math.log(HISTOGRAM_MIN)
+_LOG_STEP = (math.log(HISTOGRAM_MAX) - _LOG_MIN) / (HISTOGRAM_BINS - 1)
+# 各桶的几何中点，分位数落在桶内时以此作为估计值
+_BIN_CENTERS = np.exp(_LOG_MIN + (np.arange(HISTOGRAM_BINS) + 0.5) * _LOG_STEP).astype(np.float32)
+_BIN_CENTERS[0] = HISTOGRAM_MIN
+_LOST = 255  # 丢包样本的桶编号
+
+
+def _bin(rtt: float) -> int:
+    if rtt <= HISTOGRAM_MIN:
+        return 0
+    return min(int((math.log(rtt) - _LOG_MIN) / _LOG_STEP), HISTOGRAM_BINS - 1)
+
+
+class LatencySeries:
+    """单条路由的延迟环形缓冲区
+
+    Args:
+        capacity: 保留的最近样本数
+        alpha: EWMA平滑系数
+    """
+
+    def __init__(self, capacity: int = 600, alpha: float = 0.2):
+        self.capacity = capacity
+        self.alpha = alpha
+        self.times = np.zeros(capacity, dtype=np.float64)
+        self.rtts = np.zeros(capacity, dtype=np.float32)
+        self.lost = np.zeros(capacity, dtype=bool)
+        self._bins = np.zeros(capacity, dtype=np.uint8)
+        self._histogram = np.zeros(HISTOGRAM_BINS, dtype=np.int32)
+        self._head = 0  # 下一个写入位置
+        self._count = 0
+        self._received = 0
+        self._sum = 0.0
+        self._ewma: Optional[float] = None
+        self._jitter = 0.0
+        self._last: Optional[float] = None
+
+    def __len__(self) -> int:
+        return self._count
+
+    def add(self, rtt: Optional[float], timestamp: Optional[float] = None):
+        """写入一个样本，rtt为None表示丢包"""
+        i = self._head
+        if self._count == self.capacity:
+            # 覆盖最旧的样本，先从窗口统计中减去
+            if not self.lost[i]:
+                self._received -= 1
+                self._sum -= float(self.rtts[i])
+                self._histogram[self._bins[i]] -= 1
+        else:
+            self._count += 1
+
+        self.times[i] = time.time() if timestamp is None else timestamp
+        if rtt is None:
+            self.rtts[i] = np.nan
+            self.lost[i] = True
+            self._bins[i] = _LOST
+        else:
+            self.rtts[i] = rtt
+            self.lost[i] = False
+            b = _bin(rtt)
+            self._bins[i] = b
+            self._histogram[b] += 1
+            self._received += 1
+            self._sum += float(self.rtts[i])
+            self._ewma = rtt if self._ewma is None else self._ewma + self.alpha * (rtt - self._ewma)
+            if self._last is not None:
+                # RFC 3550 的到达间隔抖动估计
+                self._jitter += (abs(rtt - self._last) - self._jitter) / 16
+            self._last = rtt
+        self._head = (i + 1) % self.capacity
+
+    def add_result(self, result: ProbeResult, timestamp: Optional[float] = None):
+        """写入一次探测的所有样本（未收到回复的计为丢包）"""
+        for rtt in result.rtts:
+            self.add(rtt, timestamp)
+        for _ in range(result.sent - result.received):
+            self.add(None, timestamp)
+
+    @property
+    def mean(self) -> Optional[float]:
+        """窗口内的平均延迟"""
+        if self._received == 0:
+            return None
+        return self._sum / self._received
+
+    @property
+    def ewma(self) -> Optional[float]:
+        return self._ewma
+
+    @property
+    def jitter(self) -> float:
+        return self._jitter
+
+    @property
+    def loss(self) -> float:
+        """窗口内的丢包率"""
+        if self._count == 0:
+            return 0.0
+        return 1.0 - self._received / self._count
+
+    def percentile(self, q: float) -> Optional[float]:
+        """窗口内延迟的近似分位数（误差不超过一个对数桶宽度，约7%）"""
+        return self.percentiles((q,))[q]
+
+    def percentiles(self, qs: Iterable[float]) -> Dict[float, Optional[float]]:
+        """一次计算多个分位数"""
+        qs = list(qs)
+        if self._received == 0:
+            return {q: None for q in qs}
+        cumulative = np.cumsum(self._histogram)
+        ranks = np.maximum(np.asarray(qs, dtype=np.float64) / 100.0 * self._received, 1)
+        indexes = np.minimum(np.searchsorted(cumulative, ranks, side='left'), HISTOGRAM_BINS - 1)
+        return {q: float(_BIN_CENTERS[i]) for q, i in zip(qs, indexes)}
+
+    def recent(self, seconds: float) -> np.ndarray:
+        """最近seconds秒内的延迟样本（丢包为NaN），按时间先后排列"""
+        order = np.roll(np.arange(self.capacity), -self._head)[self.capacity - self._count:]
+        times = self.times[order]
+        return self.rtts[order][times >= time.time() - seconds]
+
+    def summary(self) -> Dict[str, Optional[float]]:
+        p = self.percentiles((50, 95, 99))
+        return {
+            "samples": self._count,
+            "last": self._last,
+            "mean": self.mean,
+            "ewma": self._ewma,
+            "jitter": self._jitter,
+            "loss": self.loss,
+            "p50": p[50],
+            "p95": p[95],
+            "p99": p[99]
+        }
+
+
+class SeriesStore:
+    """以路由为键的时间序列集合
+
+    Args:
+        capacity: 每条路由保留的样本数
+    """
+
+    def __init__(self, capacity: int = 600):
+        self.capacity = capacity
+        self._series: Dict[str, LatencySeries] = {}
+        self._lock = threading.Lock()
+
+    def record(self, key: str, result: ProbeResult, timestamp: Optional[float] = None):
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = LatencySeries(self.capacity)
+            series.add_result(result, timestamp)
+
+    def summary(self, key: str) -> Optional[Dict[str, Optional[float]]]:
+        with self._lock:
+            series = self._series.get(key)
+            return series.summary() if series is not None else None
+
+    def ewma(self, key: str) -> Optional[float]:
+        with self._lock:
+            series = self._series.get(key)
+            return series.ewma if series is not None else None
+
+    def loss(self, key: str) -> float:
+        """窗口内的丢包率，没有记录时为0"""
+        with self._lock:
+            series = self._series.get(key)
+            return series.loss if series is not None else 0.0
+
+    def summaries(self) -> Dict[str, Dict[str, Optional[float]]]:
+        with self._lock:
+            return {key: series.summary() for key, series in self._series.items()}
+
+    def remove(self, key: str):
+        with self._lock:
+            self._series.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
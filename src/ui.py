@@ -5,6 +5,7 @@ import logging
 import ctypes
 from typing import Optional, Dict
 from src.core import AcceleratorCore
+from src.events import apply_route_events
 
 def is_admin():
     """检查是否具有管理员权限"""
@@ -30,6 +31,9 @@ class MainWindow:
         
         # 状态变量
         self.status_timer: Optional[str] = None
+        # 订阅核心的状态事件，route_view为据此维护的各服务器状态
+        self.subscription = self.core.events.subscribe()
+        self.route_view: Dict[str, Dict] = {}
         self.last_status: Dict = {}
         self.is_testing = False
         
@@ -179,14 +183,22 @@ class MainWindow:
             return
             
         try:
-            status = self.core.get_status()
+            events = self.subscription.poll()
+            if self.subscription.take_dropped():
+                # 订阅缓冲区溢出，从状态快照重新同步
+                self.route_view = {server: dict(route) for server, route
+                                   in self.core.get_status()["routes"].items()}
+            elif not apply_route_events(self.route_view, events):
+                # 没有新事件，不必重绘
+                self.status_timer = self.root.after(1000, self._update_status)
+                return
             self.status_text.delete(1.0, tk.END)
             
-            if status["routes"]:
+            if self.route_view:
                 total_improvement = 0
                 route_count = 0
                 
-                for server, route in status["routes"].items():
+                for server, route in self.route_view.items():
                     if "original_latency" in route and "current_latency" in route:
                         original = route["original_latency"]
                         current = route["current_latency"]
@@ -1,57 +1,18 @@
-import socket
-import time
 import statistics
-from concurrent.futures import ThreadPoolExecutor
+from src.core import TcpBackend
 
 def test_tcp_latency(host, port=80, count=4, timeout=2):
     """使用TCP连接测试延迟"""
-    latencies = []
-    
-    try:
-        # 首先解析域名
-        try:
-            ip = socket.gethostbyname(host)
-        except socket.gaierror:
-            print(f"无法解析主机名: {host}")
-            return 999.0
-            
-        # 测试多次连接延迟
-        for _ in range(count):
-            try:
-                start_time = time.time()
-                sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                sock.settimeout(timeout)
-                
-                # 尝试连接
-                result = sock.connect_ex((ip, port))
-                end_time = time.time()
-                
-                if result == 0:
-                    latency = (end_time - start_time) * 1000  # 转换为毫秒
-                    latencies.append(latency)
-                
-                sock.close()
-                
-            except (socket.timeout, socket.error) as e:
-                print(f"连接 {host} 失败: {str(e)}")
-                continue
-                
-            time.sleep(0.2)  # 短暂延迟避免过快发送请求
-            
-        # 计算平均延迟
-        if latencies:
-            # 移除最高和最低值，计算平均值
-            if len(latencies) > 2:
-                latencies.remove(max(latencies))
-                latencies.remove(min(latencies))
-            return statistics.mean(latencies)
-            
-        return 999.0
-        
-    except Exception as e:
-        print(f"测试延迟失败: {str(e)}")
+    result = TcpBackend(port).probe([host], count=count, timeout=timeout * 1000)[host]
+    latencies = sorted(result.rtts)
+    if not latencies:
         return 999.0
 
+    # 移除最高和最低值，计算平均值
+    if len(latencies) > 2:
+        latencies = latencies[1:-1]
+    return statistics.mean(latencies)
+
 def main():
     # 游戏服务器列表（使用实际可访问的服务器）
     game_servers = {
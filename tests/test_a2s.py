@@ -0,0 +1,130 @@
+import json
+import socket
+import threading
+import time
+
+import pytest
+
+from src.config import ConfigManager
+from src.core import (A2S_CHALLENGE_RESPONSE, A2S_HEADER, A2S_INFO_REQUEST, A2S_INFO_RESPONSE,
+                      A2sBackend, AcceleratorCore, FakeBackend)
+from src.routing import MemoryRouteBackend
+
+CHALLENGE = b'\x11\x22\x33\x44'
+
+
+class A2sStub:
+    """回环地址上的A2S服务器：未附带挑战值的查询返回挑战，附带正确挑战值时返回服务器信息"""
+
+    def __init__(self, silent: bool = False):
+        self.silent = silent
+        self.requests = []
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(('127.0.0.1', 0))
+        self.sock.settimeout(0.05)
+        self.port = self.sock.getsockname()[1]
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                packet, address = self.sock.recvfrom(4096)
+            except socket.timeout:
+                continue
+            self.requests.append(packet)
+            if self.silent:
+                continue
+            if packet == A2S_INFO_REQUEST + CHALLENGE:
+                reply = A2S_HEADER + bytes([A2S_INFO_RESPONSE]) + b'\x11stub\x00'
+            else:
+                reply = A2S_HEADER + bytes([A2S_CHALLENGE_RESPONSE]) + CHALLENGE
+            self.sock.sendto(reply, address)
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+        self.sock.close()
+
+
+@pytest.fixture
+def stub():
+    server = A2sStub()
+    yield server
+    server.close()
+
+
+@pytest.fixture
+def silent_stub():
+    server = A2sStub(silent=True)
+    yield server
+    server.close()
+
+
+def test_challenge_round_trip(stub):
+    backend = A2sBackend()
+    result = backend.probe(['127.0.0.1'], count=3, timeout=500, port=stub.port)['127.0.0.1']
+
+    assert result.sent == 3
+    assert result.received == 3
+    assert stub.requests[0] == A2S_INFO_REQUEST
+    assert stub.requests[1:] == [A2S_INFO_REQUEST + CHALLENGE] * 2
+    assert backend._challenges[('127.0.0.1', stub.port)] == CHALLENGE
+
+
+def test_silent_server_stops_after_first_timeout(silent_stub):
+    backend = A2sBackend()
+    started = time.perf_counter()
+    result = backend.probe(['127.0.0.1'], count=4, timeout=200,
+                           port=silent_stub.port)['127.0.0.1']
+    elapsed = time.perf_counter() - started
+
+    assert result.received == 0
+    assert result.sent == 1
+    assert len(silent_stub.requests) == 1
+    assert elapsed < 0.4
+
+
+def test_silent_server_is_skipped_until_ttl_expires(silent_stub):
+    backend = A2sBackend(silent_ttl=0.3)
+    backend.probe(['127.0.0.1'], count=2, timeout=100, port=silent_stub.port)
+
+    started = time.perf_counter()
+    result = backend.probe(['127.0.0.1'], count=2, timeout=100,
+                           port=silent_stub.port)['127.0.0.1']
+    assert time.perf_counter() - started < 0.05
+    assert result.sent == 0
+    assert len(silent_stub.requests) == 1
+
+    time.sleep(0.3)
+    backend.probe(['127.0.0.1'], count=2, timeout=100, port=silent_stub.port)
+    assert len(silent_stub.requests) == 2
+
+
+def test_silent_server_falls_back_to_icmp(silent_stub, tmp_path):
+    config_path = tmp_path / "config.json"
+    config_path.write_text(json.dumps({
+        "settings": {"route_journal": str(tmp_path / "routes.journal"),
+                     "measurement_db": str(tmp_path / "measurements.db")},
+        "probe": {"default": {"method": "a2s", "port": silent_stub.port, "fallback": "icmp"}},
+    }), encoding='utf-8')
+    manager = ConfigManager(str(config_path))
+    core = AcceleratorCore(route_backend=MemoryRouteBackend(), config_manager=manager)
+    icmp = FakeBackend({'127.0.0.1': 12.0})
+    core.backends["icmp"] = icmp
+    try:
+        result = core.probe_latency(['127.0.0.1'], count=4, timeout=200, use_cache=False)
+        # 之后的探测不再等待A2S超时，直接使用备用方式
+        started = time.perf_counter()
+        again = core.probe_latency(['127.0.0.1'], count=4, timeout=200, use_cache=False)
+        elapsed = time.perf_counter() - started
+    finally:
+        manager.stop_watching()
+        core.history.close()
+
+    assert result['127.0.0.1'].avg == 12.0
+    assert again['127.0.0.1'].avg == 12.0
+    assert elapsed < 0.1
+    assert icmp.calls == 2
+    assert len(silent_stub.requests) == 1
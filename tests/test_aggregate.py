@@ -0,0 +1,59 @@
+import ipaddress
+
+import pytest
+
+from src.aggregate import aggregate_prefixes
+
+BLOCK = [f"10.0.0.{i}" for i in range(170, 176)]
+
+
+def covered(prefixes):
+    return {str(address) for network, prefixlen, _ in prefixes
+            for address in ipaddress.IPv4Network(f"{network}/{prefixlen}")}
+
+
+def test_single_addresses_stay_host_routes():
+    assert aggregate_prefixes(["10.0.0.1", "10.0.0.9"]) == [
+        ("10.0.0.1", 32, ["10.0.0.1"]), ("10.0.0.9", 32, ["10.0.0.9"])]
+
+
+def test_exact_blocks_need_no_extra_addresses():
+    assert aggregate_prefixes(["10.0.0.2", "10.0.0.3"]) == [
+        ("10.0.0.2", 31, ["10.0.0.2", "10.0.0.3"])]
+
+
+def test_max_extra_boundary():
+    servers = ["10.0.0.1", "10.0.0.2", "10.0.0.3"]
+    # /30 多覆盖一个网络地址：上限为0时不合并，为1时合并
+    assert aggregate_prefixes(servers, 0) == [
+        ("10.0.0.1", 32, ["10.0.0.1"]), ("10.0.0.2", 31, ["10.0.0.2", "10.0.0.3"])]
+    assert aggregate_prefixes(servers, 1) == [("10.0.0.0", 30, servers)]
+
+
+@pytest.mark.parametrize("max_extra, expected", [
+    (0, [("10.0.0.170", 31), ("10.0.0.172", 30)]),
+    (1, [("10.0.0.170", 31), ("10.0.0.172", 30)]),
+    # /29 多覆盖 .168 和 .169 两个地址
+    (2, [("10.0.0.168", 29)]),
+])
+def test_unaligned_block(max_extra, expected):
+    prefixes = aggregate_prefixes(BLOCK, max_extra)
+    assert [(network, prefixlen) for network, prefixlen, _ in prefixes] == expected
+    assert sum((members for _, _, members in prefixes), []) == BLOCK
+
+
+def test_forbidden_addresses_are_never_covered():
+    prefixes = aggregate_prefixes(BLOCK, 2, forbidden=["10.0.0.169"])
+    assert "10.0.0.169" not in covered(prefixes)
+    assert covered(prefixes) >= set(BLOCK)
+
+
+def test_prefixes_do_not_overlap():
+    servers = [f"10.0.{i // 8}.{i * 37 % 256}" for i in range(64)]
+    prefixes = aggregate_prefixes(servers, 3)
+    total = sum(1 << (32 - prefixlen) for _, prefixlen, _ in prefixes)
+    assert len(covered(prefixes)) == total
+    assert covered(prefixes) >= set(servers)
+    # 代表地址是前缀内的第一个服务器
+    for network, prefixlen, members in prefixes:
+        assert members == sorted(members, key=lambda ip: int(ipaddress.IPv4Address(ip)))
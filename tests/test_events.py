@@ -0,0 +1,60 @@
+from src.events import (EventBus, LatencySample, OptimizationProgress, RouteChanged,
+                        apply_route_events)
+
+SERVER = "203.0.113.1"
+
+
+def test_events_with_the_same_key_coalesce():
+    bus = EventBus()
+    subscription = bus.subscribe()
+    bus.publish_all([LatencySample(SERVER, 30, 60), RouteChanged(SERVER, "198.51.100.1"),
+                     LatencySample(SERVER, 25, 60)])
+
+    events = subscription.poll()
+    # 合并后的事件按最后更新的先后排列
+    assert [type(event) for event in events] == [RouteChanged, LatencySample]
+    assert events[1].latency == 25
+    assert subscription.poll() == []
+
+
+def test_type_filter():
+    bus = EventBus()
+    progress = bus.subscribe([OptimizationProgress])
+    bus.publish(LatencySample(SERVER, 30, 60))
+    bus.publish(OptimizationProgress("discovery", 1, 3))
+    assert [event.phase for event in progress.poll()] == ["discovery"]
+
+
+def test_overflow_drops_oldest_and_resyncs_from_snapshot():
+    bus = EventBus()
+    subscription = bus.subscribe(maxlen=2)
+    servers = [f"203.0.113.{i}" for i in range(4)]
+    for server in servers:
+        bus.publish(RouteChanged(server, "198.51.100.1"))
+
+    assert [event.server for event in subscription.poll()] == servers[2:]
+    assert subscription.take_dropped() == 2
+    assert subscription.take_dropped() == 0
+
+    # 订阅者从状态快照重建视图后继续应用新事件
+    view = {server: {"node": "198.51.100.1"} for server in servers}
+    bus.publish(RouteChanged(servers[0], None, removed=True))
+    bus.publish(LatencySample(servers[1], 20, 60))
+    assert apply_route_events(view, subscription.poll())
+    assert servers[0] not in view
+    assert view[servers[1]]["current_latency"] == 20
+
+
+def test_slow_subscriber_does_not_affect_others():
+    bus = EventBus()
+    slow = bus.subscribe(maxlen=1)
+    fast = bus.subscribe()
+    for i in range(3):
+        bus.publish(RouteChanged(f"203.0.113.{i}", None))
+        assert len(fast.poll()) == 1
+    assert slow.take_dropped() == 2
+    assert [event.server for event in slow.poll()] == ["203.0.113.2"]
+
+    slow.close()
+    bus.publish(RouteChanged(SERVER, None))
+    assert slow.poll() == []
@@ -0,0 +1,73 @@
+from src.events import GameExited, GameStarted
+from src.game_detector import GameDetector, WindowBackend
+from src.process_watcher import ProcessSource, ProcessWatcher
+
+
+class FakeSource(ProcessSource):
+    name = "fake"
+
+    def __init__(self):
+        self.processes = {1: "explorer.exe"}
+
+    def pids(self):
+        return set(self.processes)
+
+    def process_name(self, pid):
+        return self.processes.get(pid)
+
+
+class CountingWindows(WindowBackend):
+    def __init__(self):
+        self.lookups = 0
+
+    def find_window(self, pid):
+        self.lookups += 1
+        return None
+
+
+def make_detector():
+    source = FakeSource()
+    windows = CountingWindows()
+    detector = GameDetector(watcher=ProcessWatcher(source), window_backend=windows)
+    return detector, source, windows
+
+
+def test_game_start_and_exit_are_published():
+    detector, source, _ = make_detector()
+    events = detector.events.subscribe([GameStarted, GameExited])
+    detector.watcher.poll()
+
+    source.processes[42] = "dota2"
+    detector.watcher.poll()
+    assert [(type(e), e.game, e.pid) for e in events.poll()] == [(GameStarted, "DotA2", 42)]
+    assert detector.detect_game() == "DotA2"
+    assert detector.current_pid == 42
+
+    del source.processes[42]
+    detector.watcher.poll()
+    assert [(type(e), e.game) for e in events.poll()] == [(GameExited, "DotA2")]
+    assert detector.detect_game() is None
+
+
+def test_game_preferred_over_steam():
+    detector, source, _ = make_detector()
+    source.processes.update({7: "steam.exe", 9: "cs2.exe"})
+    assert detector.detect_game() == "CS2"
+
+
+def test_missing_window_is_cached_per_process():
+    detector, source, windows = make_detector()
+    source.processes[42] = "dota2.exe"
+    detector.detect_game()
+
+    for _ in range(5):
+        assert not detector.is_game_window_active()
+    assert windows.lookups == 1
+
+    # 进程退出后再次启动，重新查找窗口
+    del source.processes[42]
+    detector.watcher.poll()
+    source.processes[43] = "dota2.exe"
+    detector.detect_game()
+    assert not detector.is_game_window_active()
+    assert windows.lookups == 2
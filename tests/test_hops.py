@@ -0,0 +1,74 @@
+import pytest
+
+from src.hops import PathAnalyzer, SimulatedTracer
+
+TARGET = "203.0.113.9"
+ADDRESSES = ["192.168.1.1", "10.0.0.1", "198.51.100.1", "198.51.100.2", TARGET]
+
+
+def path(latencies, losses=None):
+    losses = losses or [0.0] * len(latencies)
+    return [(address, rtt, loss) for address, rtt, loss in zip(ADDRESSES, latencies, losses)]
+
+
+def run(analyzer, rounds):
+    segments = []
+    for _ in range(rounds):
+        segments = analyzer.analyze("route", TARGET)
+    return segments
+
+
+def test_clean_path_has_no_bad_segments():
+    tracer = SimulatedTracer({TARGET: path([1, 5, 12, 20, 25])}, seed=1)
+    analyzer = PathAnalyzer(tracer, max_hops=10, count=3)
+
+    assert run(analyzer, 20) == []
+    hops = analyzer.hops("route")
+    assert [hop["address"] for hop in hops] == ADDRESSES
+    assert all(hop["loss"] == 0 for hop in hops)
+
+
+def test_long_fixed_link_is_not_a_latency_segment():
+    # 跨洋链路的延迟固定偏高，没有排队延迟
+    tracer = SimulatedTracer({TARGET: path([1, 5, 160, 165, 170])}, seed=2)
+    analyzer = PathAnalyzer(tracer, max_hops=10, count=3, latency_jump=30)
+
+    assert run(analyzer, 20) == []
+
+
+def test_loss_starting_at_a_hop_is_located():
+    tracer = SimulatedTracer({TARGET: path([1, 5, 12, 20, 25], [0, 0, 0.5, 0.5, 0.5])}, seed=3)
+    analyzer = PathAnalyzer(tracer, max_hops=10, count=3, loss_threshold=0.2)
+
+    segments = run(analyzer, 30)
+    assert len(segments) == 1
+    segment = segments[0]
+    assert (segment.ttl, segment.start, segment.end) == (3, "10.0.0.1", "198.51.100.1")
+    assert segment.added_loss == pytest.approx(0.5, abs=0.2)
+    assert analyzer.shares_segment("route", segments)
+
+
+def test_rate_limited_hop_is_not_a_loss_segment():
+    # 只有中间一跳不回应ICMP，之后的跳没有丢包
+    tracer = SimulatedTracer({TARGET: path([1, 5, 12, 20, 25], [0, 0.7, 0, 0, 0])}, seed=4)
+    analyzer = PathAnalyzer(tracer, max_hops=10, count=3, loss_threshold=0.2)
+
+    assert run(analyzer, 30) == []
+
+
+def test_latency_jump_is_located():
+    state = {"queueing": 0.0}
+
+    def current_path(target):
+        extra = state["queueing"]
+        return path([1, 5, 12 + extra, 20 + extra, 25 + extra])
+
+    analyzer = PathAnalyzer(SimulatedTracer(current_path, seed=5), max_hops=10, count=3,
+                            latency_jump=30)
+    assert run(analyzer, 20) == []
+
+    state["queueing"] = 60.0
+    segments = run(analyzer, 10)
+    assert [segment.ttl for segment in segments] == [3]
+    assert segments[0].start == "10.0.0.1"
+    assert segments[0].added_latency >= 30
@@ -0,0 +1,91 @@
+import numpy as np
+import pytest
+
+from src.ipdb import IpIndex, compile_ipdb
+
+
+def build(tmp_path, rows):
+    path = str(tmp_path / "test.ipdb")
+    count = compile_ipdb(rows, path)
+    index = IpIndex(path)
+    assert len(index) == count
+    return index
+
+
+def isp(index, ip):
+    info = index.lookup(ip)
+    return info.isp if info else None
+
+
+def test_lookup(tmp_path):
+    index = build(tmp_path, [("1.0.0.0", "1.0.0.255", "电信", "广东", 4134),
+                             ("2.0.0.0", "2.0.0.255", "联通", "北京", 4837)])
+    info = index.lookup("2.0.0.7")
+    assert (info.isp, info.province, info.asn) == ("联通", "北京", 4837)
+    assert index.lookup("1.0.1.0") is None
+    assert index.lookup("not an ip") is None
+    index.close()
+
+
+def test_nested_range_splits_outer(tmp_path):
+    index = build(tmp_path, [("1.0.0.0", "1.0.0.255", "outer", "", 0),
+                             ("1.0.0.10", "1.0.0.20", "inner", "", 0)])
+    assert isp(index, "1.0.0.0") == "outer"
+    assert isp(index, "1.0.0.9") == "outer"
+    assert isp(index, "1.0.0.10") == "inner"
+    assert isp(index, "1.0.0.20") == "inner"
+    assert isp(index, "1.0.0.21") == "outer"
+    assert isp(index, "1.0.0.100") == "outer"
+    assert isp(index, "1.0.0.255") == "outer"
+    assert len(index) == 3
+    index.close()
+
+
+def test_multiple_levels_and_shared_start(tmp_path):
+    index = build(tmp_path, [("10.0.0.0", "10.0.255.255", "a", "", 0),
+                             ("10.0.1.0", "10.0.1.255", "b", "", 0),
+                             ("10.0.1.0", "10.0.1.15", "c", "", 0),
+                             ("10.0.1.100", "10.0.1.100", "d", "", 0)])
+    expected = {"10.0.0.255": "a", "10.0.1.0": "c", "10.0.1.15": "c", "10.0.1.16": "b",
+                "10.0.1.100": "d", "10.0.1.101": "b", "10.0.2.0": "a", "10.0.255.255": "a"}
+    assert {ip: isp(index, ip) for ip in expected} == expected
+    index.close()
+
+
+def test_partial_overlap_prefers_later_start(tmp_path):
+    index = build(tmp_path, [("1.0.0.0", "1.0.0.30", "first", "", 0),
+                             ("1.0.0.20", "1.0.0.50", "second", "", 0)])
+    assert isp(index, "1.0.0.19") == "first"
+    assert isp(index, "1.0.0.20") == "second"
+    assert isp(index, "1.0.0.40") == "second"
+    assert isp(index, "1.0.0.51") is None
+    index.close()
+
+
+def _ip(value):
+    return f"{value >> 24}.{(value >> 16) & 255}.{(value >> 8) & 255}.{value & 255}"
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_random_ranges_match_brute_force(tmp_path, seed):
+    rng = np.random.default_rng(seed)
+    base = 1 << 24
+    spans = set()
+    while len(spans) < 40:
+        start = int(rng.integers(0, 4000))
+        spans.add((start, start + int(rng.integers(0, 800))))
+    spans = sorted(spans)
+    rows = [(_ip(base + start), _ip(base + end), str(i), "", i)
+            for i, (start, end) in enumerate(spans)]
+    index = build(tmp_path, rows)
+
+    values = np.arange(base, base + 5000, dtype=np.uint32)
+    found = index.lookup_many(values)
+    for value, i in zip(values.tolist(), found.tolist()):
+        # 包含该地址的区间中起始地址最大的（相同时取较短的）
+        containing = [(start, -end, n) for n, (start, end) in enumerate(spans)
+                      if start <= value - base <= end]
+        expected = max(containing)[2] if containing else None
+        assert isp(index, _ip(value)) == (str(expected) if expected is not None else None)
+        assert (i < 0) == (expected is None)
+    index.close()
@@ -0,0 +1,92 @@
+import json
+import time
+
+import pytest
+
+from src.config import ConfigManager
+from src.core import AcceleratorCore, FakeBackend
+from src.prober import ProbeResult
+from src.routing import MemoryRouteBackend
+
+SERVER = "203.0.113.10"
+NODES = {"198.51.100.1": 10.0, "198.51.100.2": 20.0}
+VIA = {"198.51.100.1": 30.0, "198.51.100.2": 40.0}
+DIRECT_LATENCY = 80.0
+
+
+class RouteAwareBackend(FakeBackend):
+    """按路由表中实际安装的网关返回服务器延迟，dead中的节点不再转发"""
+
+    def __init__(self, routes: MemoryRouteBackend):
+        super().__init__(NODES)
+        self.routes = routes
+        self.via = dict(VIA)
+        self.dead = set()
+
+    def probe(self, hosts, count=4, timeout=1000, port=None):
+        self.calls += 1
+        gateway = next(iter(self.routes.snapshot().values()), None)
+        results = {}
+        for host in hosts:
+            result = ProbeResult(host, sent=count)
+            if host in NODES:
+                result.rtts = [NODES[host]] * count
+            elif gateway is None:
+                result.rtts = [DIRECT_LATENCY] * count
+            elif gateway not in self.dead:
+                result.rtts = [self.via[gateway]] * count
+            results[host] = result
+        return results
+
+
+@pytest.fixture
+def core(tmp_path):
+    config_path = tmp_path / "config.json"
+    config_path.write_text(json.dumps({
+        "settings": {"route_journal": str(tmp_path / "routes.journal"),
+                     "measurement_db": str(tmp_path / "measurements.db"),
+                     "ip_database": str(tmp_path / "missing.ipdb"),
+                     "route_selection": "threshold", "selection_mode": "full",
+                     "fast_start": False, "path_analysis": False,
+                     "reoptimize_cooldown": 0},
+        "nodes": {"R": [{"ip": ip} for ip in NODES]},
+        "game_servers": {"G": {"R": {"group": [SERVER]}}},
+    }), encoding='utf-8')
+    manager = ConfigManager(str(config_path))
+    routes = MemoryRouteBackend()
+    core = AcceleratorCore(route_backend=routes, config_manager=manager)
+    core.backends["icmp"] = RouteAwareBackend(routes)
+    yield core
+    core.stop_acceleration()
+    manager.stop_watching()
+    core.history.close()
+
+
+def test_blackholed_relay_triggers_reoptimization(core):
+    assert core.start_acceleration("G", "R")
+    assert core.routes[SERVER]["node"] == "198.51.100.1"
+    # 积累几次正常的监控结果，使EWMA停留在正常值
+    for _ in range(3):
+        core._on_monitor_results(core.probe_latency([SERVER], count=2, use_cache=False))
+
+    core.backends["icmp"].dead.add("198.51.100.1")
+    core._on_monitor_results(core.probe_latency([SERVER], count=2, use_cache=False))
+
+    assert core.reoptimizer.stats()["submitted"] >= 1
+    deadline = time.time() + 5
+    while core.routes[SERVER]["node"] != "198.51.100.2" and time.time() < deadline:
+        time.sleep(0.05)
+    assert core.routes[SERVER]["node"] == "198.51.100.2"
+    assert core.route_backend.snapshot() == {(SERVER, 32): "198.51.100.2"}
+
+
+def test_reoptimization_falls_back_to_direct(core):
+    assert core.start_acceleration("G", "R")
+    backend = core.backends["icmp"]
+    backend.dead.add("198.51.100.1")
+    backend.via["198.51.100.2"] = DIRECT_LATENCY + 50
+
+    assert core._optimize_route(SERVER, remeasure=True)
+    assert core.routes[SERVER]["node"] is None
+    assert core.routes[SERVER]["current_latency"] == DIRECT_LATENCY
+    assert core.route_backend.snapshot() == {}
@@ -0,0 +1,102 @@
+import threading
+import time
+
+import pytest
+
+from src.probe_cache import ProbeCache
+
+KEY = ("203.0.113.1", "icmp", 4)
+
+
+def measure(cache, key, value):
+    hits, waiting, claimed = cache.claim([key])
+    if key in claimed:
+        cache.fulfill(key, value, claimed[key])
+        return value
+    if key in waiting:
+        return waiting[key].result()
+    return hits[key]
+
+
+def test_hit_within_ttl():
+    cache = ProbeCache(ttl=10)
+    assert measure(cache, KEY, 12.0) == 12.0
+    assert measure(cache, KEY, 99.0) == 12.0
+    assert cache.stats()["hits"] == 1
+
+
+def test_entry_expires_after_ttl():
+    cache = ProbeCache(ttl=0.05)
+    measure(cache, KEY, 12.0)
+    time.sleep(0.1)
+    assert measure(cache, KEY, 15.0) == 15.0
+    assert cache.stats()["misses"] == 2
+
+
+def test_concurrent_requests_share_one_measurement():
+    cache = ProbeCache()
+    _, _, claimed = cache.claim([KEY])
+    assert KEY in claimed
+
+    results = []
+    waiters = []
+    for _ in range(3):
+        _, waiting, again = cache.claim([KEY])
+        assert not again
+        waiters.append(threading.Thread(target=lambda f=waiting[KEY]: results.append(f.result())))
+        waiters[-1].start()
+    cache.fulfill(KEY, 20.0, claimed[KEY])
+    for thread in waiters:
+        thread.join(1)
+
+    assert results == [20.0] * 3
+    assert cache.stats()["coalesced"] == 3
+
+
+def test_failure_wakes_waiters():
+    cache = ProbeCache()
+    _, _, claimed = cache.claim([KEY])
+    _, waiting, _ = cache.claim([KEY])
+    cache.fail(KEY, RuntimeError("probe failed"))
+    with pytest.raises(RuntimeError):
+        waiting[KEY].result(1)
+    # 失败不写入缓存，下一次重新测量
+    assert KEY in cache.claim([KEY])[2]
+
+
+def test_invalidation_during_measurement_is_not_cached():
+    cache = ProbeCache()
+    _, _, claimed = cache.claim([KEY])
+    # 测量期间路由变更
+    cache.invalidate(KEY[0])
+    cache.fulfill(KEY, 20.0, claimed[KEY])
+    assert cache.stats()["size"] == 0
+
+    cache.invalidate()
+    _, _, claimed = cache.claim([KEY])
+    cache.invalidate()
+    cache.fulfill(KEY, 20.0, claimed[KEY])
+    assert cache.stats()["size"] == 0
+
+
+def test_invalidate_removes_only_that_target():
+    cache = ProbeCache()
+    other = ("203.0.113.2", "icmp", 4)
+    measure(cache, KEY, 12.0)
+    measure(cache, other, 13.0)
+    cache.invalidate(KEY[0])
+    assert measure(cache, KEY, 14.0) == 14.0
+    assert measure(cache, other, 99.0) == 13.0
+
+
+def test_lru_eviction():
+    cache = ProbeCache(max_size=2)
+    keys = [(f"203.0.113.{i}", "icmp", 4) for i in range(3)]
+    measure(cache, keys[0], 1.0)
+    measure(cache, keys[1], 2.0)
+    measure(cache, keys[0], 9.0)  # 命中，移到最新
+    measure(cache, keys[2], 3.0)
+
+    assert cache.stats()["evictions"] == 1
+    assert measure(cache, keys[0], 9.0) == 1.0
+    assert measure(cache, keys[1], 5.0) == 5.0
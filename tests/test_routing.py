@@ -0,0 +1,78 @@
+import json
+
+from src.config import ConfigManager
+from src.core import AcceleratorCore
+from src.journal import RouteJournal
+from src.routing import MemoryRouteBackend, RouteChange
+
+GATEWAY = "198.51.100.1"
+
+
+def test_batch_applies_all_changes():
+    backend = MemoryRouteBackend()
+    assert backend.apply([RouteChange.add("203.0.113.0", GATEWAY, 30),
+                          RouteChange.add("203.0.113.8", GATEWAY)])
+    assert backend.snapshot() == {("203.0.113.0", 30): GATEWAY, ("203.0.113.8", 32): GATEWAY}
+    assert backend.batches == 1
+
+
+def test_unchanged_routes_are_skipped():
+    backend = MemoryRouteBackend()
+    backend.apply([RouteChange.add("203.0.113.8", GATEWAY)])
+    assert backend.apply([RouteChange.add("203.0.113.8", GATEWAY),
+                          RouteChange.delete("203.0.113.9")])
+    assert backend.batches == 1
+
+
+def test_failed_batch_rolls_back():
+    backend = MemoryRouteBackend(fail_on=["203.0.113.9"])
+    backend.apply([RouteChange.add("203.0.113.1", "198.51.100.2")])
+
+    # 第一条变更已执行，第二条失败，整批恢复到变更前
+    assert not backend.apply([RouteChange.add("203.0.113.1", GATEWAY),
+                              RouteChange.add("203.0.113.9", GATEWAY)])
+    assert backend.snapshot() == {("203.0.113.1", 32): "198.51.100.2"}
+
+
+def test_journal_replays_after_crash(tmp_path):
+    path = str(tmp_path / "routes.journal")
+    journal = RouteJournal(path)
+    journal.record([RouteChange.add("203.0.113.0", GATEWAY, 30),
+                    RouteChange.add("203.0.113.8", GATEWAY)])
+    journal.record([RouteChange.delete("203.0.113.8")])
+    # 崩溃时写了一半的最后一行
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write('{"op": "add", "dst": "203.0.')
+
+    assert RouteJournal(path).owned == {("203.0.113.0", 30): GATEWAY}
+
+
+def test_core_recovers_leftover_routes(tmp_path):
+    journal_path = tmp_path / "routes.journal"
+    config_path = tmp_path / "config.json"
+    config_path.write_text(json.dumps({
+        "settings": {"route_journal": str(journal_path),
+                     "measurement_db": str(tmp_path / "measurements.db")},
+    }), encoding='utf-8')
+    journal = RouteJournal(str(journal_path))
+    journal.record([RouteChange.add("203.0.113.0", GATEWAY, 30),
+                    RouteChange.add("203.0.113.8", GATEWAY),
+                    RouteChange.add("203.0.113.9", GATEWAY)])
+
+    backend = MemoryRouteBackend()
+    backend.table = {("203.0.113.0", 30): GATEWAY,
+                     # 日志记录的路由已被用户改为其他网关，不属于加速器
+                     ("203.0.113.8", 32): "192.0.2.1",
+                     # 不在日志中的路由
+                     ("192.0.2.0", 24): "192.0.2.254"}
+    manager = ConfigManager(str(config_path))
+    core = AcceleratorCore(route_backend=backend, config_manager=manager)
+    try:
+        core._recover_routes()
+    finally:
+        core.history.close()
+
+    assert backend.snapshot() == {("203.0.113.8", 32): "192.0.2.1",
+                                  ("192.0.2.0", 24): "192.0.2.254"}
+    assert backend.batches == 1
+    assert RouteJournal(str(journal_path)).owned == {}
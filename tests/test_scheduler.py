@@ -0,0 +1,112 @@
+import threading
+import time
+
+from src.prober import ProbeResult
+from src.scheduler import ProbeScheduler
+
+TARGET = "203.0.113.1"
+
+
+class Recorder:
+    """记录每批结果处理后目标的探测间隔，达到指定批数时通知"""
+
+    def __init__(self, batches: int):
+        self.batches = batches
+        self.intervals = []
+        self.done = threading.Event()
+        self.scheduler = None
+
+    def __call__(self, results):
+        for target in results:
+            self.intervals.append(self.scheduler.interval(target))
+        if len(self.intervals) >= self.batches:
+            self.done.set()
+
+
+def run(probe, batches, **options):
+    recorder = Recorder(batches)
+    scheduler = ProbeScheduler(probe, recorder, jitter=0, **options)
+    recorder.scheduler = scheduler
+    scheduler.add(TARGET)
+    scheduler.start()
+    try:
+        assert recorder.done.wait(5)
+    finally:
+        scheduler.stop()
+    return recorder.intervals[:batches], scheduler
+
+
+def reply(latencies):
+    values = iter(latencies)
+
+    def probe(batch):
+        latency = next(values, None)
+        rtts = [] if latency is None else [latency]
+        return {target: ProbeResult(target, 1, list(rtts)) for target in batch}
+    return probe
+
+
+def test_failures_back_off_exponentially():
+    intervals, _ = run(reply([]), 5, min_interval=0.01, max_backoff=0.08)
+    assert intervals == [0.02, 0.04, 0.08, 0.08, 0.08]
+
+
+def test_stable_target_stretches_interval():
+    intervals, _ = run(reply([20.0] * 8), 8, min_interval=0.01, max_interval=0.04)
+    # 前两个样本不足以判断稳定
+    assert intervals[:2] == [0.01, 0.01]
+    assert intervals[2] == 0.015
+    assert intervals[-1] == 0.04
+
+
+def test_volatile_target_returns_to_min_interval():
+    latencies = [20.0] * 5 + [200.0]
+    intervals, _ = run(reply(latencies), 6, min_interval=0.01, max_interval=0.04)
+    assert intervals[4] > 0.01
+    assert intervals[5] == 0.01
+
+
+def test_recovery_resets_backoff():
+    intervals, _ = run(reply([None, None, 20.0]), 3, min_interval=0.01, max_backoff=1.0)
+    assert intervals == [0.02, 0.04, 0.01]
+
+
+def test_rate_limit_defers_probes():
+    probed = []
+
+    def probe(batch):
+        probed.extend(batch)
+        return {target: ProbeResult(target, 1, [20.0]) for target in batch}
+
+    scheduler = ProbeScheduler(probe, lambda results: None, min_interval=0.01, jitter=0,
+                               rate=20.0, max_batch=2)
+    for i in range(20):
+        scheduler.add(f"203.0.113.{i}")
+    scheduler.start()
+    time.sleep(0.3)
+    scheduler.stop()
+
+    # 初始令牌2个，之后每秒20个
+    assert 4 <= len(probed) <= 10
+    assert scheduler.stats()["deferred"] > 0
+
+
+def test_removed_target_is_not_probed_again():
+    probed = []
+
+    def probe(batch):
+        probed.extend(batch)
+        return {target: ProbeResult(target, 1, [20.0]) for target in batch}
+
+    scheduler = ProbeScheduler(probe, lambda results: None, min_interval=0.01, jitter=0)
+    scheduler.add(TARGET)
+    scheduler.start()
+    time.sleep(0.05)
+    scheduler.remove(TARGET)
+    time.sleep(0.02)
+    count = len(probed)
+    time.sleep(0.05)
+    scheduler.stop()
+
+    assert count > 0
+    assert len(probed) == count